@@ -0,0 +1,79 @@
+"""
+Coordinator cost per frame as the number of agents grows.
+
+Starts a ClusterCoordinator on localhost and N agents (threads in this process),
+each sending --frames frames of --metrics metrics where a tenth of the values change
+per frame. Reports coordinator apply time per frame, which should stay flat as N grows,
+and the time for one summary() over all hosts.
+
+    python benchmarks/cluster.py --agents 10 50 200
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from threading import Thread
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from trainingbar.cluster import ClusterAgent, ClusterCoordinator
+
+
+def fake_stats(n_metrics, rng, prev=None):
+    stats = prev or {'tpu': {f'm{i}': 0.0 for i in range(n_metrics - 1)}, 'cpu': {'cpu_util': 0.0}}
+    stats['tpu']['tpu_mxu_util'] = rng.uniform(40, 60)
+    for i in rng.sample(range(n_metrics - 1), max(1, n_metrics // 10)):
+        stats['tpu'][f'm{i}'] = rng.random()
+    return stats
+
+
+def run_agent(address, host_id, frames, n_metrics, seed):
+    rng = random.Random(seed)
+    agent = ClusterAgent(address, host_id=host_id)
+    stats = None
+    for _ in range(frames):
+        stats = fake_stats(n_metrics, rng, stats)
+        agent.send(stats)
+    agent.close()
+    return agent
+
+
+def run(n_agents, frames, n_metrics):
+    coordinator = ClusterCoordinator(port=0, host='127.0.0.1').start()
+    apply, spent = coordinator.apply, [0.0]
+    def timed(conn, frame):
+        start = time.perf_counter()
+        apply(conn, frame)
+        spent[0] += time.perf_counter() - start
+    coordinator.apply = timed
+    threads = [Thread(target=run_agent, args=(('127.0.0.1', coordinator.port), f'worker-{i}', frames, n_metrics, i)) for i in range(n_agents)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    deadline = time.time() + 30
+    while coordinator.frames < n_agents * frames and time.time() < deadline:
+        time.sleep(0.05)
+    start = time.perf_counter()
+    summary = coordinator.summary()
+    summary_ms = (time.perf_counter() - start) * 1000
+    coordinator.stop()
+    return {'agents': n_agents, 'frames': coordinator.frames, 'us_per_frame': spent[0] / max(1, coordinator.frames) * 1e6, 'summary_ms': summary_ms, 'hosts': summary['hosts']}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--agents', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--metrics', type=int, default=100)
+    args = parser.parse_args()
+    print(f"{'agents':>8} {'frames':>8} {'us/frame':>10} {'summary ms':>11}")
+    for n in args.agents:
+        r = run(n, args.frames, args.metrics)
+        print(f"{r['agents']:>8} {r['frames']:>8} {r['us_per_frame']:>10.1f} {r['summary_ms']:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Per-sample cost of each GPU backend.
+
+The fake NVML backend always runs. The real NVML and GPUtil backends run when pynvml /
+GPUtil and a driver are available; GPUtil can also be measured against a fake
+`nvidia-smi` script (--fake-smi) to show the fork + CSV parse cost without a GPU.
+
+    python benchmarks/gpu_backends.py --gpus 8 --samples 200
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from trainingbar.handlers.gpu_backends import NVMLBackend, GPUtilBackend, FakeNVML
+
+_fake_smi = '''#!/bin/sh
+i=0
+while [ $i -lt {gpus} ]; do
+  echo "$i, GPU-0000000$i, 35, 1024, 15360, 16384, 535.00, Fake GPU, 00000000:0$i:00.0, Enabled, Default, 40"
+  i=$((i+1))
+done
+'''
+
+def time_samples(backend, samples):
+    backend.sample()
+    start = time.perf_counter()
+    for _ in range(samples):
+        backend.sample()
+    return (time.perf_counter() - start) / samples
+
+def report(name, per_sample, gpus):
+    # With no devices the sample is pure overhead, so there is no per-GPU cost to show
+    per_gpu = f'{per_sample * 1e6 / gpus:>10.1f}us/gpu' if gpus else f'{"no GPUs found":>16}'
+    print(f'{name:<20} {per_sample * 1e6:>12.1f}us/sample {per_gpu}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--fake-smi', action='store_true')
+    args = parser.parse_args()
+
+    backend = NVMLBackend(nvml=FakeNVML(num_gpus=args.gpus, seed=0))
+    report('nvml (fake)', time_samples(backend, args.samples), args.gpus)
+    backend.close()
+
+    try:
+        backend = NVMLBackend()
+        report('nvml', time_samples(backend, args.samples), len(backend.handles))
+        backend.close()
+    except Exception as e:
+        print(f'{"nvml":<20} skipped ({e.__class__.__name__})')
+
+    tmpdir = None
+    if args.fake_smi:
+        tmpdir = tempfile.mkdtemp()
+        smi = os.path.join(tmpdir, 'nvidia-smi')
+        with open(smi, 'w') as f:
+            f.write(_fake_smi.format(gpus=args.gpus))
+        os.chmod(smi, 0o755)
+        os.environ['PATH'] = tmpdir + os.pathsep + os.environ['PATH']
+    try:
+        backend = GPUtilBackend()
+        report('gputil' + (' (fake smi)' if tmpdir else ''), time_samples(backend, max(1, args.samples // 10)), args.gpus if tmpdir else len(backend.devices()))
+    except Exception as e:
+        print(f'{"gputil":<20} skipped ({e.__class__.__name__})')
+
+
+if __name__ == '__main__':
+    main()
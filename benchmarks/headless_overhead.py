@@ -0,0 +1,53 @@
+"""
+CPU overhead of a running TrainingBar, headless vs the rich display.
+
+Each mode runs in a fresh interpreter for --secs seconds with daemon=True and
+reports process CPU time (all threads) extrapolated to CPU-seconds per hour, and
+whether rich was imported.
+
+    python benchmarks/headless_overhead.py --secs 30 --refresh 1
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+_child = '''
+import sys, time, json
+sys.path.insert(0, {root!r})
+from trainingbar import TrainingBar
+start_cpu = time.process_time()
+tb = TrainingBar(refresh_secs={refresh}, xla={xla!r}, xla_params={xla_params!r}, disabled=['disk'], authenticate=False, reinit=True, daemon=True, headless={headless}, intervals={{'host': {refresh}, 'gpu': {refresh}}})
+time.sleep({secs})
+cpu = time.process_time() - start_cpu
+tb.stop()
+print(json.dumps({{'cpu': cpu, 'rich': 'rich' in sys.modules, 'updates': tb.idx}}), file=sys.stderr)
+'''
+
+def run(headless, secs, refresh, gpus):
+    xla, xla_params = (('gpu', {'gpu_backend': 'fake'}) if gpus else (None, None))
+    env = dict(os.environ, TBAR_FAKE_GPUS=str(gpus))
+    code = _child.format(root=root, refresh=refresh, xla=xla, xla_params=xla_params, headless=headless, secs=secs)
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    return json.loads(proc.stderr.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--secs', type=float, default=20)
+    parser.add_argument('--refresh', type=float, default=1)
+    parser.add_argument('--gpus', type=int, default=8)
+    args = parser.parse_args()
+    for name, headless in [('rich display', False), ('headless', True)]:
+        r = run(headless, args.secs, args.refresh, args.gpus)
+        per_hour = r['cpu'] / args.secs * 3600
+        print(f'{name:<14} {per_hour:8.1f} cpu-s/hour ({per_hour / 36:.3f}% of a core)  updates={r["updates"]}  rich imported={r["rich"]}')
+
+
+if __name__ == '__main__':
+    main()
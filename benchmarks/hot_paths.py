@@ -0,0 +1,274 @@
+"""
+Latency, allocations and steady-state CPU of trainingbar's hot paths.
+
+Every operation runs against fake backends so results only measure trainingbar:
+psutil is replaced by constant counters, GPUs come from FakeNVML and Cloud
+Monitoring from a FakeMetricServiceClient whose responses are built once up front.
+
+    host_getdata      HostMonitor._getdata with N cores
+    gpu_getdata       GPUMonitor._getdata with N fake GPUs
+    timeseries_get    TimeSeriesMonitor.get over N series (decode only)
+    pb_to_dict        pb_to_dict of N series' metric + resource labels
+    rich_refresh      one Progress.refresh() of configure_trainingbars with N GPUs
+    bar_update        TrainingBar.update() (headless, non-daemon) with N GPUs
+    cpu_percent       CPU% of a daemon TrainingBar with N GPUs and a 1s refresh (subprocess)
+
+Results are compared to benchmarks/baselines.json. An op is flagged when its median
+latency, peak allocation or CPU% is more than --tolerance above the baseline. Baselines
+are machine specific; refresh them with --save after an intended change or on new hardware.
+
+    python benchmarks/hot_paths.py
+    python benchmarks/hot_paths.py --devices 1 8 64 --ops gpu_getdata rich_refresh
+    python benchmarks/hot_paths.py --save
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import subprocess
+from collections import namedtuple
+from contextlib import ExitStack
+from unittest import mock
+from statistics import median
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, root)
+os.environ.setdefault('TBAR_HEADLESS', '0')
+
+_baselines = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+
+class FakePsutil:
+    """Constant-cost stand-in for the psutil calls HostMonitor makes, with counters that keep moving."""
+    _vmem = namedtuple('vmem', 'total used percent')
+    _swap = namedtuple('swap', 'total used percent')
+    _disk = namedtuple('disk', 'total used percent')
+    _diskio = namedtuple('diskio', 'read_bytes write_bytes read_count write_count')
+    _netio = namedtuple('netio', 'bytes_sent bytes_recv')
+
+    def __init__(self):
+        self.ticks = 0
+
+    def cpu_percent(self, *args, **kwargs):
+        return 42.0
+
+    def virtual_memory(self):
+        return self._vmem(64 << 30, 20 << 30, 31.2)
+
+    def swap_memory(self):
+        return self._swap(8 << 30, 0, 0.0)
+
+    def disk_usage(self, path):
+        return self._disk(1 << 40, 300 << 30, 29.3)
+
+    def disk_io_counters(self, *args, **kwargs):
+        self.ticks += 1
+        return self._diskio(self.ticks << 20, self.ticks << 19, self.ticks * 100, self.ticks * 50)
+
+    def net_io_counters(self, *args, **kwargs):
+        return self._netio(self.ticks << 22, self.ticks << 23)
+
+
+def fake_cpu_times(cores):
+    import numpy as np
+    state = {'t': np.zeros((cores, 2))}
+    def read():
+        state['t'] = state['t'] + np.array([60.0, 100.0])
+        return state['t']
+    return read
+
+
+def fake_host_config(gpus):
+    from trainingbar.handlers.gpu_backends import FakeNVML, NVMLBackend
+    devices = NVMLBackend(nvml=FakeNVML(num_gpus=gpus)).devices()
+    return {'cpu_name': 'Fake CPU', 'cpu_cores': 32, 'cpu_threads': 64, 'ram': 64 << 30, 'swap': 8 << 30, 'disk': 1 << 40,
+        'xla': {'gpu_backend': 'fake', 'gpus': {d['idx']: d for d in devices}}}
+
+
+# Each setup gets an ExitStack for its patches, which is closed once the op is measured
+def setup_host_getdata(n, stack):
+    from trainingbar.handlers import host
+    stack.enter_context(mock.patch.object(host, 'psutil', FakePsutil()))
+    stack.enter_context(mock.patch.object(host, 'read_cpu_times', fake_cpu_times(n)))
+    monitor = host.HostMonitor(None, ['cpu', 'cores', 'ram', 'disk', 'diskio', 'net'])
+    return monitor._getdata
+
+
+def setup_gpu_getdata(n, stack):
+    from trainingbar.handlers.gpu import GPUMonitor
+    from trainingbar.handlers.gpu_backends import NVMLBackend, FakeNVML
+    host = fake_host_config(n)
+    monitor = GPUMonitor(lambda config=False, ops=None: host, backend=NVMLBackend(nvml=FakeNVML(num_gpus=n, seed=0)))
+    return monitor._getdata
+
+
+class _CachedClient:
+    def __init__(self, n):
+        from trainingbar.handlers.network import FakeMetricServiceClient
+        self.fake = FakeMetricServiceClient(num_series=n)
+        self.results = None
+
+    def list_time_series(self, request):
+        if self.results is None:
+            self.results = self.fake.list_time_series(request)
+        return self.results
+
+
+def setup_timeseries_get(n, stack):
+    from trainingbar.handlers.network import TimeSeriesMonitor
+    monitor = TimeSeriesMonitor(project_id='fake-project', client=_CachedClient(n))
+    return lambda: monitor.get('tpu_core_mxu')
+
+
+def setup_pb_to_dict(n, stack):
+    from trainingbar.handlers.network import pb_to_dict
+    from trainingbar.handlers.network import TimeSeriesMonitor
+    results = TimeSeriesMonitor(project_id='fake-project', client=_CachedClient(n)).get('tpu_core_mxu', raw=True)
+    return lambda: [{k: pb_to_dict(getattr(ts, k)) for k in ['metric', 'resource']} for ts in results]
+
+
+def setup_rich_refresh(n, stack):
+    from rich.console import Console
+    from trainingbar.config import styles
+    console = Console(file=io.StringIO(), force_terminal=True, width=120)
+    stack.enter_context(mock.patch.object(styles, 'get_console', lambda: console))
+    config = fake_host_config(n)
+    # One bar per GPU, the costlier layout and the one the baselines were taken with
+    bars, ops = styles.configure_trainingbars(config, ['cpu', 'cores', 'ram', 'diskio', 'net', 'gpu'], gpu_grid=False)
+    bars.start()
+    i = [0]
+    def refresh():
+        # Move every bar so the refresh can't be served entirely from render caches
+        i[0] += 1
+        for gpu, task in ops['gpu'].items():
+            bars.update(task, completed=(i[0] * 997 + gpu * 131) % config['xla']['gpus'][gpu]['vram_total'])
+        bars.update(ops['cpu'], completed=i[0] % 100)
+        bars.refresh()
+        console.file.seek(0)
+        console.file.truncate()
+    stack.callback(bars.stop)
+    return refresh
+
+
+def setup_bar_update(n, stack):
+    stack.enter_context(mock.patch.dict(os.environ, {'TBAR_FAKE_GPUS': str(n)}))
+    from trainingbar import TrainingBar
+    from trainingbar.handlers import host
+    # Host probing at construction needs the real psutil; only collection is faked
+    tb = TrainingBar(refresh_secs=1, xla='gpu', xla_params={'gpu_backend': 'fake'}, authenticate=False, reinit=True, headless=True, disabled=['disk'])
+    stack.callback(tb.stop)
+    stack.enter_context(mock.patch.object(host, 'psutil', FakePsutil()))
+    stack.enter_context(mock.patch.object(host, 'read_cpu_times', fake_cpu_times(64)))
+    tb.update()
+    return lambda: tb.update()
+
+
+_ops = {
+    'host_getdata': setup_host_getdata,
+    'gpu_getdata': setup_gpu_getdata,
+    'timeseries_get': setup_timeseries_get,
+    'pb_to_dict': setup_pb_to_dict,
+    'rich_refresh': setup_rich_refresh,
+    'bar_update': setup_bar_update,
+}
+
+
+def measure(func, iters, warmup=20):
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    tracemalloc.start()
+    peaks = []
+    base = tracemalloc.get_traced_memory()[0]
+    for _ in range(min(iters, 50)):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        func()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    retained = (tracemalloc.get_traced_memory()[0] - base) / min(iters, 50)
+    tracemalloc.stop()
+    return {'us': median(times) * 1e6, 'p99_us': times[min(len(times) - 1, int(len(times) * 0.99))] * 1e6, 'peak_kb': median(peaks) / 1024, 'retained_b': retained}
+
+
+_cpu_child = '''
+import sys, time, json
+sys.path.insert(0, {root!r})
+from trainingbar import TrainingBar
+tb = TrainingBar(refresh_secs=1, xla='gpu', xla_params={{'gpu_backend': 'fake'}}, disabled=['disk'], authenticate=False, reinit=True, daemon=True, headless={headless})
+time.sleep(1)
+wall, cpu = time.perf_counter(), time.process_time()
+time.sleep({secs})
+cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+tb.stop()
+print(json.dumps({{'cpu_percent': 100 * cpu / wall}}), file=sys.stderr)
+'''
+
+def measure_cpu(n, secs, headless=True):
+    env = dict(os.environ, TBAR_FAKE_GPUS=str(n))
+    code = _cpu_child.format(root=root, secs=secs, headless=headless)
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    return json.loads(proc.stderr.strip().splitlines()[-1])
+
+
+def compare(key, result, baselines, tolerance):
+    base = baselines.get(key, None)
+    if not base:
+        return []
+    flags = []
+    for field in ['us', 'peak_kb', 'cpu_percent']:
+        if field in result and field in base and base[field] > 0 and result[field] > base[field] * (1 + tolerance):
+            flags.append(f'{field} {base[field]:.1f} -> {result[field]:.1f}')
+    return flags
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ops', nargs='+', default=list(_ops) + ['cpu_percent'])
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 8, 64])
+    parser.add_argument('--iters', type=int, default=200)
+    parser.add_argument('--cpu-secs', type=float, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.5)
+    parser.add_argument('--save', action='store_true', help='Write these results as the new baselines')
+    args = parser.parse_args()
+
+    baselines = json.load(open(_baselines)) if os.path.exists(_baselines) else {}
+    results, regressions = {}, []
+    print(f"{'op':<26} {'median us':>10} {'p99 us':>10} {'peak KB':>9} {'retained B':>11} {'cpu %':>7}")
+    for op in args.ops:
+        for n in args.devices:
+            key = f'{op}[{n}]'
+            if op == 'cpu_percent':
+                result = measure_cpu(n, args.cpu_secs)
+            else:
+                with ExitStack() as stack:
+                    result = measure(_ops[op](n, stack), args.iters)
+            results[key] = result
+            flags = compare(key, result, baselines, args.tolerance)
+            regressions += [(key, f) for f in flags]
+            cols = [f"{result[f]:>{w}.1f}" if f in result else ' ' * w for f, w in [('us', 10), ('p99_us', 10), ('peak_kb', 9), ('retained_b', 11), ('cpu_percent', 7)]]
+            print(f"{key:<26} {' '.join(cols)}{'  REGRESSION' if flags else ''}")
+
+    if args.save:
+        baselines.update({k: {f: round(v, 2) for f, v in r.items()} for k, r in results.items()})
+        with open(_baselines, 'w') as f:
+            json.dump(baselines, f, indent=1, sort_keys=True)
+        print(f'Saved {len(results)} baselines to {_baselines}')
+    elif regressions:
+        for key, flag in regressions:
+            print(f'Regression in {key}: {flag}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
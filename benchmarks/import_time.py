@@ -0,0 +1,65 @@
+"""
+Import-time budget for trainingbar.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and fails
+if the cumulative import time exceeds the budget or a forbidden module
+(tensorflow, GPUtil, google.cloud) was pulled in at import time.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module trainingbar.cli --budget-ms 800
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+_forbidden = ['tensorflow', 'GPUtil', 'google.cloud', 'google.auth', 'tpunicorn']
+_budgets = {
+    'trainingbar': 500.0,
+    'trainingbar.cli': 600.0,
+}
+
+def import_times(module):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+def check_module(module, budget_ms):
+    times = import_times(module)
+    total_ms = times[module][1] / 1000 if module in times else sum(t[0] for t in times.values()) / 1000
+    loaded = [m for m in times if any(m == f or m.startswith(f + '.') for f in _forbidden)]
+    slowest = sorted(times.items(), key=lambda x: x[1][0], reverse=True)[:10]
+    print(f'{module}: {total_ms:.1f}ms cumulative (budget {budget_ms:.0f}ms), {len(times)} modules')
+    for name, (self_us, _) in slowest:
+        print(f'  {self_us / 1000:8.2f}ms  {name}')
+    errors = []
+    if total_ms > budget_ms:
+        errors.append(f'{module} took {total_ms:.1f}ms to import, over the {budget_ms:.0f}ms budget')
+    if loaded:
+        errors.append(f'{module} imported {", ".join(sorted(loaded))} at import time')
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', action='append', default=None)
+    parser.add_argument('--budget-ms', type=float, default=None)
+    args = parser.parse_args()
+    errors = []
+    for module in (args.module or list(_budgets)):
+        errors += check_module(module, args.budget_ms or _budgets.get(module, 1000.0))
+    for e in errors:
+        print(f'FAIL: {e}')
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-call overhead of TrainingBar.step().
+
+Times a tight loop of tb.step(n_samples=..., n_tokens=...) from one or more
+threads while the background collector runs, against an empty loop, and fails
+if the overhead per call is over --budget-ns. The same loop is timed with
+TrainingBar(step_times=False), which skips the clock read, against
+--count-budget-ns.
+
+    python benchmarks/step_overhead.py --calls 1000000 --threads 1 4
+"""
+
+import os
+import sys
+import time
+import argparse
+from threading import Thread
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def loop(step, calls):
+    for _ in range(calls):
+        step(n_samples=32, n_tokens=4096)
+
+
+def empty(step, calls):
+    for _ in range(calls):
+        pass
+
+
+def timed(func, step, calls, threads):
+    workers = [Thread(target=func, args=(step, calls)) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=1000000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--budget-ns', type=float, default=750.0)
+    parser.add_argument('--count-budget-ns', type=float, default=500.0)
+    args = parser.parse_args()
+
+    from trainingbar import TrainingBar
+    failed = False
+    for step_times, budget in [(True, args.budget_ns), (False, args.count_budget_ns)]:
+        tb = TrainingBar(refresh_secs=1, xla=None, disabled=['disk'], authenticate=False, reinit=True, daemon=True, headless=True, step_times=step_times)
+        for threads in args.threads:
+            base = min(timed(empty, tb.step, args.calls, threads) for _ in range(3))
+            spent = min(timed(loop, tb.step, args.calls, threads) for _ in range(3))
+            # Threads share the GIL, so wall time over all calls is the per-call cost
+            ns = (spent - base) / (args.calls * threads) * 1e9
+            ok = ns <= budget
+            failed |= not ok
+            print(f'step_times={step_times!s:<5} threads={threads:<3} {ns:8.1f} ns/call  {"ok" if ok else "OVER BUDGET"} (budget {budget:.0f})')
+        time.sleep(1.5)
+        print({k: round(v, 3) for k, v in tb.stats()['step'].items()})
+        tb.stop()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
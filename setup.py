@@ -45,7 +45,8 @@ setup(
     include_package_data=True,
     extras_require={
         'tpu': ['tpunicorn', 'google-cloud-monitoring'],
-        'gpu': ['gputil'],
+        'gpu': ['nvidia-ml-py', 'gputil'],
+        'report': ['numpy'],
         'test': ['pytest'],
     },
     entry_points={
@@ -0,0 +1,39 @@
+import time
+
+
+class FakeTPUAPI:
+    """
+    Offline stand-in for tpunicorn.tpu: `tpus` maps zone -> list of TPU node dicts as
+    returned by the TPU API, `latency` maps zone -> seconds to sleep before answering.
+    """
+    def __init__(self, tpus=None, latency=None):
+        self.tpus = tpus or {}
+        self.latency = latency or {}
+        self.calls = []
+
+    @staticmethod
+    def node(name, zone, project='fake-project', mesh='v3-8', ip='10.0.0.2'):
+        return {'name': f'projects/{project}/locations/{zone}/nodes/{name}', 'acceleratorType': mesh, 'ipAddress': ip}
+
+    def get_tpus(self, zone, project=None):
+        self.calls.append(zone)
+        if self.latency.get(zone, None):
+            time.sleep(self.latency[zone])
+        return list(self.tpus.get(zone, []))
+
+
+class FakeTPUClusterResolver:
+    """Offline stand-in for TPUClusterResolver with `num_workers` workers on 10.0.0.x."""
+    num_workers = 1
+
+    def __init__(self, tpu_name=None):
+        self.tpu_name = tpu_name
+
+    def cluster_spec(self):
+        return self
+
+    def task_indices(self, job_name):
+        return list(range(self.num_workers))
+
+    def task_address(self, job_name, i):
+        return f'10.0.0.{i + 2}:8470'
@@ -0,0 +1,64 @@
+import asyncio
+
+from trainingbar.adaptive import AdaptiveIntervals
+from trainingbar.handlers.tpu import TPUMonitor
+
+
+def test_tpu_interval_floor():
+    adaptive = AdaptiveIntervals({'gpu': 10, 'tpu': 10}, min_secs=1.0, max_secs=30.0)
+    assert adaptive.intervals == {'gpu': 10.0, 'tpu': 60.0}
+    for _ in range(20):
+        adaptive.update('tpu', {'tpu_mxu_util': 0.0})
+        adaptive.update('tpu', {'tpu_mxu_util': 100.0})
+    assert adaptive.intervals['tpu'] == 60.0
+    assert AdaptiveIntervals({'tpu': 10}, floors={'tpu': 5.0}).intervals['tpu'] == 10.0
+    assert AdaptiveIntervals({'tpu': 10}, bounds={'tpu': (2, 20)}).intervals['tpu'] == 10.0
+
+
+def test_tpu_deadline_follows_interval():
+    client = lambda config=False, ops=None: {'xla': {}}
+    monitor = TPUMonitor(client, delay=10)
+    assert monitor.deadline == 8.0
+    monitor.delay = 60.0
+    assert monitor.deadline == 48.0
+    assert TPUMonitor(client, delay=10, deadline=3.0).deadline == 3.0
+
+
+def test_async_bar_applies_adaptive_intervals():
+    from trainingbar.asyncbar import AsyncTrainingBar
+
+    async def run():
+        tb = AsyncTrainingBar(refresh_secs=1, daemon=True, xla='gpu', xla_params={'gpu_backend': 'sim', 'sim_devices': 2}, disabled=['disk'],
+            authenticate=False, reinit=True, headless=True, adaptive={'min_secs': 0.05, 'max_secs': 0.05})
+        samples = []
+        record = tb.record
+        tb.record = lambda op, data, ts: (samples.append(op), record(op, data, ts))[1]
+        async with tb:
+            assert tb.adaptive is not None
+            assert tb.handlers['gpu'].delay == 0.05
+            await asyncio.sleep(0.5)
+        assert tb.tasks == {}
+        return samples
+
+    samples = asyncio.run(run())
+    # Sampled at the adaptive 50ms interval, not the 1s refresh
+    assert samples.count('gpu') >= 5
+
+
+def test_async_bar_wakes_on_shorter_interval():
+    from trainingbar.asyncbar import AsyncTrainingBar
+
+    async def run():
+        tb = AsyncTrainingBar(refresh_secs=1, daemon=True, xla='gpu', xla_params={'gpu_backend': 'sim', 'sim_devices': 2}, disabled=['disk'],
+            authenticate=False, reinit=True, headless=True, intervals={'gpu': 30})
+        samples = []
+        record = tb.record
+        tb.record = lambda op, data, ts: (samples.append(op), record(op, data, ts))[1]
+        async with tb:
+            await asyncio.sleep(0.1)
+            assert samples.count('gpu') == 1
+            tb.set_interval('gpu', 0.05)
+            await asyncio.sleep(0.5)
+        return samples
+
+    assert asyncio.run(run()).count('gpu') >= 5
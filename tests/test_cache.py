@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from trainingbar.config import prereqs
+from trainingbar.handlers import host
+
+
+def test_cache_round_trip(cache_home):
+    assert prereqs.write_cache('thing.json', {'a': [1, 2]})
+    assert prereqs.read_cache('thing.json') == {'a': [1, 2]}
+    assert prereqs.read_cache('thing.json', ttl=-1) is None
+    assert os.listdir(cache_home) == ['thing.json']
+
+
+def test_unserializable_value_keeps_previous_file(cache_home):
+    assert prereqs.write_cache('thing.json', {'a': 1})
+    assert not prereqs.write_cache('thing.json', {'a': object()})
+    assert prereqs.read_cache('thing.json') == {'a': 1}
+    assert os.listdir(cache_home) == ['thing.json']
+
+
+def test_truncated_or_foreign_file_is_a_miss(cache_home):
+    prereqs.cache_dir()
+    with open(cache_home / 'thing.json', 'w') as f:
+        f.write('{"time": 1, "val')
+    assert prereqs.read_cache('thing.json') is None
+    with open(cache_home / 'thing.json', 'w') as f:
+        f.write('[1, 2]')
+    assert prereqs.read_cache('thing.json') is None
+
+
+def test_fingerprint_needs_plain_arguments():
+    assert host.host_fingerprint('gpu', {'gpu_backend': 'fake'}, False, None) == host.host_fingerprint('gpu', {'gpu_backend': 'fake'}, False, None)
+    assert host.host_fingerprint('gpu', {'gpu_backend': 'fake'}, False, None) != host.host_fingerprint('gpu', {'gpu_backend': 'sim'}, False, None)
+    assert host.host_fingerprint('gpu', {'gpu_backend': object()}, False, None) is None
+
+
+def test_backend_object_skips_host_cache(cache_home, monkeypatch):
+    from trainingbar.handlers.gpu_backends import NVMLBackend, FakeNVML
+    monkeypatch.setattr(host, 'host_config', None)
+    config = host.config_host('gpu', {'gpu_backend': NVMLBackend(nvml=FakeNVML(num_gpus=2))}, False, None)
+    assert config['xla']['gpu_backend'] == 'nvml' and len(config['xla']['gpus']) == 2
+    assert not (cache_home / 'host.json').exists()
+
+    monkeypatch.setattr(host, 'host_config', None)
+    host.config_host('gpu', {'gpu_backend': 'fake'}, False, None)
+    assert prereqs.read_cache('host.json')['config']['xla']['gpu_backend'] == 'fake'
+
+
+@pytest.mark.parametrize('cached', [{'colab': False}, ['not', 'a', 'dict'], 'tf2'])
+def test_env_reprobes_incomplete_cache(cached, monkeypatch):
+    probes = {'colab': False, 'tf2': True, 'profiler': False}
+    calls = []
+    monkeypatch.setattr(prereqs, 'probe_env', lambda: calls.append(1) or dict(probes))
+    name = f'env-{prereqs.probe_key()}.json'
+    prereqs.write_cache(name, cached)
+    env = prereqs.configure_env()
+    assert env['tf2'] is True and env.probed
+    assert env.get('missing') is None
+    assert prereqs.read_cache(name) == probes
+    # Complete now, so the next process reads it instead of probing
+    assert prereqs.configure_env()['profiler'] is False
+    assert calls == [1]
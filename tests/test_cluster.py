@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from trainingbar.cluster import ClusterAgent, ClusterCoordinator
+
+
+def wait_for(check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def connections(coordinator):
+    # The listening socket is registered too
+    return len(coordinator._selector.get_map()) - 1
+
+
+@pytest.fixture
+def coordinator():
+    coordinator = ClusterCoordinator(port=0, host='127.0.0.1', stale_secs=30).start()
+    yield coordinator
+    coordinator.stop()
+
+
+def stats(gpu_util, ram_used):
+    return {'gpu': {0: {'gpu_util': gpu_util}}, 'cpu': {'ram_used': ram_used}}
+
+
+def test_merges_snapshots_from_two_agents(coordinator):
+    agents = [ClusterAgent(('127.0.0.1', coordinator.port), host_id=f'worker-{i}') for i in range(2)]
+    assert agents[0].send(stats(90.0, 10.0))
+    assert agents[1].send(stats(30.0, 20.0))
+    assert wait_for(lambda: coordinator.frames == 2)
+    summary = coordinator.summary()
+    assert summary['hosts'] == 2
+    util = summary['metrics']['gpu.0.gpu_util']
+    assert (util['min'], util['mean'], util['max']) == (30.0, 60.0, 90.0)
+    assert (util['min_host'], util['max_host'], util['hosts']) == ('worker-1', 'worker-0', 2)
+    assert summary['metrics']['cpu.ram_used']['mean'] == 15.0
+    assert summary['stragglers'] == ['worker-1']
+
+    # Later frames only carry changed values; unchanged ones keep their last value
+    assert agents[1].send(stats(80.0, 20.0))
+    assert wait_for(lambda: coordinator.frames == 3)
+    summary = coordinator.summary()
+    assert summary['metrics']['gpu.0.gpu_util']['min'] == 80.0
+    assert summary['metrics']['cpu.ram_used']['max'] == 20.0
+    assert summary['stragglers'] == []
+    for agent in agents:
+        agent.close()
+
+
+def test_agent_disconnect(coordinator):
+    agents = [ClusterAgent(('127.0.0.1', coordinator.port), host_id=f'worker-{i}', retry_secs=0) for i in range(2)]
+    for i, agent in enumerate(agents):
+        assert agent.send(stats(50.0 + i, 10.0))
+    assert wait_for(lambda: coordinator.frames == 2 and connections(coordinator) == 2)
+
+    agents[1].close()
+    assert wait_for(lambda: connections(coordinator) == 1)
+    # The other agent keeps streaming and the dropped host stays in the summary until it goes stale
+    assert agents[0].send(stats(70.0, 10.0))
+    assert wait_for(lambda: coordinator.frames == 3)
+    summary = coordinator.summary()
+    assert summary['hosts'] == 2
+    assert summary['metrics']['gpu.0.gpu_util']['max'] == 70.0
+    assert summary['stale'] == []
+    assert coordinator.summary(now=time.time() + 60)['stale'] == ['worker-0', 'worker-1']
+
+    # Reconnecting sends the metric names again and reuses the host's row
+    assert agents[1].send(stats(40.0, 10.0))
+    assert wait_for(lambda: coordinator.frames == 4)
+    summary = coordinator.summary()
+    assert summary['hosts'] == 2
+    assert summary['metrics']['gpu.0.gpu_util']['min'] == 40.0
+    assert coordinator.errors == 0
+    for agent in agents:
+        agent.close()
+
+
+def test_agent_survives_coordinator_going_away():
+    coordinator = ClusterCoordinator(port=0, host='127.0.0.1').start()
+    agent = ClusterAgent(('127.0.0.1', coordinator.port), host_id='worker-0', retry_secs=60)
+    assert agent.send(stats(50.0, 10.0))
+    coordinator.stop()
+    # The first write after a reset may still be buffered; the agent gives up within a few sends
+    assert wait_for(lambda: not agent.send(stats(50.0, 10.0)))
+    assert not agent.stats()['connected']
+    assert agent.errors >= 1
+    agent.close()
@@ -0,0 +1,78 @@
+import random
+
+from trainingbar.bar import TrainingBar
+from trainingbar.detector import StallDetector
+
+
+def feed(detector, values, start=0.0, step=1.0, metric='gpu.0.gpu_util'):
+    events = []
+    for i, value in enumerate(values):
+        events += detector.observe(metric, value, start + i * step, detector.rule(metric))
+    return events
+
+
+def kinds(events):
+    return [e['event'] for e in events]
+
+
+def test_stall_after_working_then_recovered():
+    detector = StallDetector(stall_secs=10)
+    events = feed(detector, [90.0] * 20 + [0.0] * 25 + [85.0])
+    assert kinds(events) == ['stall', 'stall', 'recovered']
+    stall = events[0]
+    assert stall['device'] == 'gpu.0' and stall['metric'] == 'gpu.0.gpu_util'
+    assert stall['duration'] == 10.0 and stall['value'] == 0.0
+    assert events[-1]['duration'] == 25.0
+    assert detector.stats()['events']['stall'] == 2
+    assert detector.stats()['stalled'] == []
+
+
+def test_idle_from_the_start_is_not_a_stall():
+    detector = StallDetector(stall_secs=5)
+    assert feed(detector, [0.0] * 50) == []
+
+
+def test_drop_is_reported_once_and_recovers():
+    random.seed(0)
+    detector = StallDetector(drop_secs=5)
+    baseline = [80.0 + random.uniform(-1, 1) for _ in range(30)]
+    events = feed(detector, baseline + [30.0] * 10 + [80.0])
+    assert kinds(events) == ['drop', 'recovered']
+    assert events[0]['baseline'] > 75.0
+    assert events[0]['duration'] >= 5.0
+
+
+def test_cusum_finds_a_level_shift():
+    random.seed(1)
+    detector = StallDetector()
+    values = [50.0 + random.uniform(-1, 1) for _ in range(30)] + [60.0 + random.uniform(-1, 1) for _ in range(30)]
+    events = feed(detector, values)
+    assert kinds(events) == ['change']
+    # The baseline restarts from the new level, so it doesn't fire again
+    assert 55.0 < detector.states['gpu.0.gpu_util'].mean < 65.0
+
+
+def test_update_only_watches_configured_metrics():
+    detector = StallDetector(stall_secs=1)
+    assert 'cpu_util' not in detector.rules
+    for t in range(5):
+        detector.update({'cpu_util': 50.0, 0: {'gpu_util': 50.0}}, ts=float(t), prefix='gpu.')
+    assert sorted(detector.states) == ['gpu.0.gpu_util']
+    detector.configure('cpu_util', idle=2.0)
+    detector.update({'cpu_util': 50.0}, ts=10.0)
+    assert 'cpu_util' in detector.states
+
+
+def test_bar_runs_detector_only_for_event_hooks():
+    tb = TrainingBar(xla=None, disabled=['disk'], authenticate=False, reinit=True, headless=True)
+    tb.detector.configure('gpu_util', stall_secs=2)
+    samples = [90.0] * 5 + [0.0] * 5
+    for t, value in enumerate(samples):
+        tb.record('gpu', {0: {'gpu_util': value}}, 1000.0 + t)
+    assert tb.detector.states == {}
+    got = []
+    tb.add_event_hook('stalls', got.append, events=['stall'], device='gpu.0')
+    for t, value in enumerate(samples):
+        tb.record('gpu', {0: {'gpu_util': value}}, 2000.0 + t)
+    tb.hooks.stop(wait=True)
+    assert [e['event'] for e in got] == ['stall', 'stall']
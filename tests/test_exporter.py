@@ -0,0 +1,28 @@
+import time
+import urllib.request
+
+from trainingbar.exporter import MetricsExporter
+
+
+def scrape(exporter):
+    with urllib.request.urlopen(f'http://127.0.0.1:{exporter.port}/metrics', timeout=2) as r:
+        return r.read().decode('utf8')
+
+
+def test_serves_published_stats():
+    exporter = MetricsExporter(port=0, host='127.0.0.1').start()
+    exporter.publish({'cpu': {'cpu_util': 12.5}})
+    assert 'cpu_util' in scrape(exporter)
+    assert exporter.scrapes == 1
+    exporter.stop(wait=True)
+
+
+def test_stop_does_not_wait_for_the_serve_loop():
+    exporter = MetricsExporter(port=0, host='127.0.0.1').start()
+    start = time.perf_counter()
+    exporter.stop()
+    assert time.perf_counter() - start < 0.02
+    exporter = MetricsExporter(port=0, host='127.0.0.1').start()
+    start = time.perf_counter()
+    exporter.stop(wait=True)
+    assert time.perf_counter() - start < 0.2
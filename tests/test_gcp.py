@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+monitoring_v3 = pytest.importorskip('google.cloud.monitoring_v3')
+import google.auth
+
+from trainingbar.gcp import GCPClients
+
+
+class FakeCredentials:
+    def refresh(self, request):
+        pass
+
+
+class FakeClient:
+    def __init__(self, credentials=None):
+        self.credentials = credentials
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    monkeypatch.setattr(google.auth, 'default', lambda: (FakeCredentials(), 'fake-project'))
+    monkeypatch.setattr(monitoring_v3, 'MetricServiceClient', FakeClient)
+    monkeypatch.setattr(monitoring_v3, 'MetricServiceAsyncClient', type('FakeAsyncClient', (FakeClient,), {}))
+    return GCPClients()
+
+
+def test_sync_client_is_shared(clients):
+    assert clients.client() is clients.client('fake-project')
+    assert clients.stats()['channels'] == 1 and clients.stats()['credential_loads'] == 1
+
+
+def test_async_client_per_event_loop(clients):
+    async def get():
+        return clients.client(asynchronous=True), clients.client(asynchronous=True)
+
+    first, again = asyncio.run(get())
+    assert first is again
+    second, _ = asyncio.run(get())
+    assert second is not first
+    assert clients.stats()['channels'] == 2
+    with pytest.raises(RuntimeError):
+        clients.client(asynchronous=True)
@@ -0,0 +1,123 @@
+import pytest
+
+from trainingbar.handlers import gpu_backends
+from trainingbar.handlers.gpu import GPUMonitor, check_gpu
+from trainingbar.handlers.gpu_backends import FakeNVML, NVMLBackend, GPUBackend, get_backend
+from trainingbar.simulation import SimulatedGPUBackend
+
+
+def client_for(gpus):
+    host = {'xla': {'gpu_backend': 'fake', 'gpus': gpus}}
+    return lambda config=False, ops=None: host
+
+
+def test_fake_backend_stats():
+    backend = NVMLBackend(nvml=FakeNVML(num_gpus=4, seed=0))
+    monitor = GPUMonitor(client_for(None), backend=backend)
+    assert len(monitor) == 4 and not monitor.stopped
+    stats = monitor.update()
+    assert sorted(stats) == [0, 1, 2, 3]
+    for gpu in stats.values():
+        assert gpu['name'].startswith('Fake GPU')
+        assert gpu['vram_total'] == 16 * 1024
+        assert 0 <= gpu['vram_used'] <= gpu['vram_total']
+        assert 0 <= gpu['gpu_util'] <= 100
+        assert gpu['vram_util'] == pytest.approx(gpu['vram_used'] / gpu['vram_total'] * 100)
+    assert monitor.last_sample is not None
+    monitor.stop()
+    assert backend.nvml.initialized == 0
+
+
+def test_monitor_tracks_only_active_gpus():
+    monitor = GPUMonitor(client_for({'1': {}, '3': {}}), backend=NVMLBackend(nvml=FakeNVML(num_gpus=4, seed=0)))
+    assert sorted(monitor.update()) == [1, 3]
+
+
+def test_monitor_without_devices_stops():
+    monitor = GPUMonitor(client_for(None), backend=NVMLBackend(nvml=FakeNVML(num_gpus=0)))
+    assert len(monitor) == 0
+    assert monitor.stopped
+    assert monitor.update() == {}
+
+
+def test_missing_device_and_utilization_errors():
+    class NoUtilization(FakeNVML):
+        def nvmlDeviceGetUtilizationRates(self, handle):
+            raise self.NVMLError('Not Supported')
+
+    nvml = NoUtilization(num_gpus=2)
+    with pytest.raises(nvml.NVMLError):
+        nvml.nvmlDeviceGetHandleByIndex(2)
+    sample = NVMLBackend(nvml=nvml).sample()
+    assert sorted(sample) == [0, 1]
+    assert all(gpu['gpu_util'] == 0.0 for gpu in sample.values())
+
+
+def test_process_memory():
+    backend = NVMLBackend(nvml=FakeNVML(num_gpus=2))
+    procs = backend.processes()
+    assert sorted(procs) == [0, 1]
+    assert all(len(pids) == 1 for pids in procs.values())
+    assert GPUBackend().processes() is None
+
+
+def test_backend_selection(monkeypatch):
+    monkeypatch.setenv('TBAR_FAKE_GPUS', '3')
+    fake = get_backend('fake')
+    assert isinstance(fake, NVMLBackend) and len(fake) == 3
+    assert get_backend(fake) is fake
+    sim = get_backend('sim', {'sim_devices': 16})
+    assert isinstance(sim, SimulatedGPUBackend) and len(sim) == 16
+
+
+def test_auto_backend_falls_back(monkeypatch):
+    class Broken(GPUBackend):
+        def __init__(self):
+            raise ImportError('no driver')
+
+    class Works(GPUBackend):
+        name = 'gputil'
+
+        def devices(self):
+            return [{'idx': 0, 'name': 'GPU', 'vram_total': 1.0, 'vram_used': 0.0, 'vram_util': 0.0, 'gpu_util': 0.0}]
+
+    monkeypatch.setattr(gpu_backends, '_backends', {'nvml': Broken, 'gputil': Works})
+    assert isinstance(get_backend('auto'), Works)
+    monkeypatch.setattr(gpu_backends, '_backends', {'nvml': Broken, 'gputil': Broken})
+    assert get_backend('auto') is None
+
+
+def test_check_gpu_limits_devices(monkeypatch):
+    monkeypatch.delenv('CUDA_VISIBLE_DEVICES', raising=False)
+    monkeypatch.setenv('TBAR_FAKE_GPUS', '4')
+    params, found = check_gpu({'gpu_backend': 'fake', 'limit_gpu': [0, 2]})
+    assert found
+    assert params['total_gpus'] == 4 and params['active_gpus'] == 2
+    assert sorted(params['gpus']) == [0, 2]
+
+
+def test_check_gpu_without_devices(monkeypatch):
+    from trainingbar.handlers import gpu
+    monkeypatch.setattr(gpu, 'get_backend', lambda *a, **k: None)
+    params, found = check_gpu({})
+    assert not found and params['gpus'] == {}
+
+
+def test_check_gpu_leaves_caller_backend_open():
+    backend = NVMLBackend(nvml=FakeNVML(num_gpus=2, seed=0))
+    params, found = check_gpu({'gpu_backend': backend})
+    assert found and params['active_gpus'] == 2
+    assert params['gpu_backend'] == 'nvml'
+    assert backend.nvml.initialized == 1
+
+
+def test_trainingbar_uses_backend_object():
+    from trainingbar.bar import TrainingBar
+    backend = NVMLBackend(nvml=FakeNVML(num_gpus=2, seed=0))
+    tb = TrainingBar(xla='gpu', xla_params={'gpu_backend': backend}, disabled=['disk'], authenticate=False, reinit=True, headless=True)
+    assert tb.host['xla']['gpu_backend'] == 'nvml'
+    tb.prepare()
+    monitor = tb.handlers['gpu']
+    assert monitor.backend is backend and not monitor.stopped
+    assert sorted(monitor.update()) == [0, 1]
+    tb.stop()
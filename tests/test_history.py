@@ -0,0 +1,13 @@
+from trainingbar.history import flatten_metrics
+
+
+def test_flatten_keeps_counters_and_drops_capacities():
+    stats = {
+        'ram_used': 5.0, 'ram_total': 16.0, 'disk_total': 100, 'swap_total': 1,
+        0: {'idx': 0, 'gpu_util': 50, 'vram_used': 2.0, 'vram_total': 16.0, 'name': 'Fake GPU', 'busy': True},
+        'tpu_mem_total': 8.0, 'steps_total': 10, 'samples_total': 320, 'tokens_total': 4096,
+    }
+    assert dict(flatten_metrics(stats, 'x.')) == {
+        'x.ram_used': 5.0, 'x.0.gpu_util': 50, 'x.0.vram_used': 2.0,
+        'x.steps_total': 10, 'x.samples_total': 320, 'x.tokens_total': 4096,
+    }
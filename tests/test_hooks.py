@@ -0,0 +1,82 @@
+import json
+import time
+from threading import Event
+
+import pytest
+
+from trainingbar.hooks import HookDispatcher, FrozenDict, freeze, thaw
+
+
+def wait_for(check, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_frozen_snapshot_is_read_only_and_serializable():
+    stats = {'gpu': {0: {'gpu_util': 50.0, 'procs': [1, 2]}}, 'cpu': {'cpu_util': 3.0}}
+    frozen = freeze(stats)
+    assert isinstance(frozen, FrozenDict) and isinstance(frozen['gpu'][0], dict)
+    assert json.loads(json.dumps(frozen)) == {'gpu': {'0': {'gpu_util': 50.0, 'procs': [1, 2]}}, 'cpu': {'cpu_util': 3.0}}
+    for change in [lambda: frozen.update(a=1), lambda: frozen['gpu'][0].pop('gpu_util'), lambda: frozen.setdefault('x', 1)]:
+        with pytest.raises(TypeError):
+            change()
+    stats['gpu'][0]['gpu_util'] = 99.0
+    assert frozen['gpu'][0]['gpu_util'] == 50.0
+    copy = thaw(frozen)
+    copy['gpu'][0]['procs'].append(3)
+    assert type(copy['gpu']) is dict and frozen['gpu'][0]['procs'] == (1, 2)
+
+
+def test_dispatch_follows_each_hooks_frequency():
+    hooks = HookDispatcher()
+    every, third = [], []
+    hooks.add('every', every.append, freq=1)
+    hooks.add('third', third.append, freq=3)
+    hooks.add('events', lambda m: pytest.fail('freq=0 hooks only get fire()'), freq=0)
+    for idx in range(1, 10):
+        hooks.dispatch({'idx': idx}, idx)
+    assert wait_for(lambda: len(every) == 9 and len(third) == 3)
+    assert [m['idx'] for m in third] == [3, 6, 9]
+    hooks.stop(wait=True)
+
+
+@pytest.mark.parametrize('policy, kept', [('drop_oldest', [0, 7, 8, 9]), ('drop_newest', [0, 1, 2, 3]), ('coalesce', [0, 9])])
+def test_policies_when_a_hook_falls_behind(policy, kept):
+    release = Event()
+    got = []
+    def slow(message):
+        release.wait(2.0)
+        got.append(message)
+    hooks = HookDispatcher()
+    hooks.add('slow', slow, freq=1, queue_size=3, policy=policy)
+    hooks.fire('slow', 0)
+    assert wait_for(lambda: not hooks.hooks['slow'].queue)
+    for i in range(1, 10):
+        hooks.fire('slow', i)
+    release.set()
+    assert wait_for(lambda: not hooks.hooks['slow'].running)
+    assert got == kept
+    assert hooks.stats()['slow']['drops'] == 10 - len(kept)
+    hooks.stop(wait=True)
+
+
+def test_errors_are_counted_not_raised():
+    hooks = HookDispatcher()
+    hooks.add('bad', lambda m: 1 / 0, freq=1)
+    hooks.dispatch({}, 1)
+    assert wait_for(lambda: hooks.stats()['bad']['errors'] == 1)
+    assert hooks.stats()['bad']['calls'] == 1
+    hooks.stop(wait=True)
+
+
+def test_fire_after_stop_does_nothing():
+    hooks = HookDispatcher()
+    hooks.add('a', lambda m: pytest.fail('called after stop'), freq=1)
+    hooks.stop()
+    assert hooks.fire('a', {}) is False
+    hooks.dispatch({}, 1)
+    assert hooks._pool is None
@@ -0,0 +1,39 @@
+import os
+import sys
+import subprocess
+
+import psutil
+import pytest
+
+from trainingbar.handlers.process import ProcessMonitor
+
+
+@pytest.fixture
+def child():
+    proc = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+def test_counts_children(child):
+    monitor = ProcessMonitor(delay=1)
+    stats = monitor.update()
+    assert stats['proc_count'] >= 2
+    assert stats['proc_rss'] > 0
+
+
+@pytest.mark.parametrize('error', [psutil.AccessDenied, psutil.ZombieProcess])
+def test_skips_unreadable_child(child, monkeypatch, error):
+    cpu_percent = psutil.Process.cpu_percent
+    def denied(proc, *args, **kwargs):
+        if proc.pid == child.pid:
+            raise error(proc.pid)
+        return cpu_percent(proc, *args, **kwargs)
+    monkeypatch.setattr(psutil.Process, 'cpu_percent', denied)
+    monitor = ProcessMonitor(delay=1)
+    stats = monitor.update()
+    assert not monitor.stopped
+    assert child.pid in monitor.procs
+    assert stats['proc_count'] == len(monitor.procs) - 1
+    assert stats['proc_rss'] >= psutil.Process(os.getpid()).memory_info().rss // 2
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from trainingbar.recorder import MetricRecorder, MetricLog
+
+
+def brute(records, lo_ms, hi_ms):
+    t = records['t']
+    return records[(t >= lo_ms) & (t <= hi_ms)]
+
+
+@pytest.mark.parametrize('index_every', [4, 16, 64])
+def test_seek_matches_a_full_scan(tmp_path, index_every):
+    path = str(tmp_path / 'run.tbar')
+    # Runs of records sharing one ms span several index blocks, like sim mode writes
+    rng = np.random.default_rng(0)
+    with MetricRecorder(path, capacity=16384, index_every=index_every, flush_secs=0) as rec:
+        base = rec.base_time
+        ms = 0
+        for _ in range(60):
+            ms += int(rng.integers(0, 3))
+            for _ in range(int(rng.integers(1, 3 * index_every))):
+                assert rec.append('m', 1.0, base + ms / 1000.0)
+    with MetricLog(path) as log:
+        records = log.records()
+        times = sorted(set(records['t'].tolist()))
+        for lo in times + [-5, times[-1] + 5]:
+            for hi in [lo, lo + 1, lo + 7, times[-1] + 5]:
+                got = log.records(base + lo / 1000.0, base + hi / 1000.0)
+                want = brute(records, lo, hi)
+                assert len(got) == len(want), (lo, hi)
+                assert (got['t'] == want['t']).all()
+        # Views into the map must go before it closes
+        del records, got, want
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'run.tbar')
+    with MetricRecorder(path, capacity=64, index_every=4, flush_secs=0) as rec:
+        base = rec.base_time
+        rec.record({'cpu_util': 12.5, 'ram_used': 3.0}, ts=base + 1.0)
+        rec.record({0: {'gpu_util': 50.0}, 1: {'gpu_util': 75.0}}, ts=base + 2.0, prefix='gpu.')
+        assert rec.append('cpu_util', 25.0, base + 3.0)
+        # A late sample is clamped to the last time so t stays sorted
+        assert rec.append('cpu_util', 30.0, base + 2.5)
+    assert not rec.append('cpu_util', 1.0, base + 4.0)
+    with MetricLog(path) as log:
+        assert log.count == 6
+        assert log.metrics() == ['cpu_util', 'ram_used', 'gpu.0.gpu_util', 'gpu.1.gpu_util']
+        assert list(log.iter_records()) == [
+            (base + 1.0, 'cpu_util', 12.5), (base + 1.0, 'ram_used', 3.0),
+            (base + 2.0, 'gpu.0.gpu_util', 50.0), (base + 2.0, 'gpu.1.gpu_util', 75.0),
+            (base + 3.0, 'cpu_util', 25.0), (base + 3.0, 'cpu_util', 30.0)]
+        ts, values = log.read('cpu_util')
+        assert ts.tolist() == [base + 1.0, base + 3.0, base + 3.0]
+        assert values.tolist() == [12.5, 25.0, 30.0]
+        # Both bounds are inclusive
+        ts, values = log.read('cpu_util', base + 1.0, base + 2.0)
+        assert values.tolist() == [12.5]
+        ts, values = log.read('gpu.1.gpu_util', base + 2.0, base + 2.0)
+        assert values.tolist() == [75.0]
+        assert len(log.records(base + 3.5)) == 0
+        del ts, values
+
+
+def test_full_log_stops_recording(tmp_path):
+    path = str(tmp_path / 'run.tbar')
+    with MetricRecorder(path, capacity=3, index_every=2, flush_secs=0) as rec:
+        assert all(rec.append('m', float(i)) for i in range(3))
+        assert not rec.append('m', 3.0)
+        assert rec.full and rec.stopped
+    with MetricLog(path) as log:
+        assert [v for _, _, v in log.iter_records()] == [0.0, 1.0, 2.0]
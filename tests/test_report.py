@@ -0,0 +1,58 @@
+import pytest
+
+from trainingbar.recorder import MetricRecorder
+from trainingbar.report import analyze, format_table
+
+
+@pytest.fixture
+def run(tmp_path):
+    # Two minutes at 1s: the GPU busy for the first, idle for the second
+    path = str(tmp_path / 'run.tbar')
+    with MetricRecorder(path, capacity=1024, index_every=16, flush_secs=0) as rec:
+        base = rec.base_time
+        for t in range(120):
+            rec.record({0: {'gpu_util': 90.0 if t < 60 else 5.0, 'vram_used': float(t)}}, ts=base + t, prefix='gpu.')
+    return path, base
+
+
+def rows(result):
+    return {r['metric']: r for r in result['metrics']}
+
+
+def test_whole_run(run):
+    path, base = run
+    result = analyze(path, high=80, low=10)
+    assert result['summary']['records'] == 240
+    assert result['summary']['start'] == base and result['summary']['end'] == base + 119
+    util = rows(result)['gpu.0.gpu_util']
+    assert util['samples'] == 120 and util['mean'] == pytest.approx(47.5)
+    assert (util['p50'], util['p90'], util['p99']) == (5.0, 90.0, 90.0)
+    # Each sample holds until the next one
+    assert util['minutes'] == pytest.approx(119 / 60)
+    assert util['minutes_above_80'] == pytest.approx(1.0)
+    assert util['idle_minutes'] == util['minutes_below_10'] == pytest.approx(59 / 60)
+    assert rows(result)['gpu.0.vram_used']['high_water'] == 119.0
+
+
+def test_chunks_give_the_same_answer(run):
+    path, _ = run
+    assert analyze(path, chunk_size=7)['metrics'] == analyze(path)['metrics']
+
+
+def test_window_and_filter(run):
+    path, base = run
+    result = analyze(path, start=base + 60, end=base + 119, metrics=['gpu_util'])
+    assert result['summary']['records'] == 120
+    util, = result['metrics']
+    assert util['samples'] == 60 and util['max'] == 5.0 and util['minutes_above_80'] == 0.0
+    # Offsets count back from the last record
+    assert analyze(path, start='-29s')['summary']['records'] == 60
+
+
+def test_format_table(run):
+    path, _ = run
+    lines = format_table(analyze(path)).splitlines()
+    assert lines[0].split()[:3] == ['metric', 'samples', 'mean']
+    assert set(lines[1]) == {'-'}
+    assert lines[2].startswith('gpu.0.gpu_util') and lines[3].startswith('gpu.0.vram_used')
+    assert lines[-1].startswith('240 records from')
@@ -0,0 +1,85 @@
+import time
+from threading import Event
+
+import pytest
+
+from trainingbar.scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler()
+    yield scheduler
+    scheduler.stop()
+
+
+def wait_for(check, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_ticks_stay_on_the_epoch_grid(scheduler):
+    stamps = {'a': [], 'b': []}
+    # Collection cost must not push later ticks back
+    scheduler.add('a', lambda ts: (stamps['a'].append(ts), time.sleep(0.02)), 0.05, immediate=False)
+    scheduler.add('b', stamps['b'].append, 0.05, immediate=False)
+    scheduler.start()
+    assert wait_for(lambda: len(stamps['a']) >= 5 and len(stamps['b']) >= 5)
+    scheduler.stop()
+    for ts in stamps['a'] + stamps['b']:
+        k = (ts - scheduler.wall_epoch) / 0.05
+        assert abs(k - round(k)) < 1e-3
+    # Collectors on the same interval share timestamps
+    assert stamps['a'][:4] == stamps['b'][:4]
+
+
+def test_immediate_job_runs_at_once(scheduler):
+    ran = Event()
+    scheduler.add('now', lambda ts: ran.set(), 60)
+    start = time.monotonic()
+    scheduler.start()
+    assert ran.wait(1.0)
+    assert time.monotonic() - start < 0.5
+
+
+def test_busy_job_skips_ticks(scheduler):
+    release = Event()
+    job = scheduler.add('slow', lambda ts: release.wait(2.0), 0.01)
+    scheduler.start()
+    assert wait_for(lambda: job.skipped >= 5)
+    release.set()
+    assert wait_for(lambda: job.runs >= 1)
+    assert job.runs < job.skipped
+
+
+def test_set_interval_takes_effect_before_the_old_deadline(scheduler):
+    job = scheduler.add('a', lambda ts: None, 30)
+    scheduler.start()
+    assert wait_for(lambda: job.runs == 1)
+    scheduler.set_interval('a', 0.01)
+    assert wait_for(lambda: job.runs >= 5, timeout=1.0)
+
+
+def test_remove_stops_a_job(scheduler):
+    job = scheduler.add('a', lambda ts: None, 0.01)
+    scheduler.start()
+    assert wait_for(lambda: job.runs >= 2)
+    scheduler.remove('a')
+    time.sleep(0.05)
+    runs = job.runs
+    time.sleep(0.05)
+    assert job.runs == runs and len(scheduler) == 0
+
+
+def test_stop_returns_within_milliseconds(scheduler):
+    scheduler.add('a', lambda ts: None, 30, immediate=False)
+    scheduler.start()
+    time.sleep(0.02)
+    start = time.perf_counter()
+    scheduler.stop()
+    assert time.perf_counter() - start < 0.05
+    assert not scheduler.running
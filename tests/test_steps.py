@@ -0,0 +1,58 @@
+from threading import Thread
+
+import pytest
+
+from trainingbar import steps
+from trainingbar.steps import StepCounter, StepMonitor
+
+
+def fake_clock(monkeypatch, ticks):
+    ticks = iter(ticks)
+    monkeypatch.setattr(steps, '_perf_counter', lambda: next(ticks))
+
+
+def test_step_times_between_stamps(monkeypatch):
+    fake_clock(monkeypatch, [10.0, 10.5, 11.5, 11.75])
+    counter = StepCounter()
+    cursors = {}
+    counter.step(n_samples=2)
+    assert counter.step_times(cursors) == []
+    counter.step(n_samples=2)
+    counter.step(n_samples=2, n_tokens=5)
+    assert counter.step_times(cursors) == [0.5, 1.0]
+    counter.step()
+    assert counter.step_times(cursors) == [0.25]
+    assert counter.totals() == (4, 6, 5)
+
+
+def test_step_times_keep_only_the_ring(monkeypatch):
+    fake_clock(monkeypatch, [float(i * i) for i in range(3000)])
+    counter = StepCounter()
+    for _ in range(3000):
+        counter.step()
+    times = counter.step_times({})
+    assert len(times) == steps._time_capacity - 1
+    assert times[-1] == 2999 ** 2 - 2998 ** 2
+
+
+def test_count_skips_the_clock(monkeypatch):
+    monkeypatch.setattr(steps, '_perf_counter', lambda: pytest.fail('clock read'))
+    counter = StepCounter()
+    for _ in range(10):
+        counter.count(n_samples=1, n_tokens=3)
+    assert counter.totals() == (10, 10, 30)
+    assert counter.step_times({}) == []
+
+
+def test_counts_from_many_threads():
+    counter = StepCounter()
+    workers = [Thread(target=lambda: [counter.step(n_samples=1) for _ in range(1000)]) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert counter.totals() == (4000, 4000, 0)
+    assert len(counter.step_times({})) == 4 * 999
+    stats = StepMonitor(counter).update()
+    assert stats['steps_total'] == 4000
+    assert stats['step_time_p50_ms'] >= 0
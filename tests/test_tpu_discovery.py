@@ -0,0 +1,87 @@
+import json
+import time
+
+import pytest
+
+from trainingbar.handlers import network
+from trainingbar.handlers.network import query_zones, tpunicorn_query, tpu_workers_list, cache_name
+from fakes import FakeTPUAPI, FakeTPUClusterResolver
+
+zones = ['us-central1-a', 'us-central1-f', 'europe-west4-a']
+
+
+def test_query_zones_lists_every_zone():
+    api = FakeTPUAPI({
+        'us-central1-a': [FakeTPUAPI.node('a1', 'us-central1-a')],
+        'europe-west4-a': [FakeTPUAPI.node('e1', 'europe-west4-a'), FakeTPUAPI.node('e2', 'europe-west4-a')],
+    })
+    found = query_zones(api, 'fake-project', zones)
+    assert sorted(t['name'].split('/')[-1] for t in found) == ['a1', 'e1', 'e2']
+    assert sorted(api.calls) == sorted(zones)
+
+
+def test_query_zones_returns_on_first_match():
+    api = FakeTPUAPI({
+        'us-central1-a': [FakeTPUAPI.node('slow', 'us-central1-a')],
+        'us-central1-f': [FakeTPUAPI.node('mine', 'us-central1-f')],
+    }, latency={'us-central1-a': 2.0, 'europe-west4-a': 2.0})
+    start = time.monotonic()
+    found = query_zones(api, 'fake-project', zones, tpu_name='mine')
+    assert time.monotonic() - start < 1.0
+    assert [t['name'].split('/')[-1] for t in found] == ['mine']
+
+
+def test_query_zones_skips_failing_and_slow_zones():
+    class FailingAPI(FakeTPUAPI):
+        def get_tpus(self, zone, project=None):
+            if zone == 'us-central1-a':
+                raise RuntimeError('permission denied')
+            return super().get_tpus(zone, project)
+
+    api = FailingAPI({'us-central1-f': [FakeTPUAPI.node('f1', 'us-central1-f')]}, latency={'europe-west4-a': 2.0})
+    found = query_zones(api, 'fake-project', zones, timeout=0.5)
+    assert [t['name'].split('/')[-1] for t in found] == ['f1']
+
+
+def test_tpunicorn_query_parses_and_caches(cache_home):
+    api = FakeTPUAPI({'us-central1-f': [FakeTPUAPI.node('mine', 'us-central1-f', mesh='v3-32', ip='10.1.2.3')]})
+    config = tpunicorn_query('fake-project', 'mine', zones=zones, tpu_api=api)
+    assert config == {'project': 'fake-project', 'tpu_name': 'mine', 'mesh': 'v3-32', 'region': 'us-central1-f', 'master': '10.1.2.3'}
+    calls = len(api.calls)
+    assert tpunicorn_query('fake-project', 'mine', zones=zones, tpu_api=api) == config
+    assert len(api.calls) == calls
+
+
+def test_tpunicorn_query_refetches_after_ttl(cache_home):
+    api = FakeTPUAPI({'us-central1-f': [FakeTPUAPI.node('mine', 'us-central1-f')]})
+    tpunicorn_query('fake-project', 'mine', zones=zones, tpu_api=api)
+    path = cache_home / cache_name('tpu', 'fake-project', 'mine')
+    cached = json.loads(path.read_text())
+    cached['time'] -= 7200
+    path.write_text(json.dumps(cached))
+    calls = len(api.calls)
+    tpunicorn_query('fake-project', 'mine', zones=zones, tpu_api=api, ttl=3600)
+    assert len(api.calls) > calls
+
+
+def test_tpunicorn_query_ttl_zero_skips_cache():
+    api = FakeTPUAPI({'us-central1-f': [FakeTPUAPI.node('mine', 'us-central1-f')]})
+    tpunicorn_query('fake-project', 'mine', zones=zones, tpu_api=api, ttl=0)
+    calls = len(api.calls)
+    tpunicorn_query('fake-project', 'mine', zones=zones, tpu_api=api, ttl=0)
+    assert len(api.calls) > calls
+
+
+def test_tpu_workers_list_is_cached(monkeypatch):
+    monkeypatch.setattr(network, '_resolvers', {})
+    monkeypatch.setattr(FakeTPUClusterResolver, 'num_workers', 4)
+    config = {'project': 'fake-project', 'tpu_name': 'pod'}
+    workers = tpu_workers_list(config, resolver_cls=FakeTPUClusterResolver)
+    assert workers == '10.0.0.2:8466,10.0.0.3:8466,10.0.0.4:8466,10.0.0.5:8466'
+
+    class Unreachable(FakeTPUClusterResolver):
+        def cluster_spec(self):
+            raise AssertionError('resolver used despite a cached worker list')
+
+    monkeypatch.setattr(network, '_resolvers', {})
+    assert tpu_workers_list(config, resolver_cls=Unreachable) == workers
@@ -4,12 +4,28 @@ import json
 from trainingbar.config.prereqs import configure_env
 
 env = configure_env()
-auths = json.load(open(env['auth_path']))
+_auths = None
+
+def get_auths():
+    global _auths
+    if _auths is None:
+        _auths = json.load(open(env['auth_path']))
+    return _auths
+
+def __getattr__(name):
+    if name == 'auths':
+        return get_auths()
+    if name == 'AsyncTrainingBar':
+        # Kept out of the eager imports so plain TrainingBar users never load asyncio
+        from trainingbar.asyncbar import AsyncTrainingBar
+        return AsyncTrainingBar
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def update_auth(updated_auths):
     json.dump(updated_auths, open(env['auth_path'], 'w'), indent=1)
 
 def set_auth(auth_name):
+    auths = get_auths()
     if auth_name in auths.keys():
         print(f'Setting ADC to {auth_name}: {auths[auth_name]}')
         if auths[auth_name] in auths.values():
@@ -0,0 +1,110 @@
+from threading import Lock
+from trainingbar.history import flatten_metrics
+
+# Metrics that drive the intervals, matched on the last name component, and the scale a
+# change is measured against; None is relative to the metric's own magnitude. Throughput
+# counters are left out since they swing from zero on every burst of I/O.
+_metrics = {
+    'cpu_util': 100.0,
+    'ram_used': None,
+    'gpu_util': 100.0,
+    'vram_used': None,
+    'tpu_mxu_util': 100.0,
+    'tpu_mem_used': None,
+    'steps_per_sec': None,
+    'proc_cpu_util': 100.0,
+    'proc_rss': None,
+}
+# Shortest useful interval for collectors whose source only updates so often; sampling
+# faster just re-reads the same point. Cloud Monitoring writes TPU metrics about once a minute.
+_floors = {'tpu': 60.0}
+
+
+class AdaptiveIntervals:
+    """
+    Per-collector sampling intervals that follow how fast the collector's metrics move.
+
+    After each sample, each watched metric's change since the previous sample is
+    normalized (utilization by 100, everything else by its magnitude) and averaged
+    over devices; the largest average is the collector's volatility. Above `threshold` the interval is cut by `shrink`
+    (ramps, eval phases, a job stalling); below half of it it grows by `grow` toward
+    the ceiling. So an interval settles where one sample moves about `threshold`.
+
+    Intervals stay within `min_secs`/`max_secs`, or per collector bounds like
+    {'tpu': (30, 120)}. `floors` raises the minimum for collectors backed by a slower
+    source and defaults to 60s for TPUs; it wins over `max_secs`. With `budget` set, if all collectors together would take more
+    than `budget` samples per second, every interval is stretched by the same factor.
+    """
+    def __init__(self, intervals, min_secs=1.0, max_secs=60.0, budget=None, bounds=None, floors=None, metrics=None, threshold=0.1, shrink=0.5, grow=1.25):
+        self.min_secs = min_secs
+        self.max_secs = max_secs
+        self.budget = budget
+        self.bounds = bounds or {}
+        self.floors = dict(_floors)
+        self.floors.update(floors or {})
+        self.threshold = threshold
+        self.shrink = shrink
+        self.grow = grow
+        self.intervals = {op: self.clip(op, secs) for op, secs in intervals.items()}
+        self.metrics = dict(_metrics)
+        self.metrics.update(metrics or {})
+        self.volatility = {}
+        self._watched = {}
+        self._prev = {}
+        self._lock = Lock()
+
+    def clip(self, op, secs):
+        lo, hi = self.bounds.get(op, (max(self.min_secs, self.floors.get(op, 0.0)), self.max_secs))
+        return min(max(lo, hi), max(lo, float(secs)))
+
+    def watched(self, metric):
+        # Resolved once per name to (suffix, scale), or None for unwatched metrics
+        rule = self._watched.get(metric, False)
+        if rule is False:
+            suffix = metric.rsplit('.', 1)[-1]
+            rule = self._watched[metric] = (suffix, self.metrics[suffix]) if suffix in self.metrics else None
+        return rule
+
+    def change(self, op, data):
+        # Averaged per metric kind across devices, so per-device jitter on a many-GPU host
+        # doesn't keep the interval pinned at the floor
+        prev = self._prev.setdefault(op, {})
+        sums, counts = {}, {}
+        for metric, value in flatten_metrics(data):
+            rule = self.watched(metric)
+            if rule is None:
+                continue
+            suffix, scale = rule
+            last = prev.get(metric, None)
+            prev[metric] = value
+            if last is None:
+                continue
+            sums[suffix] = sums.get(suffix, 0.0) + (abs(value - last) / (scale or max(abs(last), abs(value), 1e-9)))
+            counts[suffix] = counts.get(suffix, 0) + 1
+        return max((sums[k] / counts[k] for k in sums), default=0.0)
+
+    def update(self, op, data):
+        """Feeds a collector's sample; returns {op: interval} for every interval that changed."""
+        with self._lock:
+            if op not in self.intervals:
+                return {}
+            change = self.volatility[op] = self.change(op, data)
+            before = dict(self.intervals)
+            if change > self.threshold:
+                self.intervals[op] = self.clip(op, self.intervals[op] * self.shrink)
+            elif change < self.threshold / 2:
+                self.intervals[op] = self.clip(op, self.intervals[op] * self.grow)
+            if self.budget:
+                self._fit_budget()
+            return {k: v for k, v in self.intervals.items() if v != before[k]}
+
+    def _fit_budget(self):
+        rate = sum(1.0 / secs for secs in self.intervals.values())
+        if rate > self.budget:
+            factor = rate / self.budget
+            for op, secs in self.intervals.items():
+                self.intervals[op] = self.clip(op, secs * factor)
+
+    def stats(self):
+        with self._lock:
+            return {op: {'interval': secs, 'volatility': self.volatility.get(op, 0.0)} for op, secs in self.intervals.items()}
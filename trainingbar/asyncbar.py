@@ -0,0 +1,143 @@
+import time
+import asyncio
+from functools import partial
+from trainingbar.bar import TrainingBar
+from trainingbar.logger import get_logger
+
+logger = get_logger()
+
+
+class AsyncTrainingBar(TrainingBar):
+    """
+    TrainingBar for asyncio applications.
+
+    Shares configuration, handlers, history and rendering with TrainingBar. Each
+    collector runs as a task on its own interval; blocking probes (psutil, NVML,
+    GPUtil) are offloaded to the default executor and handlers with a native
+    `aupdate` (TPU via MetricServiceAsyncClient) are awaited directly.
+
+        async with AsyncTrainingBar(daemon=True) as tb:
+            async for snapshot in tb.snapshots():
+                ...
+    """
+    def __init__(self, *args, daemon=False, **kwargs):
+        super().__init__(*args, daemon=False, **kwargs)
+        self.bg_run = daemon
+        self.tasks = {}
+        self._wakeups = {}
+        self._changed = None
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        """Builds the bar without blocking the loop on host probing."""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(cls, *args, **kwargs))
+
+    async def start(self):
+        if self.started:
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self.prepare)
+        self._changed = asyncio.Condition()
+        if self.bg_run:
+            self.configure_adaptive()
+            for op in self.handlers:
+                if not self.handlers[op].stopped:
+                    self.tasks[op] = asyncio.ensure_future(self._run(op, partial(self.acollect, op), partial(getattr, self.handlers[op], 'delay')))
+            self.tasks['bar'] = asyncio.ensure_future(self._run('bar', self.arefresh, partial(getattr, self, 'refresh_secs'), immediate=False))
+
+    def set_interval(self, op, secs):
+        # Runs on the loop from acollect; wakes the collector's task so a shorter interval applies now
+        self.intervals[op] = self.handlers[op].delay = secs
+        if op in self._wakeups:
+            self._wakeups[op].set()
+
+    async def _run(self, name, func, interval, immediate=True):
+        # Deadline-based loop so the interval does not drift by the collection cost.
+        # `interval` is read every tick, since adaptive sampling can change it.
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeups[name] = asyncio.Event()
+        epoch, wall_epoch = loop.time(), time.time()
+        deadline = epoch if immediate else epoch + interval()
+        while not self.stopped:
+            delay = deadline - loop.time()
+            if delay > 0:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), delay)
+                    deadline = min(deadline, loop.time() + interval())
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await func(wall_epoch + (deadline - epoch))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f'Collector failed: {e}')
+            secs = interval()
+            missed = int((loop.time() - deadline) / secs)
+            deadline += (max(missed, 0) + 1) * secs
+
+    async def acollect(self, op, ts=None):
+        ts = ts or time.time()
+        handler = self.handlers[op]
+        if hasattr(handler, 'aupdate'):
+            data = await handler.aupdate(ts)
+        else:
+            data = await asyncio.get_running_loop().run_in_executor(None, handler.update, ts)
+        return self.record(op, data, ts)
+
+    async def arefresh(self, ts=None):
+        self.refresh()
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def update(self, ts=None):
+        if not self.started:
+            await self.start()
+        if not self.bg_run:
+            ts = ts or time.time()
+            await asyncio.gather(*[self.acollect(op, ts) for op in self.handlers])
+        await self.arefresh(ts)
+        return self.stats()
+
+    async def snapshots(self):
+        """Yields a copy of stats() after every refresh."""
+        if not self.started:
+            await self.start()
+        while not self.stopped:
+            if not self.bg_run:
+                yield await self.update()
+                await asyncio.sleep(self.refresh_secs)
+                continue
+            async with self._changed:
+                await self._changed.wait()
+            yield {k: dict(v) for k, v in self.stats().items()}
+
+    async def stop(self):
+        self.stopped = True
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks, self._wakeups = {}, {}
+        self.hooks.stop()
+        if self.exporter:
+            self.exporter.stop()
+        if self.agent:
+            self.agent.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.started:
+            if self.bars:
+                self.bars.stop()
+            for op in self.handlers:
+                self.handlers[op].stop()
+        if self._changed:
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.stop()
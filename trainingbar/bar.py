@@ -1,26 +1,69 @@
 import os
 import sys
 import time
-from threading import Thread, Lock
-from trainingbar import env, auths
-from trainingbar.logger import get_logger
+import platform
+import importlib.util
+from functools import partial
+from threading import Lock
+from trainingbar.logger import get_logger, set_headless
 from trainingbar.handlers.host import config_host, HostMonitor
-from trainingbar.config.styles import configure_trainingbars
-from trainingbar.utils import _timer_formats
+from trainingbar.scheduler import Scheduler
+from trainingbar.history import MetricHistory
+from trainingbar.hooks import HookDispatcher
+from trainingbar.steps import StepCounter, StepMonitor
+from trainingbar.detector import StallDetector
+from trainingbar.gcp import get_clients
+from trainingbar.utils import _timer_formats, FormatSize
 
 logger = get_logger()
+# Rows whose collectors do their math in numpy, which is only required by the 'report' extra
+_numpy_ops = ['cores', 'diskio', 'net']
+
+def _fmt_rate(bps):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if bps < 1024.0:
+            return f'{bps:,.1f} {unit}/s'
+        bps /= 1024.0
+    return f'{bps:,.1f} TB/s'
 
 class TrainingBar:
-    def __init__(self, refresh_secs=10, disabled=None, xla='auto', xla_params=None, authenticate=True, disk_path='/', reinit=False, daemon=False):
-        self.enabled = ['cpu', 'ram', 'disk']
+    def __init__(self, refresh_secs=10, disabled=None, xla='auto', xla_params=None, authenticate=True, disk_path='/', reinit=False, daemon=False, intervals=None, history_resolutions=None, max_fps=4, headless=False, exporter_port=None, exporter_host='0.0.0.0', record_path=None, coordinator=None, gpu_grid='auto', process=None, adaptive=None, step_times=True):
+        self.enabled = ['cpu', 'cores', 'ram', 'disk', 'diskio', 'net']
         self.refresh_secs = refresh_secs
+        self.intervals = {'host': refresh_secs, 'gpu': refresh_secs, 'tpu': refresh_secs, 'step': refresh_secs, 'process': refresh_secs}
+        self.intervals.update(intervals or {})
+        # adaptive=True, or a dict of AdaptiveIntervals options, lets daemon collectors speed up and slow down on their own
+        self._adaptive = adaptive
+        self.adaptive = None
         self.bg_run = daemon
         self.time = time.time()
-        self.hooks = {}
+        self.hooks = HookDispatcher()
+        self.metrics = MetricHistory(history_resolutions)
+        self.detector = StallDetector()
+        self._event_hooks = {}
+        # tb.step(n_samples=..., n_tokens=...) goes straight to the lock-free counter, with no wrapper call on the hot path.
+        # step_times=False drops the step time percentiles and the clock read that feeds them
+        has_numpy = importlib.util.find_spec('numpy') is not None
+        self.steps = StepCounter()
+        self.step = self.steps.step if step_times and has_numpy else self.steps.count
+        self.recorder = None
+        if record_path:
+            from trainingbar.recorder import MetricRecorder
+            self.recorder = MetricRecorder(record_path)
         if disabled:
             self.enabled = [e for e in self.enabled if e not in disabled]
             if ('gpu' in disabled or 'tpu' in disabled) and xla =='auto':
                 xla = None
+        if not has_numpy:
+            skipped = [e for e in self.enabled if e in _numpy_ops]
+            if skipped:
+                logger.info(f'numpy is not installed, so {", ".join(skipped)} are not collected. pip install trainingbar[report] adds it.')
+            self.enabled = [e for e in self.enabled if e not in _numpy_ops]
+            gpu_grid = False
+        # xla_params={'gpu_backend': NVMLBackend(...)} hands the GPU monitor that object instead of one built by name
+        xla_params = dict(xla_params or {})
+        backend = xla_params.get('gpu_backend', None)
+        self.gpu_backend = backend if backend is not None and not isinstance(backend, str) else None
         self.host = config_host(xla, xla_params, authenticate, disk_path, reinit)
         self.enabled_xla = None
         if xla:
@@ -29,73 +72,267 @@ class TrainingBar:
             elif self.host['xla'].get('tpu_name', None):
                 self.enabled_xla = 'tpu'
             self.enabled.append(self.enabled_xla)
-        self.bars, self.ops = configure_trainingbars(self.host, self.enabled)
+        # process=True follows this process and its children, an int follows that pid's tree instead
+        self.pid = None
+        if process:
+            self.pid = os.getpid() if process is True else int(process)
+            self.enabled.append('process')
+        self.headless = headless
+        if self.headless:
+            set_headless(True)
+            self.bars, self.ops = None, {}
+        else:
+            from trainingbar.config.styles import configure_trainingbars
+            self.bars, self.ops = configure_trainingbars(self.host, self.enabled, gpu_grid)
+            if self.pid:
+                from trainingbar.config.styles import add_process_task
+                self.ops['process'] = add_process_task(self.bars, self.pid)
+        self.max_fps = max_fps
+        self.exporter = None
+        if exporter_port is not None:
+            from trainingbar.exporter import MetricsExporter
+            self.exporter = MetricsExporter(exporter_port, exporter_host, labels={'host': platform.node()}).start()
+        self.agent = None
+        if coordinator:
+            from trainingbar.cluster import ClusterAgent
+            self.agent = ClusterAgent(coordinator)
+            self.hooks.add('cluster', self.agent, freq=1, policy='coalesce')
+        self._rendered, self._last_render = None, 0.0
+        self._peaks = {}
         self.started, self.stopped = False, False
         self._lock = Lock()
+        self.scheduler = Scheduler()
         if self.bg_run:
-            _bg = Thread(target=self.background, daemon=True)
-            _bg.start()
-
-    def background(self):
-        self.start()
-        while not self.stopped:
-            with self._lock:
-                self.update()
-                time.sleep(self.refresh_secs)
+            self.start()
 
-    def update(self):
+    def update(self, ts=None):
         if not self.started:
             self.start()
-        self.all_stats['host'] = self.handlers['host'].stats()
+        with self._lock:
+            if not self.bg_run:
+                for op in self.handlers:
+                    self.collect(op, ts)
+            self.refresh()
+
+    def collect(self, op, ts=None):
+        ts = ts or time.time()
+        return self.record(op, self.handlers[op].update(ts), ts)
+
+    def record(self, op, data, ts):
+        prefix = 'gpu.' if op == 'gpu' else ''
+        self.metrics.record(data, ts, prefix=prefix)
+        if self.recorder:
+            self.recorder.record(data, ts, prefix=prefix)
+        # The detector only runs while someone is listening for its events
+        if self._event_hooks:
+            events = self.detector.update(data, ts, prefix=prefix)
+            if events:
+                self.fire_events(events)
+        if self.adaptive:
+            for name, secs in self.adaptive.update(op, data).items():
+                self.set_interval(name, secs)
+        return data
+
+    def set_interval(self, op, secs):
+        self.intervals[op] = self.handlers[op].delay = secs
+        self.scheduler.set_interval(op, secs)
+
+    def configure_adaptive(self):
+        if not self._adaptive:
+            return
+        from trainingbar.adaptive import AdaptiveIntervals
+        options = self._adaptive if isinstance(self._adaptive, dict) else {}
+        self.adaptive = AdaptiveIntervals({op: self.handlers[op].delay for op in self.handlers if not self.handlers[op].stopped}, **options)
+        for op, secs in self.adaptive.intervals.items():
+            self.intervals[op] = self.handlers[op].delay = secs
+
+    def history(self, metric, window=None, resolution='auto'):
+        return self.metrics.get(metric, window=window, resolution=resolution)
+
+    def refresh(self):
+        host = self.handlers['host'].stats()
+        self.all_stats['host'] = host
         if 'cpu' in self.enabled:
-            self.bars.update(self.ops['cpu'], completed=self.all_stats['host']['cpu_util'])
-            self.all_stats['cpu']['cpu_util'] = self.all_stats['host'].pop('cpu_util')
+            self.all_stats['cpu']['cpu_util'] = host.pop('cpu_util', 0.0)
         if 'disk' in self.enabled:
-            self.bars.update(self.ops['disk'], completed=self.all_stats['host']['disk_used'])
             for d in ['disk_total', 'disk_used', 'disk_util']:
-                self.all_stats['disk'][d] = self.all_stats['host'].pop(d)
+                self.all_stats['disk'][d] = host.pop(d, 0)
         if 'ram' in self.enabled:
-            self.bars.update(self.ops['ram'], completed=self.all_stats['host']['ram_used'])
             for r in ['ram_total', 'ram_used', 'ram_util']:
-                self.all_stats['ram'][r] = self.all_stats['host'].pop(r)
+                self.all_stats['ram'][r] = host.pop(r, 0)
+        if 'cores' in self.enabled:
+            self.all_stats['cores']['cores_util'] = host.pop('cores_util', [])
+            for c in ['cores_mean', 'cores_max', 'cores_min', 'cores_busy']:
+                self.all_stats['cores'][c] = host.pop(c, 0)
+        if 'diskio' in self.enabled:
+            for d in ['disk_read_bps', 'disk_write_bps', 'disk_read_iops', 'disk_write_iops']:
+                self.all_stats['diskio'][d] = host.pop(d, 0.0)
+        if 'net' in self.enabled:
+            for n in ['net_sent_bps', 'net_recv_bps']:
+                self.all_stats['net'][n] = host.pop(n, 0.0)
         self.idx += 1
 
         if self.enabled_xla:
             self.all_stats[self.enabled_xla] = self.handlers[self.enabled_xla].stats()
-            if self.enabled_xla == 'gpu':
-                for gpu in self.all_stats['gpu']:
-                    self.bars.update(self.ops['gpu'][gpu], completed=self.all_stats['gpu'][gpu].get('vram_used', 0))
-            elif self.enabled_xla == 'tpu':
-                self.bars.update(self.ops['tpu']['tpu_mxu'], completed=int(self.all_stats['tpu'].get('tpu_mxu_util', 0)))
-                self.bars.update(self.ops['tpu']['tpu_memory'], completed=int(self.all_stats['tpu'].get('tpu_mem_used', 0)), total=int(self.all_stats['tpu'].get('tpu_mem_total', 0)))
-        
+        if self.enabled_xla == 'tpu':
+            self.all_stats['gcp'] = get_clients().stats()
+        self.all_stats['step'] = self.handlers['step'].stats()
+        if 'process' in self.handlers:
+            self.all_stats['process'] = self.handlers['process'].stats()
+        if self.exporter:
+            self.exporter.publish(self.all_stats)
+        if self.bars:
+            self.update_bars()
+            self.render()
         self.fire_hooks(self.all_stats)
 
+    def update_bars(self):
+        if 'cpu' in self.ops:
+            self.bars.update(self.ops['cpu'], completed=self.all_stats['cpu']['cpu_util'])
+        if 'disk' in self.ops:
+            self.bars.update(self.ops['disk'], completed=self.all_stats['disk']['disk_used'])
+        if 'ram' in self.ops:
+            self.bars.update(self.ops['ram'], completed=self.all_stats['ram']['ram_used'])
+        if 'cores' in self.ops:
+            from trainingbar.config.styles import heatmap
+            cores = self.all_stats['cores']
+            self.bars.update(self.ops['cores'], completed=cores['cores_mean'], heat=heatmap(cores['cores_util'], self.heatmap_width()),
+                summary=f"{cores['cores_busy']}/{len(cores['cores_util'])} >90%")
+        if 'diskio' in self.ops:
+            disk = self.all_stats['diskio']
+            iops = disk['disk_read_iops'] + disk['disk_write_iops']
+            self.update_rate_bar('diskio', disk['disk_read_bps'] + disk['disk_write_bps'],
+                f"R {_fmt_rate(disk['disk_read_bps'])} W {_fmt_rate(disk['disk_write_bps'])} {iops:,.0f} IOPS")
+        if 'net' in self.ops:
+            net = self.all_stats['net']
+            self.update_rate_bar('net', net['net_sent_bps'] + net['net_recv_bps'],
+                f"Tx {_fmt_rate(net['net_sent_bps'])} Rx {_fmt_rate(net['net_recv_bps'])}")
+        step = self.all_stats['step']
+        if step.get('steps_total', 0):
+            if 'step' not in self.ops:
+                from trainingbar.config.styles import add_step_task
+                self.ops['step'] = add_step_task(self.bars)
+            summary = f"{step.get('steps_per_sec', 0.0):,.2f} steps/s {step.get('samples_per_sec', 0.0):,.0f} samples/s"
+            if 'step_time_p50_ms' in step:
+                summary += f" p50 {step['step_time_p50_ms']:,.0f}ms"
+            self.update_rate_bar('step', step.get('steps_per_sec', 0.0), summary)
+        if 'process' in self.ops:
+            self.update_process_bar()
+        if 'gpu_grid' in self.ops:
+            self.update_gpu_grid()
+        elif self.enabled_xla == 'gpu':
+            for gpu in self.all_stats['gpu']:
+                self.bars.update(self.ops['gpu'].get(gpu, self.ops['gpu'].get(str(gpu))), completed=self.all_stats['gpu'][gpu].get('vram_used', 0))
+        elif self.enabled_xla == 'tpu':
+            self.bars.update(self.ops['tpu']['tpu_mxu'], completed=int(self.all_stats['tpu'].get('tpu_mxu_util', 0)))
+            self.bars.update(self.ops['tpu']['tpu_memory'], completed=int(self.all_stats['tpu'].get('tpu_mem_used', 0)), total=int(self.all_stats['tpu'].get('tpu_mem_total', 0)))
+
+    def heatmap_width(self):
+        # The bar column gets roughly a quarter of the terminal
+        return max(8, min(40, self.bars.console.width // 4))
+
+    def update_gpu_grid(self):
+        # Two fixed-width heatmap rows for all GPUs; the idlest GPU is called out by id
+        import numpy as np
+        from trainingbar.config.styles import heatmap, heatmap_cell
+        gpus = self.all_stats['gpu']
+        if not gpus:
+            return
+        ids = list(gpus)
+        util = np.array([gpus[g].get('gpu_util', 0.0) for g in ids], dtype=np.float64)
+        used = np.array([gpus[g].get('vram_used', 0.0) for g in ids], dtype=np.float64)
+        total = np.array([gpus[g].get('vram_total', 0.0) for g in ids], dtype=np.float64)
+        vram = 100.0 * used / np.maximum(total, 1.0)
+        worst = int(util.argmin())
+        width = self.heatmap_width()
+        self.bars.update(self.ops['gpu_grid']['util'], completed=float(util.mean()), heat=heatmap(util, width, pool='min'), mark=heatmap_cell(worst, len(ids), width),
+            summary=f'min {util[worst]:.0f}% [GPU {ids[worst]}] max {util.max():.0f}%')
+        self.bars.update(self.ops['gpu_grid']['vram'], completed=float(used.sum() / max(total.sum(), 1.0) * 100), heat=heatmap(vram, width),
+            summary=f'{used.sum() / 1024:,.1f}/{total.sum() / 1024:,.1f} GB')
+
+    def update_process_bar(self):
+        proc = self.all_stats['process']
+        if not proc:
+            return
+        summary = f"RSS {FormatSize(proc['proc_rss'])[1]} {proc['proc_threads']} threads"
+        if proc.get('proc_count', 1) > 1:
+            summary += f" {proc['proc_count']} procs"
+        if proc.get('proc_vram_used', None):
+            summary += f" VRAM {proc['proc_vram_used'] / 1024:,.1f}GB"
+        self.bars.update(self.ops['process'], completed=proc['proc_cpu_util'], summary=summary)
+
+    def update_rate_bar(self, op, rate, summary):
+        # Throughput has no natural ceiling, so the bar shows the rate as a percent of the
+        # highest rate seen so far; a fractional steps/sec would otherwise round to nothing
+        peak = self._peaks[op] = max(self._peaks.get(op, 1.0), rate)
+        self.bars.update(self.ops[op], completed=100.0 * rate / peak, summary=summary)
+
+    def render(self, force=False):
+        # Repaint only when a displayed value changed, at most max_fps times per second.
+        # A change that is rate limited stays pending and is drawn on the next call.
+        if not self.bars:
+            return False
+        snapshot = tuple((int(task.completed), int(task.total), task.fields.get('heat'), task.fields.get('mark'), task.fields.get('summary')) for task in self.bars.tasks)
+        if snapshot == self._rendered and not force:
+            return False
+        now = time.monotonic()
+        if self.max_fps and not force and (now - self._last_render) < (1.0 / self.max_fps):
+            return False
+        self.bars.refresh()
+        self._rendered, self._last_render = snapshot, now
+        return True
+
 
     def stats(self):
         return self.all_stats
 
     def stop(self):
-        self.bars.stop()
+        self.stopped = True
+        self.scheduler.stop()
+        self.hooks.stop()
+        if self.exporter:
+            self.exporter.stop()
+        if self.agent:
+            self.agent.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.bars:
+            self.bars.stop()
         for op in self.handlers:
             self.handlers[op].stop()
 
-    def start(self):
+    def prepare(self):
         self.idx = 0
         self.all_stats = {x: {} for x in self.enabled}
         self.configure_handlers()
-        self.bars.start()
+        if self.bars:
+            self.bars.start()
         self.started = True
 
+    def start(self):
+        self.prepare()
+        if self.bg_run:
+            self.configure_adaptive()
+            for op in self.handlers:
+                if not self.handlers[op].stopped:
+                    self.scheduler.add(op, partial(self.collect, op), self.handlers[op].delay)
+            self.scheduler.add('bar', self.update, self.refresh_secs, immediate=False)
+            self.scheduler.start()
+
     def configure_handlers(self):
         self.handlers = {}
-        self.handlers['host'] = HostMonitor(self.client, self.enabled, self.refresh_secs, self.bg_run)
+        self.handlers['host'] = HostMonitor(self.client, self.enabled, self.intervals['host'], self.bg_run)
+        self.handlers['step'] = StepMonitor(self.steps, self.intervals['step'])
         if self.enabled_xla == 'tpu':
             from trainingbar.handlers.tpu import TPUMonitor 
-            self.handlers['tpu'] = TPUMonitor(self.client, self.refresh_secs, self.bg_run)
+            self.handlers['tpu'] = TPUMonitor(self.client, self.intervals['tpu'], self.bg_run)
         elif self.enabled_xla == 'gpu':
             from trainingbar.handlers.gpu import GPUMonitor 
-            self.handlers['gpu'] = GPUMonitor(self.client, self.refresh_secs, self.bg_run)
+            self.handlers['gpu'] = GPUMonitor(self.client, self.intervals['gpu'], self.bg_run, backend=self.gpu_backend)
+        if self.pid:
+            from trainingbar.handlers.process import ProcessMonitor
+            gpu = self.handlers['gpu'].processes if 'gpu' in self.handlers else None
+            self.handlers['process'] = ProcessMonitor(self.pid, self.intervals['process'], gpu=gpu)
 
     def client(self, config=False, ops=None, **args):
         if config:
@@ -103,29 +340,49 @@ class TrainingBar:
         if ops == 'logger':
             return self.log
 
-    def add_hook(self, name, hook, freq=10):
-        self.hooks[name] = {'freq': freq, 'function': hook}
+    def add_hook(self, name, hook, freq=10, queue_size=8, policy='drop_oldest'):
+        self.hooks.add(name, hook, freq, queue_size, policy)
         self.log(f'Added new hook {name}. Will call hook once every {freq} updates.')
 
+    def add_event_hook(self, name, hook, events=None, device=None, queue_size=8, policy='drop_oldest'):
+        # Called with each detector event dict; `events` limits the kinds and `device` is a prefix like 'gpu', 'gpu.3' or 'tpu'
+        self.hooks.add(name, hook, freq=0, queue_size=queue_size, policy=policy)
+        self._event_hooks[name] = (events, device)
+        self.log(f'Added new event hook {name} for {", ".join(events) if events else "all"} events on {device or "all devices"}.')
+
+    def fire_events(self, events):
+        hooks = list(self._event_hooks.items())
+        for event in events:
+            matched = False
+            for name, (kinds, device) in hooks:
+                if (kinds is None or event['event'] in kinds) and (device is None or event['device'].startswith(device)):
+                    self.hooks.fire(name, event)
+                    matched = True
+            if matched and event['event'] in ['stall', 'drop']:
+                logger.warning(event['message'])
+
     def rm_hook(self, name):
-        if self.hooks.get(name, None):
-            _ = self.hooks.pop(name)
+        self._event_hooks.pop(name, None)
+        if self.hooks.remove(name):
             self.log(f'Removing hook {name}')
         else:
             self.log(f'Hook {name} not found')
 
     def fire_hooks(self, message, force=False, *args, **kwargs):
-        if self.hooks:
-            for hook_name in self.hooks:
-                hook = self.hooks[hook_name]
-                if self.idx % hook['freq'] == 0 or force:
-                    hook['func'](message, *args, **kwargs)
-
-    def create_timeout_hook(self, hook, device='auto', *args):
-        if device == 'auto' and self.enabled_xla:
-            self.handlers[self.enabled_xla].create_timeout_hook(hook=hook, *args)
-        elif device == self.enabled_xla:
-            self.handlers[device].create_timeout_hook(hook=hook, *args)
+        self.hooks.dispatch(message, self.idx, force, *args, **kwargs)
+
+    def hook_stats(self):
+        return self.hooks.stats()
+
+    def create_timeout_hook(self, hook, device='auto', min_util=10.0, num_timeouts=50):
+        # Calls hook(message) each time the accelerator's utilization has been at or below
+        # min_util for num_timeouts collection intervals, after it was first seen working.
+        if device == 'auto':
+            device = self.enabled_xla
+        if device and device == self.enabled_xla:
+            name = f'{device}_timeout'
+            self.detector.configure('gpu_util' if device == 'gpu' else 'tpu_mxu_util', idle=float(min_util), stall_secs=num_timeouts * self.intervals[device])
+            self.add_event_hook(name, lambda event: hook(event['message']), events=['stall'], device=device)
 
     def log(self, message):
         if not isinstance(message, str):
@@ -4,6 +4,7 @@ import sys
 import os
 import typer
 from typing import List
+from collections.abc import Mapping
 import time
 from trainingbar.logger import get_logger
 from trainingbar.utils import run_command
@@ -21,6 +22,8 @@ logging_app = typer.Typer()
 cli.add_typer(logging_app, name='logging')
 training_app = typer.Typer()
 cli.add_typer(logging_app, name='train')
+cluster_app = typer.Typer()
+cli.add_typer(cluster_app, name='cluster')
 
 @sess_app.command('new')
 def sess_new(name: str = typer.Argument("train")):
@@ -56,6 +59,15 @@ def sess_list():
     ls = run_command(command)
     typer.echo(f'Sessions: {ls}')
 
+def _jsonable(obj):
+    # json.dumps calls this again on whatever it returns, so nested mappings unwrap at any depth
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    return str(obj)
+
+def echo_stats(stats):
+    typer.echo(json.dumps({'time': time.time(), **{k: v for k, v in stats.items() if k != 'host'}}, default=_jsonable))
+
 def check_vars():
     v = {
         'gcp': os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', '')
@@ -64,7 +76,7 @@ def check_vars():
 
 @cli.command('init')
 def init_tbar():
-    from trainingbar import env, update_auth, auths
+    from trainingbar import env, update_auth
     var = check_vars()
     do_auth = typer.confirm(f"Authenticate with GCP? - Current ADC Path: {var['gcp']}")
     if do_auth:
@@ -72,7 +84,8 @@ def init_tbar():
 
 @cli.command('auth')
 def auth_tbar(name: str = typer.Argument("", envvar="GOOGLE_APPLICATION_CREDENTIALS")):
-    from trainingbar import env, update_auth, auths
+    from trainingbar import env, update_auth, get_auths
+    auths = get_auths()
     typer.echo(f'Current ADC is set to {name}')
     if name in auths.keys():
         if auths[name] not in auths.values():
@@ -98,11 +111,23 @@ def auth_tbar(name: str = typer.Argument("", envvar="GOOGLE_APPLICATION_CREDENTI
                 typer.echo(f'- {adc_name} is now the Default ADC: {adc_path}')
 
 
+@cli.command('report')
+def report_tbar(path: str = typer.Argument(..., help="Metric log written with TrainingBar(record_path=...)"), start: str = typer.Option(None, help="Unix time, ISO datetime or offset from the end like -2h"), end: str = typer.Option(None), metric: List[str] = typer.Option(None, help="Regex filter on metric names, repeatable"), high: float = typer.Option(80.0, help="Utilization threshold for time above"), low: float = typer.Option(10.0, help="Utilization threshold for time below / idle"), as_json: bool = typer.Option(False, '--json')):
+    from trainingbar.report import analyze, format_table
+    result = analyze(path, start=start, end=end, metrics=metric, high=high, low=low)
+    if as_json:
+        typer.echo(json.dumps(result, indent=1))
+    else:
+        typer.echo(format_table(result))
+
+
 @monitor_app.command('start')
-def start_tbar(refresh: int = typer.Argument(10), project: str = typer.Argument("", envvar="GCP_PROJECT"), tpu: str = typer.Argument("", envvar="TPU_NAME"), disabled: List[str] = typer.Option(['disk'])):
+def start_tbar(refresh: int = typer.Argument(10), project: str = typer.Argument("", envvar="GCP_PROJECT"), tpu: str = typer.Argument("", envvar="TPU_NAME"), disabled: List[str] = typer.Option(['disk']), headless: bool = typer.Option(False, help="Collect without the rich display, printing one JSON line of stats per refresh"), export: bool = typer.Option(False, help="Serve OpenMetrics gauges for Prometheus on --export-port"), export_port: int = typer.Option(9464), coordinator: str = typer.Option(None, help="host:port of a 'tbar cluster serve' coordinator to report to"), pid: int = typer.Option(None, help="Also track this process and its children"), adaptive: bool = typer.Option(False, help="Sample faster while metrics are changing and slower while they are flat"), min_secs: float = typer.Option(1.0, help="Shortest adaptive interval"), max_secs: float = typer.Option(60.0, help="Longest adaptive interval"), budget: float = typer.Option(None, help="Most samples per second across all collectors in adaptive mode")):
     from trainingbar.bar import TrainingBar
     typer.echo("Starting TrainingBar Monitoring")
-    tb = TrainingBar(daemon=True, disabled=disabled, reinit=True, xla_params={'tpu_name': tpu, 'project': project})
+    tb = TrainingBar(refresh_secs=refresh, daemon=True, disabled=disabled, xla_params={'tpu_name': tpu, 'project': project}, headless=headless, exporter_port=(export_port if export else None), coordinator=coordinator, process=pid, adaptive=({'min_secs': min_secs, 'max_secs': max_secs, 'budget': budget} if adaptive else None))
+    if headless:
+        tb.add_hook('stdout', echo_stats, freq=1)
     while True:
         try:
             time.sleep(10)
@@ -112,5 +137,46 @@ def start_tbar(refresh: int = typer.Argument(10), project: str = typer.Argument(
             break
 
 
+@cli.command('simulate')
+def simulate_tbar(xla: str = typer.Argument('gpu', help="gpu or tpu"), refresh: int = typer.Option(1), devices: int = typer.Option(8, help="Simulated GPUs, ignored for TPUs"), mesh: str = typer.Option('v3-8', help="Simulated TPU mesh, e.g. v3-512"), speed: float = typer.Option(100.0, help="Trace seconds replayed per wall second"), trace: str = typer.Option(None, help="Metric log to replay instead of a synthetic trace"), headless: bool = typer.Option(False), export: bool = typer.Option(False), export_port: int = typer.Option(9464)):
+    from trainingbar.bar import TrainingBar
+    xla_params = {'sim_devices': devices, 'sim_speed': speed, 'sim_trace': trace}
+    xla_params.update({'gpu_backend': 'sim'} if xla == 'gpu' else {'tpu_backend': 'sim', 'mesh': mesh})
+    typer.echo(f"Starting simulated {xla.upper()} monitoring at {speed:g}x")
+    tb = TrainingBar(refresh_secs=refresh, daemon=True, xla=xla, xla_params=xla_params, disabled=['disk'], authenticate=False, reinit=True, headless=headless, exporter_port=(export_port if export else None))
+    if headless:
+        tb.add_hook('stdout', echo_stats, freq=1)
+    while True:
+        try:
+            time.sleep(10)
+        except KeyboardInterrupt:
+            tb.stop()
+            typer.echo('Exiting Simulation')
+            break
+
+
+@cluster_app.command('serve')
+def cluster_serve(refresh: int = typer.Argument(10), port: int = typer.Option(9470), host: str = typer.Option('0.0.0.0'), stale: int = typer.Option(30, help="Seconds without a frame before a host is reported stale"), expected: List[str] = typer.Option(None, help="Host names that should report, repeatable"), headless: bool = typer.Option(False, help="Print one JSON summary per refresh instead of a table")):
+    from trainingbar.cluster import ClusterCoordinator, render_summary
+    coordinator = ClusterCoordinator(port, host, stale_secs=stale, expected=expected).start()
+    typer.echo(f"Waiting for agents on {host}:{coordinator.port}. Start them with 'tbar monitor start --coordinator <this host>:{coordinator.port}'")
+    console = None
+    if not headless:
+        from trainingbar.logger import get_console
+        console = get_console()
+    while True:
+        try:
+            time.sleep(refresh)
+            summary = coordinator.summary()
+            if console:
+                console.print(render_summary(summary))
+            else:
+                typer.echo(json.dumps({'time': time.time(), **summary}))
+        except KeyboardInterrupt:
+            coordinator.stop()
+            typer.echo('Exiting Cluster Coordinator')
+            break
+
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
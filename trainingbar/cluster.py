@@ -0,0 +1,288 @@
+"""
+Multi-host aggregation for TPU pods and multi-node GPU jobs.
+
+Every host runs a ClusterAgent (usually as a TrainingBar hook) that streams its
+stats to one ClusterCoordinator over TCP as newline-delimited JSON frames:
+
+    {"h": "worker-3"}                                  first frame on a connection
+    {"t": 1700000000.5, "n": {"0": "cpu.cpu_util"}, "v": [[0, 12.5]]}
+    {"t": 1700000010.5, "v": [[0, 14.0]]}
+
+Metric names are sent once per connection ("n") and later frames only carry the
+values that changed since the previous frame ("v"), keyed by a small integer id.
+The coordinator writes each value straight into a hosts x metrics matrix, so the
+cost of a frame depends only on how many values changed, not on how many hosts
+are connected; min/mean/max and stragglers are computed over the matrix when a
+summary is asked for.
+"""
+
+import json
+import time
+import socket
+import platform
+import selectors
+import warnings
+from threading import Thread, Lock
+from trainingbar.history import flatten_metrics
+from trainingbar.logger import get_logger
+
+logger = get_logger()
+
+_default_port = 9470
+# Metrics that say whether a host is keeping up with the rest of the job
+_straggler_suffixes = ('tpu_mxu_util', 'gpu_util', 'steps_per_sec')
+
+
+def parse_address(address, port=_default_port):
+    if isinstance(address, (tuple, list)):
+        return address[0], int(address[1])
+    host, _, p = str(address).rpartition(':')
+    if not host:
+        return p, port
+    return host, int(p)
+
+
+class ClusterAgent:
+    """Sends delta-encoded stats to a coordinator. Call it with a stats dict, e.g. as a hook."""
+    def __init__(self, address, host_id=None, timeout=2.0, retry_secs=5.0):
+        self.address = parse_address(address)
+        self.host_id = host_id or platform.node()
+        self.timeout = timeout
+        self.retry_secs = retry_secs
+        self.sock = None
+        self.frames, self.bytes_sent, self.errors = 0, 0, 0
+        self._retry_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.ids, self.last = {}, {}
+
+    def encode(self, stats, ts=None):
+        names, values = {}, []
+        for metric, value in flatten_metrics(stats):
+            idx = self.ids.get(metric, None)
+            if idx is None:
+                idx = self.ids[metric] = len(self.ids)
+                names[idx] = metric
+            if self.last.get(idx, None) != value:
+                self.last[idx] = value
+                values.append([idx, value])
+        frame = {'t': round(ts or time.time(), 3), 'v': values}
+        if names:
+            frame['n'] = names
+        return (json.dumps(frame, separators=(',', ':')) + '\n').encode('utf8')
+
+    def connect(self):
+        self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # A new connection means a coordinator with no state for us, so start from a full frame
+        self._reset()
+        self.sock.sendall((json.dumps({'h': self.host_id}) + '\n').encode('utf8'))
+
+    def send(self, stats, ts=None):
+        if self.sock is None:
+            if time.monotonic() < self._retry_at:
+                return False
+            try:
+                self.connect()
+            except OSError as e:
+                self.errors += 1
+                self._retry_at = time.monotonic() + self.retry_secs
+                logger.debug(f'Coordinator {self.address} unreachable: {e}')
+                self.sock = None
+                return False
+        data = self.encode(stats, ts)
+        try:
+            self.sock.sendall(data)
+        except OSError as e:
+            self.errors += 1
+            logger.debug(f'Lost coordinator {self.address}: {e}')
+            self.close()
+            self._retry_at = time.monotonic() + self.retry_secs
+            return False
+        self.frames += 1
+        self.bytes_sent += len(data)
+        return True
+
+    __call__ = send
+
+    def stats(self):
+        return {'frames': self.frames, 'bytes_sent': self.bytes_sent, 'errors': self.errors, 'connected': self.sock is not None}
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+class _Connection:
+    __slots__ = ('sock', 'buf', 'row', 'cols')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buf = b''
+        self.row = None
+        self.cols = {}
+
+
+class ClusterCoordinator:
+    """
+    Accepts agent connections on one selector thread and keeps the latest value of
+    every metric per host. `summary()` returns per-metric min/mean/max with the hosts
+    holding the extremes, plus stragglers and hosts that stopped reporting.
+    """
+    def __init__(self, port=_default_port, host='0.0.0.0', stale_secs=30, tolerance=0.25, expected=None):
+        import numpy as np
+        self.np = np
+        self.port = port
+        self.host = host
+        self.stale_secs = stale_secs
+        self.tolerance = tolerance
+        self.expected = list(expected or [])
+        self.hosts, self.metrics = {}, {}
+        self.values = np.full((8, 32), np.nan)
+        self.updated = np.zeros(8)
+        self.frames, self.errors = 0, 0
+        self.stopped = False
+        self._lock = Lock()
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(512)
+        self._sock.setblocking(False)
+        self.port = self._sock.getsockname()[1]
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._sock, selectors.EVENT_READ)
+        self._thread = Thread(target=self._serve, name='tbar-coordinator', daemon=True)
+        self._thread.start()
+        logger.info(f'Coordinator listening on {self.host}:{self.port}')
+        return self
+
+    def _serve(self):
+        while not self.stopped:
+            for key, _ in self._selector.select(timeout=0.5):
+                if key.fileobj is self._sock:
+                    self._accept()
+                else:
+                    self._read(key.data)
+
+    def _accept(self):
+        try:
+            sock, _ = self._sock.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ, _Connection(sock))
+
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._selector.unregister(conn.sock)
+            conn.sock.close()
+            return
+        *lines, conn.buf = (conn.buf + data).split(b'\n')
+        for line in lines:
+            try:
+                self.apply(conn, json.loads(line))
+            except Exception as e:
+                self.errors += 1
+                logger.debug(f'Bad frame from {conn.row}: {e}')
+
+    def _index(self, table, key, axis):
+        idx = table.get(key, None)
+        if idx is None:
+            idx = table[key] = len(table)
+            if idx >= self.values.shape[axis]:
+                # Grow by doubling so adding hosts or metrics stays amortized O(1)
+                shape = list(self.values.shape)
+                shape[axis] *= 2
+                values = self.np.full(shape, self.np.nan)
+                values[:self.values.shape[0], :self.values.shape[1]] = self.values
+                self.values = values
+                if axis == 0:
+                    self.updated = self.np.concatenate([self.updated, self.np.zeros(shape[0] - len(self.updated))])
+        return idx
+
+    def apply(self, conn, frame):
+        with self._lock:
+            if 'h' in frame:
+                conn.row, conn.cols = self._index(self.hosts, frame['h'], 0), {}
+                return
+            for i, name in frame.get('n', {}).items():
+                conn.cols[int(i)] = self._index(self.metrics, name, 1)
+            row, cols = conn.row, conn.cols
+            for i, value in frame['v']:
+                self.values[row, cols[i]] = value
+            self.updated[row] = time.time()
+            self.frames += 1
+
+    def summary(self, now=None):
+        np = self.np
+        now = now or time.time()
+        with self._lock:
+            hosts = list(self.hosts)
+            metrics = list(self.metrics)
+            values = self.values[:len(hosts), :len(metrics)].copy()
+            updated = self.updated[:len(hosts)].copy()
+        result = {'hosts': len(hosts), 'metrics': {}, 'stragglers': [], 'stale': [], 'missing': [h for h in self.expected if h not in self.hosts]}
+        if not hosts:
+            return result
+        result['stale'] = [hosts[i] for i in np.flatnonzero(now - updated > self.stale_secs)]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lo, mean, hi = np.nanmin(values, axis=0), np.nanmean(values, axis=0), np.nanmax(values, axis=0)
+            filled = np.isnan(values)
+            argmin = np.where(filled, np.inf, values).argmin(axis=0)
+            argmax = np.where(filled, -np.inf, values).argmax(axis=0)
+            for j, metric in enumerate(metrics):
+                if np.isnan(mean[j]):
+                    continue
+                result['metrics'][metric] = {'min': float(lo[j]), 'mean': float(mean[j]), 'max': float(hi[j]), 'min_host': hosts[argmin[j]], 'max_host': hosts[argmax[j]], 'hosts': int((~filled[:, j]).sum())}
+            # A host is a straggler when its accelerator/step rate is well below the median host
+            cols = [j for j, m in enumerate(metrics) if m.endswith(_straggler_suffixes)]
+            if cols:
+                score = np.nanmean(values[:, cols], axis=1)
+                median = np.nanmedian(score)
+                if median > 0:
+                    result['stragglers'] = [hosts[i] for i in np.flatnonzero(score < median * (1 - self.tolerance))]
+        return result
+
+    def stop(self):
+        self.stopped = True
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._sock:
+            for key in list(self._selector.get_map().values()):
+                key.fileobj.close()
+            self._selector.close()
+            self._sock = None
+
+
+def render_summary(summary, metrics=None):
+    from rich.table import Table
+    table = Table(title=f"{summary['hosts']} Hosts", title_justify='left')
+    for col in ['Metric', 'Min', 'Mean', 'Max', 'Min Host', 'Max Host']:
+        table.add_column(col, justify='left' if 'Host' in col or col == 'Metric' else 'right')
+    for name, m in summary['metrics'].items():
+        if metrics and not any(name.endswith(s) for s in metrics):
+            continue
+        table.add_row(name, f"{m['min']:,.1f}", f"{m['mean']:,.1f}", f"{m['max']:,.1f}", m['min_host'], m['max_host'])
+    notes = []
+    for key in ['stragglers', 'stale', 'missing']:
+        if summary[key]:
+            notes.append(f"{key.title()}: {', '.join(summary[key])}")
+    if notes:
+        table.caption = ' | '.join(notes)
+    return table
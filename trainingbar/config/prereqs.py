@@ -1,4 +1,11 @@
 import os
+import sys
+import json
+import time
+import hashlib
+import importlib.util
+
+_probe_keys = ['colab', 'tf2', 'profiler']
 
 def install_lib(libs):
     if isinstance(libs, str):
@@ -15,29 +22,128 @@ def tpu_reqs():
 
 def gpu_reqs():
     try:
-        import GPUtil
+        import pynvml
     except ImportError:
-        install_lib('gputil')
+        try:
+            import GPUtil
+        except ImportError:
+            install_lib('gputil')
 
-def configure_env():
-    env = {}
+def cache_dir():
+    path = os.path.join(os.environ.get('XDG_CACHE_HOME', None) or os.path.join(os.path.expanduser('~'), '.cache'), 'trainingbar')
     try:
-        import google.colab
-        env['colab'] = True
-    except ImportError:
-        env['colab'] = False
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        return None
+    return path
+
+def read_cache(name, ttl=None):
+    path = cache_dir()
+    if not path or not os.path.exists(os.path.join(path, name)):
+        return None
+    try:
+        with open(os.path.join(path, name), 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    if ttl is not None and time.time() - data.get('time', 0) > ttl:
+        return None
+    return data.get('value', None)
+
+def write_cache(name, value):
+    path = cache_dir()
+    if not path:
+        return False
+    try:
+        data = json.dumps({'time': time.time(), 'value': value})
+    except (TypeError, ValueError):
+        return False
+    # Written to a temp file and renamed, so a process starting at the same time never reads half a file
+    target = os.path.join(path, name)
+    tmp = f'{target}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, target)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+    return True
+
+def pkg_version(name):
+    try:
+        from importlib import metadata
+        return metadata.version(name)
+    except Exception:
+        return None
+
+def probe_key():
+    from trainingbar._version import __version__
+    k = '|'.join([sys.executable, sys.version, __version__, str(pkg_version('tensorflow')), str(pkg_version('tensorflow-cpu'))])
+    return hashlib.sha1(k.encode('utf8')).hexdigest()[:16]
+
+def probe_env():
+    probes = {}
+    try:
+        probes['colab'] = bool(importlib.util.find_spec('google.colab'))
+    except (ImportError, ValueError):
+        probes['colab'] = False
 
     os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-    import tensorflow as tf
-    env['tf2'] = bool(tf.__version__.startswith('2'))
+    try:
+        import tensorflow as tf
+        probes['tf2'] = bool(tf.__version__.startswith('2'))
+    except ImportError:
+        probes['tf2'] = False
     try:
         from tensorflow.python.profiler import profiler_client
         from tensorflow.python.framework import errors
-        env['profiler'] = True
+        probes['profiler'] = True
     except ImportError:
-        env['profiler'] = False
+        probes['profiler'] = False
+    return probes
+
+def cached_probes(reinit=False):
+    name = f'env-{probe_key()}.json'
+    probes = None if reinit else read_cache(name)
+    # A cache from another version or a damaged file may not hold every probe
+    if not isinstance(probes, dict) or not all(k in probes for k in _probe_keys):
+        probes = probe_env()
+        write_cache(name, probes)
+    return probes
+
+
+class LazyEnv(dict):
+    """Environment config whose colab/tf/profiler probes only run on first access."""
+    def __missing__(self, key):
+        if key in _probe_keys and not self.probed:
+            self.probe()
+            if key in self:
+                return dict.__getitem__(self, key)
+        raise KeyError(key)
 
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    @property
+    def probed(self):
+        return all(k in self for k in _probe_keys)
+
+    def probe(self, reinit=False):
+        self.update(cached_probes(reinit))
+        return self
+
+
+def configure_env():
+    env = LazyEnv()
     env['dir'] = os.path.abspath(os.path.dirname(__file__))
     env['auth_path'] = os.path.join(env['dir'], 'auth.json')
-    env['host_config'] = os.path.join(env['dir'], 'host.json')
-    return env
\ No newline at end of file
+    return env
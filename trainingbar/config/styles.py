@@ -15,7 +15,7 @@ from rich.text import Text
 from rich.progress_bar import ProgressBar
 from rich.style import StyleType
 from rich import filesize
-from trainingbar.logger import console
+from trainingbar.logger import get_console
 
 
 _color_theme = {
@@ -24,6 +24,7 @@ _color_theme = {
         'bar': 'green',
         'bg': 'bright_white',
         'right': '[bold blue]',
+        'heat': ['grey35', 'green', 'green_yellow', 'yellow', 'dark_orange', 'red'],
     },
     'tpu': {
         'left': '[bold blue]',
@@ -40,22 +41,54 @@ _color_theme = {
     }
 }
 
+_heat_blocks = ' ▁▂▃▄▅▆▇█'
+_host_devices = ['cpu', 'ram', 'cores', 'diskio', 'net', 'step', 'process']
+_rate_devices = ['diskio', 'net', 'step']
+_heatmap_devices = ['cores', 'gpu_grid']
+_heatmap_width = 40
+# Above this many GPUs, configure_trainingbars draws two heatmap rows instead of one bar per GPU
+_gpu_grid_threshold = 4
+
+def heatmap_cell(idx, count, width=_heatmap_width):
+    return idx // -(-count // width)
+
+def heatmap(util, width=_heatmap_width, pool='max'):
+    # One cell per device until there are more devices than cells, then each cell shows the busiest (pool='max')
+    # or idlest (pool='min') device of its group, so the row stays the same width and cost on 224 cores or 64 GPUs.
+    import numpy as np
+    util = np.asarray(util, dtype=np.float64)
+    if not util.size:
+        return ''
+    groups = -(-util.size // width)
+    if groups > 1:
+        fill = -1.0 if pool == 'max' else 1e9
+        util = np.pad(util, (0, groups * width - util.size), constant_values=fill).reshape(width, groups)
+        util = util.max(axis=1) if pool == 'max' else util.min(axis=1)
+        util = util[(util >= 0) & (util < 1e9)]
+    levels = np.clip(util * (len(_heat_blocks) - 1) / 100.0, 0, len(_heat_blocks) - 1).round().astype(np.int64)
+    return ''.join(_heat_blocks[l] for l in levels.tolist())
+
 class LeftColumn(ProgressColumn):
     def __init__(self):
-        self._configtext = False
+        self._cache = {}
         super().__init__()
 
     def render(self, task: "Task") -> Text:
-        if not self._configtext:
+        # Device labels never change, so markup is parsed once per task
+        text = self._cache.get(task.id, None)
+        if text is None:
             self.config_text(task)
-        _text = self.text_format.format(task=task)
-        return Text.from_markup(_text, style=None, justify='left')
+            text = self._cache[task.id] = Text.from_markup(self.text_format.format(task=task), style=None, justify='left')
+        return text
     
     def config_text(self, task):
         device = task.fields['device']
-        if device in ['cpu', 'ram']:
+        if device in _host_devices:
             self.style = _color_theme['default']['left']
             self.text_format = self.style + "{task.fields[hw]}"
+        elif device == 'gpu_grid':
+            self.style = _color_theme['gpu']['left']
+            self.text_format = self.style + "{task.fields[hw]}"
         elif 'gpu' in device:
             self.style = _color_theme['gpu']['left']
             self.text_format = self.style + "GPU [{task.fields[gpu_id]}] {task.fields[gpu_name]}"
@@ -69,12 +102,19 @@ class LeftColumn(ProgressColumn):
 class RightColumn(ProgressColumn):
     def __init__(self):
         self.style = _color_theme['default']['right']
-        self.text_format = self.style + "{task.percentage:>3.0f}% Utilization"
+        self.text_format = self.style + "{percentage:>3.0f}% Utilization"
+        self.peak_format = self.style + "{percentage:>3.0f}% of Peak"
+        self._cache = {}
         super().__init__()
 
     def render(self, task: "Task") -> Text:
-        _text = self.text_format.format(task=task)
-        return Text.from_markup(_text, justify='right')
+        percentage = round(task.percentage)
+        text_format = self.peak_format if task.fields['device'] in _rate_devices else self.text_format
+        key = (text_format, percentage)
+        text = self._cache.get(key, None)
+        if text is None:
+            text = self._cache[key] = Text.from_markup(text_format.format(percentage=percentage), justify='right')
+        return text
     
     def config_text(self, task):
         device = task.fields['device']
@@ -93,25 +133,43 @@ class RightColumn(ProgressColumn):
 
 class TBarColumn(ProgressColumn):
     def __init__(self, finished_style: StyleType = "bar.finished", pulse_style: StyleType = "bar.pulse"):
-        self._configbar = False
+        self._styles = {}
         self.bar_width = None
         self.finished_style = finished_style
         self.pulse_style = pulse_style
+        self._heat = {}
         super().__init__()
     
     def render(self, task: "Task") -> Text:
-        if not self._configbar:
+        if task.fields['device'] in _heatmap_devices:
+            return self.render_heatmap(task.fields.get('heat', ''), task.fields.get('mark', None))
+        if task.id not in self._styles:
             self.config_bar(task)
-        task.total, task.completed = int(task.total), int(task.completed)
+            self._styles[task.id] = (self.style, self.complete_style)
+        self.style, self.complete_style = self._styles[task.id]
         return ProgressBar(total=max(0, task.total), completed=max(0, task.completed),
             width=None if self.bar_width is None else max(1, self.bar_width),
             pulse=not task.started, animation_time=task.get_time(),
             style=self.style, complete_style=self.complete_style,
             finished_style=self.finished_style, pulse_style=self.pulse_style)
+
+    def render_heatmap(self, heat, mark=None):
+        # `mark` is the cell index of the device to call out, drawn reversed
+        key = (heat, mark)
+        text = self._heat.get(key, None)
+        if text is None:
+            if len(self._heat) > 1024:
+                self._heat.clear()
+            colors = _color_theme['default']['heat']
+            text = self._heat[key] = Text()
+            for i, block in enumerate(heat):
+                style = colors[_heat_blocks.index(block) * (len(colors) - 1) // (len(_heat_blocks) - 1)]
+                text.append(block if block != ' ' else '▁', style=f'reverse {style}' if i == mark else style)
+        return text
     
     def config_bar(self, task):
         device = task.fields['device']
-        if device in ['cpu', 'ram']:
+        if device in _host_devices:
             self.style = Style(color=_color_theme['default']['bg'])
             self.complete_style = Style(color=_color_theme['default']['bar'])
         elif 'gpu' in device:
@@ -127,15 +185,25 @@ class TBarColumn(ProgressColumn):
 
 class MemoryColumn(ProgressColumn):
     def __init__(self) -> None:
-        self._configmem = False
+        self._configs = {}
+        self._cache = {}
         super().__init__()
 
     def render(self, task: "Task") -> Text:
-        if not self._configmem:
+        if task.id not in self._configs:
             self.config_memory(task)
+            self._configs[task.id] = (self.enabled, self.staticstr)
+        self.enabled, self.staticstr = self._configs[task.id]
+        if self.staticstr is None:
+            return Text(task.fields.get('summary', ''), style="progress.download")
         if not self.enabled:
             return Text(self.staticstr, style="progress.download")
         completed, total = int(task.completed), int(task.total)
+        key = (task.id, completed, total)
+        if key in self._cache:
+            return self._cache[key]
+        if len(self._cache) > 4096:
+            self._cache.clear()
         unit, suffix = filesize.pick_unit_and_suffix(
             total, ["bytes", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB"], 1024)
         completed_ratio = completed / unit
@@ -144,7 +212,8 @@ class MemoryColumn(ProgressColumn):
         completed_str = f"{completed_ratio:,.{precision}f}"
         total_str = f"{total_ratio:,.{precision}f}"
         memory_status = f"{completed_str}/{total_str} {suffix}"
-        return Text(memory_status, style="progress.download")
+        text = self._cache[key] = Text(memory_status, style="progress.download")
+        return text
     
     def config_memory(self, task):
         device = task.fields['device']
@@ -152,14 +221,18 @@ class MemoryColumn(ProgressColumn):
         self.staticstr = ''
         if not self.enabled and device == 'cpu':
             self.staticstr = task.fields['cpu']
+        elif device in _heatmap_devices or device in _rate_devices or device == 'process':
+            # Rates and per-core summaries change every tick, so they come from the task's summary field
+            self.staticstr = None
 
-def configure_trainingbars(config, enabled):
+def configure_trainingbars(config, enabled, gpu_grid='auto'):
+    # Repaints are driven by TrainingBar.render() when values change, not by a refresh thread
     tbars = Progress(
         LeftColumn(),
         TBarColumn(),
         MemoryColumn(),
         RightColumn(),
-        console=console, speed_estimate_period=0.0,
+        console=get_console(), speed_estimate_period=0.0, auto_refresh=False,
     )
     ops = {}
     if 'cpu' in enabled:
@@ -169,9 +242,23 @@ def configure_trainingbars(config, enabled):
             cpu_name = cpu_name.replace((' ' + r), '')
         cpu_config = str(config['cpu_cores']) + ' vCPU/' + str(config['cpu_threads']) + ' Threads'
         ops['cpu'] = tbars.add_task('cpu ops', device='cpu', hw=cpu_name, cpu=cpu_config, total=100)
+    if 'cores' in enabled:
+        ops['cores'] = tbars.add_task('cores ops', device='cores', hw=f"{config['cpu_threads']} Cores", heat='', summary='', total=100)
     if 'ram' in enabled:
         ops['ram'] = tbars.add_task('ram ops', device='ram', hw='System RAM', total=config['ram'])
-    if 'gpu' in enabled:
+    if 'diskio' in enabled:
+        ops['diskio'] = tbars.add_task('diskio ops', device='diskio', hw='Disk I/O', summary='', total=100)
+    if 'net' in enabled:
+        ops['net'] = tbars.add_task('net ops', device='net', hw='Network', summary='', total=100)
+    if 'gpu' in enabled and (gpu_grid is True or (gpu_grid == 'auto' and len(config['xla']['gpus']) > _gpu_grid_threshold)):
+        active_gpus = config['xla']['gpus']
+        names = {gpu['name'] for gpu in active_gpus.values()}
+        name = names.pop() if len(names) == 1 else 'GPUs'
+        ops['gpu_grid'] = {
+            'util': tbars.add_task('gpu grid ops', device='gpu_grid', hw=f'{len(active_gpus)}x {name} Compute', heat='', mark=None, summary='', total=100),
+            'vram': tbars.add_task('gpu grid vram ops', device='gpu_grid', hw=f'{len(active_gpus)}x {name} Memory', heat='', mark=None, summary='', total=100),
+        }
+    elif 'gpu' in enabled:
         active_gpus = config['xla']['gpus']
         ops['gpu'] = {}
         for gpu in active_gpus:
@@ -182,4 +269,18 @@ def configure_trainingbars(config, enabled):
         ops['tpu']['tpu_mxu'] = tbars.add_task('tpu mxu ops', device='tpu_mxu', mesh=tpu['mesh'], total=100)
         ops['tpu']['tpu_memory'] = tbars.add_task('tpu mem ops', device='tpu_memory', mesh=tpu['mesh'], total=tpu['tpu_memory'])
 
-    return tbars, ops
\ No newline at end of file
+    return tbars, ops
+
+
+def add_step_task(tbars):
+    # Added on the first reported step, so monitors that never see training code don't show an empty row
+    return tbars.add_task('step ops', device='step', hw='Training', summary='', total=100)
+
+
+def add_process_task(tbars, pid):
+    import psutil
+    try:
+        name = psutil.Process(pid).name()
+    except psutil.Error:
+        name = 'process'
+    return tbars.add_task('process ops', device='process', hw=f'PID {pid} {name}', summary='', total=100)
@@ -0,0 +1,176 @@
+import re
+import time
+from threading import Lock
+from trainingbar.history import flatten_metrics
+
+# Metrics watched by default, matched on the last name component. `idle` is the
+# value at or below which a device counts as doing nothing. Host CPU is left out since
+# an idle host is normal; configure('cpu_util', idle=2.0) watches it.
+_rules = {
+    'gpu_util': {'idle': 5.0},
+    'tpu_mxu_util': {'idle': 5.0},
+    'steps_per_sec': {'idle': 0.0},
+}
+_events = ['stall', 'drop', 'change', 'recovered']
+_device = re.compile(r'^(gpu\.[^.]+|[a-z]+)')
+
+
+class MetricState:
+    __slots__ = ('n', 'mean', 'var', 'armed', 'low_since', 'drop_since', 'dropped', 'alerted', 'cusum_hi', 'cusum_lo', 'last')
+
+    def __init__(self):
+        self.n = 0
+        self.mean, self.var = 0.0, 0.0
+        self.armed = False
+        self.low_since, self.drop_since = None, None
+        self.dropped = False
+        self.alerted = 0
+        self.cusum_hi, self.cusum_lo = 0.0, 0.0
+        self.last = None
+
+
+class StallDetector:
+    """
+    Streaming stall, drop and change point detection over collector samples.
+
+    Each watched metric keeps an EWMA mean and variance and two CUSUM sums, so a
+    sample costs O(1) no matter how long the run has been going. Events:
+
+        stall      an armed metric (one that has been above 2x idle) stayed at or below
+                   idle for `stall_secs`; repeats every `stall_secs` while it lasts
+        drop       the value stayed more than `drop_sigmas` deviations and `drop_ratio`
+                   below its baseline for `drop_secs`
+        change     CUSUM found a sustained level shift; the baseline restarts from the new level
+        recovered  a stalled or dropped metric is back; duration is how long it lasted
+
+    update() returns event dicts with the metric, device (e.g. 'gpu.3', 'tpu', 'cpu'),
+    value, baseline and duration in seconds.
+    """
+    def __init__(self, rules=None, alpha=0.1, warmup=10, stall_secs=60.0, drop_secs=30.0, drop_sigmas=3.0, drop_ratio=0.5, cusum_k=0.5, cusum_h=8.0):
+        self.rules = {k: dict(v) for k, v in _rules.items()}
+        for suffix, rule in (rules or {}).items():
+            self.rules.setdefault(suffix, {}).update(rule)
+        self.alpha = alpha
+        self.warmup = warmup
+        self.stall_secs = stall_secs
+        self.drop_secs = drop_secs
+        self.drop_sigmas = drop_sigmas
+        self.drop_ratio = drop_ratio
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.states = {}
+        self._watched = {}
+        self.counts = {e: 0 for e in _events}
+        # Collectors call update() from their own threads
+        self._lock = Lock()
+
+    def rule(self, metric):
+        # Resolved once per metric name and cached, so unwatched metrics cost one dict lookup
+        rule = self._watched.get(metric, False)
+        if rule is False:
+            rule = self.rules.get(metric.rsplit('.', 1)[-1], None)
+            self._watched[metric] = rule
+        return rule
+
+    def configure(self, suffix, **rule):
+        self.rules.setdefault(suffix, {}).update(rule)
+        self._watched = {}
+
+    def update(self, data, ts=None, prefix=''):
+        ts = ts or time.time()
+        events = []
+        for metric, value in flatten_metrics(data, prefix):
+            rule = self.rule(metric)
+            if rule is not None:
+                events += self.observe(metric, value, ts, rule)
+        return events
+
+    def observe(self, metric, value, ts, rule=None):
+        rule = rule or self.rule(metric) or {}
+        state = self.states.get(metric, None)
+        if state is None:
+            state = self.states[metric] = MetricState()
+        idle = rule.get('idle', 0.0)
+        stall_secs = rule.get('stall_secs', self.stall_secs)
+        events = []
+        state.last = value
+
+        # Stalls: absolute, independent of the baseline so slow ramps can't hide them
+        if value > 2 * idle and value > 0:
+            state.armed = True
+        if state.armed and value <= idle:
+            if state.low_since is None:
+                state.low_since = ts
+            duration = ts - state.low_since
+            if duration >= stall_secs * (state.alerted + 1):
+                state.alerted += 1
+                events.append(self._event('stall', metric, value, state, duration, ts))
+        elif state.low_since is not None:
+            if state.alerted:
+                events.append(self._event('recovered', metric, value, state, ts - state.low_since, ts))
+            state.low_since, state.alerted = None, 0
+        if state.armed and value <= idle:
+            # Idle samples are the stall's business and must not drag the baseline down
+            return events
+
+        if state.n < self.warmup:
+            self._learn(state, value)
+            return events
+
+        std = state.var ** 0.5
+        # Clipped so a single outlier can't trip CUSUM on its own
+        z = max(-4.0, min(4.0, (value - state.mean) / std)) if std > 1e-9 else 0.0
+        # Values at idle are the stall check's job
+        low = idle < value < state.mean - self.drop_sigmas * std and value < state.mean * (1 - self.drop_ratio)
+        if low:
+            if state.drop_since is None:
+                state.drop_since = ts
+            elif not state.dropped and ts - state.drop_since >= self.drop_secs:
+                state.dropped = True
+                events.append(self._event('drop', metric, value, state, ts - state.drop_since, ts))
+            # Don't let the baseline follow a drop down; CUSUM decides if it's the new level
+        else:
+            if state.dropped:
+                events.append(self._event('recovered', metric, value, state, ts - state.drop_since, ts))
+            state.drop_since, state.dropped = None, False
+            self._learn(state, value)
+        if state.drop_since is not None:
+            # A drop in progress is reported as such, not as a new level
+            return events
+
+        state.cusum_hi = max(0.0, state.cusum_hi + z - self.cusum_k)
+        state.cusum_lo = max(0.0, state.cusum_lo - z - self.cusum_k)
+        if state.cusum_hi > self.cusum_h or state.cusum_lo > self.cusum_h:
+            events.append(self._event('change', metric, value, state, 0.0, ts))
+            state.n, state.mean, state.var = 1, value, 0.0
+            state.cusum_hi = state.cusum_lo = 0.0
+            state.drop_since, state.dropped = None, False
+        return events
+
+    def _learn(self, state, value):
+        if state.n == 0:
+            state.mean = value
+        else:
+            diff = value - state.mean
+            incr = self.alpha * diff
+            state.mean += incr
+            state.var = (1 - self.alpha) * (state.var + diff * incr)
+        state.n += 1
+
+    def _event(self, kind, metric, value, state, duration, ts):
+        with self._lock:
+            self.counts[kind] += 1
+        match = _device.match(metric)
+        device = match.group(1) if match else metric
+        message = {
+            'stall': f'{metric} has been at {value:.2f} for {duration:.0f}s',
+            'drop': f'{metric} dropped to {value:.2f} from a baseline of {state.mean:.2f} for {duration:.0f}s',
+            'change': f'{metric} shifted to {value:.2f} from a baseline of {state.mean:.2f}',
+            'recovered': f'{metric} recovered to {value:.2f} after {duration:.0f}s',
+        }[kind]
+        return {'event': kind, 'metric': metric, 'device': device, 'value': value, 'baseline': state.mean, 'duration': duration, 'time': ts, 'message': message}
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return {'watched': len(self.states), 'stalled': sorted(m for m, s in list(self.states.items()) if s.alerted), 'events': counts}
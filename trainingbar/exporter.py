@@ -0,0 +1,147 @@
+import time
+from threading import Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from trainingbar.logger import get_logger
+
+logger = get_logger()
+
+_openmetrics_type = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+_prometheus_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (stats group, key, metric name, help)
+_gauges = [
+    ('cpu', 'cpu_util', 'trainingbar_cpu_utilization_percent', 'Host CPU utilization'),
+    ('ram', 'ram_used', 'trainingbar_ram_used_bytes', 'Host RAM in use'),
+    ('ram', 'ram_total', 'trainingbar_ram_total_bytes', 'Host RAM installed'),
+    ('ram', 'ram_util', 'trainingbar_ram_utilization_percent', 'Host RAM utilization'),
+    ('disk', 'disk_used', 'trainingbar_disk_used_bytes', 'Disk space in use'),
+    ('disk', 'disk_total', 'trainingbar_disk_total_bytes', 'Disk space total'),
+    ('disk', 'disk_util', 'trainingbar_disk_utilization_percent', 'Disk utilization'),
+    ('cores', 'cores_max', 'trainingbar_cpu_core_max_utilization_percent', 'Busiest CPU core utilization'),
+    ('cores', 'cores_min', 'trainingbar_cpu_core_min_utilization_percent', 'Least busy CPU core utilization'),
+    ('cores', 'cores_busy', 'trainingbar_cpu_cores_busy', 'CPU cores above 90% utilization'),
+    ('diskio', 'disk_read_bps', 'trainingbar_disk_read_bytes_per_second', 'Disk read throughput'),
+    ('diskio', 'disk_write_bps', 'trainingbar_disk_write_bytes_per_second', 'Disk write throughput'),
+    ('diskio', 'disk_read_iops', 'trainingbar_disk_read_iops', 'Disk read operations per second'),
+    ('diskio', 'disk_write_iops', 'trainingbar_disk_write_iops', 'Disk write operations per second'),
+    ('net', 'net_sent_bps', 'trainingbar_network_sent_bytes_per_second', 'Network send throughput'),
+    ('net', 'net_recv_bps', 'trainingbar_network_received_bytes_per_second', 'Network receive throughput'),
+    ('step', 'steps_per_sec', 'trainingbar_steps_per_second', 'Training steps per second over the last window'),
+    ('step', 'samples_per_sec', 'trainingbar_samples_per_second', 'Training samples per second over the last window'),
+    ('step', 'tokens_per_sec', 'trainingbar_tokens_per_second', 'Training tokens per second over the last window'),
+    ('step', 'step_time_p50_ms', 'trainingbar_step_time_p50_milliseconds', 'Median step time'),
+    ('step', 'step_time_p99_ms', 'trainingbar_step_time_p99_milliseconds', '99th percentile step time'),
+    ('process', 'proc_cpu', 'trainingbar_process_cpu_percent', 'CPU of the tracked process tree, 100 per core'),
+    ('process', 'proc_rss', 'trainingbar_process_resident_bytes', 'Resident memory of the tracked process tree'),
+    ('process', 'proc_uss', 'trainingbar_process_unique_bytes', 'Memory only the tracked process tree uses'),
+    ('process', 'proc_threads', 'trainingbar_process_threads', 'Threads in the tracked process tree'),
+    ('process', 'proc_fds', 'trainingbar_process_open_files', 'Open file descriptors in the tracked process tree'),
+    ('process', 'proc_count', 'trainingbar_process_count', 'Processes in the tracked process tree'),
+    ('process', 'proc_read_bps', 'trainingbar_process_read_bytes_per_second', 'Storage reads of the tracked process tree'),
+    ('process', 'proc_write_bps', 'trainingbar_process_write_bytes_per_second', 'Storage writes of the tracked process tree'),
+    ('process', 'proc_vram_used', 'trainingbar_process_vram_used_megabytes', 'GPU memory held by the tracked process tree'),
+    ('gcp', 'channels', 'trainingbar_gcp_channels_opened', 'Cloud Monitoring channels opened by this process'),
+    ('gcp', 'token_refreshes', 'trainingbar_gcp_token_refreshes', 'Access token refreshes by this process'),
+    ('gcp', 'credential_loads', 'trainingbar_gcp_credential_loads', 'Times credentials were loaded from ADC'),
+    ('tpu', 'tpu_mxu_util', 'trainingbar_tpu_mxu_utilization_percent', 'TPU matrix unit utilization'),
+    ('tpu', 'tpu_mem_used', 'trainingbar_tpu_memory_used_bytes', 'TPU memory in use'),
+    ('tpu', 'tpu_mem_total', 'trainingbar_tpu_memory_total_bytes', 'TPU memory total'),
+    ('tpu', 'tpu_mem_util', 'trainingbar_tpu_memory_utilization_percent', 'TPU memory utilization'),
+]
+
+_gpu_gauges = [
+    ('vram_used', 'trainingbar_gpu_vram_used_megabytes', 'GPU memory in use'),
+    ('vram_total', 'trainingbar_gpu_vram_total_megabytes', 'GPU memory total'),
+    ('vram_util', 'trainingbar_gpu_vram_utilization_percent', 'GPU memory utilization'),
+    ('gpu_util', 'trainingbar_gpu_utilization_percent', 'GPU compute utilization'),
+]
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render_openmetrics(stats, labels=None):
+    base = ','.join(f'{k}="{escape(v)}"' for k, v in (labels or {}).items())
+    lines = []
+    for group, key, name, desc in _gauges:
+        value = stats.get(group, {}).get(key, None)
+        if value is None:
+            continue
+        lines += [f'# HELP {name} {desc}.', f'# TYPE {name} gauge', f'{name}{{{base}}} {float(value)}' if base else f'{name} {float(value)}']
+    gpus = stats.get('gpu', {})
+    for key, name, desc in _gpu_gauges:
+        samples = []
+        for gpu_id, gpu in gpus.items():
+            if gpu.get(key, None) is None:
+                continue
+            gpu_labels = f'gpu="{escape(gpu_id)}",name="{escape(gpu.get("name", ""))}"'
+            samples.append(f'{name}{{{base + "," if base else ""}{gpu_labels}}} {float(gpu[key])}')
+        if samples:
+            lines += [f'# HELP {name} {desc}.', f'# TYPE {name} gauge'] + samples
+    lines.append('# EOF')
+    return ('\n'.join(lines) + '\n').encode('utf8')
+
+
+class MetricsExporter:
+    """
+    Serves the latest stats as OpenMetrics text on /metrics.
+
+    The payload is rendered once per publish() into bytes, so a scrape only copies the
+    cached body and never triggers a collection.
+    """
+    def __init__(self, port=9464, host='0.0.0.0', labels=None):
+        self.port = port
+        self.host = host
+        self.labels = labels or {}
+        self.body = b'# EOF\n'
+        self.published = None
+        self.scrapes = 0
+        self._server = None
+        self._thread = None
+
+    def publish(self, stats):
+        self.body = render_openmetrics(stats, self.labels)
+        self.published = time.time()
+
+    def start(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = exporter.body
+                exporter.scrapes += 1
+                self.send_response(200)
+                self.send_header('Content-Type', _openmetrics_type if 'openmetrics' in self.headers.get('Accept', '') else _prometheus_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        # A short poll so shutdown() doesn't wait out serve_forever's default 0.5s
+        self._thread = Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, name='tbar-exporter', daemon=True)
+        self._thread.start()
+        logger.info(f'Serving metrics on http://{self.host}:{self.port}/metrics')
+        return self
+
+    def stop(self, wait=False):
+        # shutdown() blocks until the serve loop notices; unless asked to wait, that happens off the caller's thread
+        server, self._server = self._server, None
+        if server:
+            thread = Thread(target=self._close, args=(server,), name='tbar-exporter-stop', daemon=True)
+            thread.start()
+            if wait:
+                thread.join()
+
+    @staticmethod
+    def _close(server):
+        server.shutdown()
+        server.server_close()
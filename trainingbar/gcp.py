@@ -0,0 +1,89 @@
+import os
+import weakref
+from threading import Lock
+
+_default_key = 'default'
+
+
+class GCPClients:
+    """
+    Process-wide Google Cloud credentials and Cloud Monitoring clients.
+
+    Credentials are loaded once per ADC file (GOOGLE_APPLICATION_CREDENTIALS, or the
+    implicit default), and clients are built once per (project, credentials, sync/async),
+    so every TimeSeriesMonitor in the process shares one gRPC channel and one access
+    token. Async clients are also kept per event loop, since a grpc.aio channel only
+    works on the loop that created it; each asyncio.run() gets its own. The token is refreshed by google-auth only when it has expired.
+
+    stats() counts credential loads, token refreshes and channels created, each of
+    which costs a network round trip or TLS handshake, and how often a cached client
+    was handed out instead.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._credentials = {}
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.counts = {'credential_loads': 0, 'token_refreshes': 0, 'channels': 0, 'client_reuses': 0}
+
+    def key(self):
+        return os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', None) or _default_key
+
+    def credentials(self):
+        """Returns (credentials, project) for the current ADC, loading them on first use."""
+        key = self.key()
+        with self._lock:
+            if key not in self._credentials:
+                import google.auth
+                creds, project = google.auth.default()
+                self._count_refreshes(creds)
+                self._credentials[key] = (creds, project)
+                self.counts['credential_loads'] += 1
+            return self._credentials[key]
+
+    def client(self, project=None, asynchronous=False):
+        creds, default_project = self.credentials()
+        key = (project or default_project, self.key(), asynchronous)
+        clients = self._clients
+        if asynchronous:
+            import asyncio
+            loop = asyncio.get_running_loop()
+        with self._lock:
+            if asynchronous:
+                # Dropped along with the loop once it is closed and collected
+                clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key, None)
+            if client is not None:
+                self.counts['client_reuses'] += 1
+                return client
+            from google.cloud import monitoring_v3
+            cls = monitoring_v3.MetricServiceAsyncClient if asynchronous else monitoring_v3.MetricServiceClient
+            client = clients[key] = cls(credentials=creds)
+            self.counts['channels'] += 1
+            return client
+
+    def _count_refreshes(self, creds):
+        refresh = creds.refresh
+        def counted(request):
+            refresh(request)
+            with self._lock:
+                self.counts['token_refreshes'] += 1
+        try:
+            creds.refresh = counted
+        except AttributeError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, clients=len(self._clients) + sum(len(c) for c in self._async_clients.values()))
+
+    def clear(self):
+        with self._lock:
+            self._credentials, self._clients = {}, {}
+            self._async_clients = weakref.WeakKeyDictionary()
+
+
+gcp_clients = GCPClients()
+
+def get_clients():
+    return gcp_clients
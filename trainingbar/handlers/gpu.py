@@ -1,122 +1,107 @@
 import sys
 import time
-from threading import Thread, Lock
+from threading import Lock
 from trainingbar.utils import _timer_formats
 import os
-import GPUtil
+from trainingbar.handlers.gpu_backends import get_backend
 
 def check_gpu(params):
     _gpus = False
-    p = {'total_gpus': 0, 'active_gpus': 0, 'gpus': []}
+    p = {'total_gpus': 0, 'active_gpus': 0, 'gpus': {}, 'gpu_backend': 'auto'}
     p.update(params)
-    gpus = GPUtil.getGPUs()
+    # A backend object passed in belongs to the caller, who keeps using it after probing
+    owned = isinstance(p['gpu_backend'], str)
+    backend = get_backend(p['gpu_backend'], p)
+    if not owned:
+        p['gpu_backend'] = backend.name
+    gpus = backend.devices() if backend else []
     if gpus:
-        p['total_gpus'] = sum(1 for gpu in gpus)
+        p['total_gpus'] = len(gpus)
+        if p['gpu_backend'] == 'auto':
+            p['gpu_backend'] = backend.name
         gpu_idx = []
         _gpus = True
-        if p.get('limit_gpu', None):
+        if p.get('limit_gpu', None) is not None:
             os.environ["CUDA_DEVICE_ORDER"] = "PCI_BUS_ID"
             if isinstance(p['limit_gpu'], int):
-                DEVICE_ID_LIST = GPUtil.getFirstAvailable()
-                DEVICE_ID = DEVICE_ID_LIST[p['limit_gpu']]
                 gpu_idx.append(p['limit_gpu'])
-                os.environ["CUDA_VISIBLE_DEVICES"] = str(DEVICE_ID)
+                os.environ["CUDA_VISIBLE_DEVICES"] = str(p['limit_gpu'])
             elif isinstance(p['limit_gpu'], list):
-                os.environ["CUDA_VISIBLE_DEVICES"] = str(','.join(p['limit_gpu']))
+                os.environ["CUDA_VISIBLE_DEVICES"] = str(','.join(str(g) for g in p['limit_gpu']))
                 gpu_idx = p['limit_gpu']
         for gpu in gpus:
-            if gpu.id not in gpu_idx:
-                p['gpus'][gpu.id] = {'idx': gpu.id, 'name': gpu.name, 'vram_total': gpu.memoryTotal, 'vram_used': gpu.memoryUsed, 'vram_util': gpu.memoryUtil * 100}
+            if not gpu_idx or gpu['idx'] in gpu_idx:
+                p['gpus'][gpu['idx']] = gpu
                 p['active_gpus'] += 1
+    if backend and owned:
+        backend.close()
     
     return p, _gpus
 
 
 class GPUMonitor:
-    def __init__(self, client, delay=10, background=True):
+    def __init__(self, client, delay=10, background=True, backend=None):
         self.stopped = False
         self.client = client
+        self.backend = backend
         self.delay = delay
         self.time = time.time()
         self.run_bg = background
+        self.last_sample = None
         self._lock = Lock()
         self._setup()
         if not self.total_gpus:
             self.stop()
-        elif self.run_bg:
-            _bg = Thread(target=self.background, daemon=True)
-            _bg.start()
 
-    def background(self):
-        while not self.stopped:
-            with self._lock:
-                self._getdata()
-                if self.check_pulse:
-                    self.pulse(gpu_stats=self.gpus)
-                time.sleep(self.delay)
-    
-    def update(self):
+    def update(self, ts=None):
         if not self.stopped:
-            self._getdata()
-        return self.gpus
+            self._getdata(ts)
+        return self.stats()
     
     def stats(self):
-        return self.gpus
+        with self._lock:
+            return {gpu_id: dict(gpu) for gpu_id, gpu in self.gpus.items()}
+
+    def processes(self):
+        if self.stopped or not self.backend:
+            return None
+        procs = self.backend.processes()
+        if procs is None:
+            return None
+        return {gpu_id: pids for gpu_id, pids in procs.items() if gpu_id in self.gpus}
 
     def stop(self):
         self.stopped = True
+        if self.backend:
+            self.backend.close()
     
-    def _getdata(self):
-        gpus = GPUtil.getGPUs()
-        for gpu in gpus:
-            self.gpus[gpu.id].update({'vram_used': gpu.memoryUsed, 'vram_util': gpu.memoryUtil * 100})
+    def _getdata(self, ts=None):
+        gpus = self.backend.sample()
+        with self._lock:
+            for gpu_id, gpu in gpus.items():
+                if gpu_id in self.gpus:
+                    self.gpus[gpu_id].update(gpu)
+            self.last_sample = ts or time.time()
         
     def _setup(self):
-        gpus = GPUtil.getGPUs()
+        if self.backend is None:
+            xla = self.client(config=True)['xla']
+            self.backend = get_backend(xla.get('gpu_backend', 'auto'), xla)
+        else:
+            self.backend = get_backend(self.backend)
+        gpus = self.backend.devices() if self.backend else []
         self.gpus = {}
         self.gpu_ids = []
         self.total_gpus = 0
-        self.check_pulse = False
-        if gpus:
-            for gpu in gpus:
-                self.gpus[gpu.id] = {'idx': gpu.id, 'name': gpu.name, 'vram_total': gpu.memoryTotal, 'vram_used': gpu.memoryUsed, 'vram_util': gpu.memoryUtil * 100}
-                self.gpu_ids.append(gpu.id)
-                self.total_gpus += 1
+        active = self.client(config=True)['xla'].get('gpus', None)
+        for gpu in gpus:
+            if active and gpu['idx'] not in active and str(gpu['idx']) not in active:
+                continue
+            self.gpus[gpu['idx']] = gpu
+            self.gpu_ids.append(gpu['idx'])
+            self.total_gpus += 1
     
 
-    def create_timeout_hook(self, hook, min_vram_util=10.00, num_timeouts=50):
-        self.timeout_hook = {'idx': 0, 'num_timeouts': num_timeouts, 'hook': hook, 'min_vram_util': float(min_vram_util), 'pulse': 0.00, 'warnings': 0}
-        self.gpu_pulse = False
-        self.check_pulse = True
-        self.log = self.client(ops='logger')
-        self.log(f'Created timeout hook. Will invoke after {float(num_timeouts) * self.delay} secs if GPU falls below {min_vram_util} after the first GPU Pulse.')
-
-    def pulse(self, gpu_stats=None):
-        if gpu_stats:
-            self.timeout_hook['pulse'] = gpu_stats[self.gpu_ids[0]].get('vram_util', self.timeout_hook['pulse'])
-            if not self.gpu_pulse:
-                for gpu_id, gpu in gpu_stats.items():
-                    if gpu.get('vram_util', 0.00) > 5.00 and self.get_time(fmt='mins') > 5.00:
-                        self.gpu_pulse = True
-            else:
-                if self.timeout_hook['pulse'] < self.timeout_hook['min_vram_util']:
-                    self.timeout_hook['idx'] += 1
-                    self.timeout_hook['warnings'] += 1
-                    if self.timeout_hook['warnings'] % self.timeout_hook['num_timeouts'] == 0:
-                        msg = f"TrainingBar has detected {self.timeout_hook['warnings']} periods of under {self.timeout_hook['min_vram_util']:.2f}%. Last GPU VRAM Util Pulse: {self.timeout_hook['pulse']:.2f}%. Time Alive: {self.get_time(fmt='hrs'):.2f} hrs"
-                        self.log(msg)
-                        self.timeout_hook['hook'](msg)
-                else:
-                    self.timeout_hook['warnings'] = 0
-        else:
-            if self.gpu_pulse:
-                self.timeout_hook['warnings'] += 1
-                if self.timeout_hook['warnings'] % self.timeout_hook['num_timeouts'] == 0:
-                    msg = f"Potential GPU Runtime Error: TrainingBar has detected {self.timeout_hook['warnings']} periods of under {self.timeout_hook['min_vram_util']:.2f}%. Last VRAM Util Pulse: {self.timeout_hook['pulse']:.2f}%. Time Alive: {self.get_time(fmt='hrs'):.2f} hrs"
-                    self.log(msg)
-                    self.timeout_hook['hook'](msg)
-
-
     def get_time(self, fmt='mins'):
         _stoptime = time.time()
         total_time = _stoptime - self.time
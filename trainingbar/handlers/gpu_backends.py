@@ -0,0 +1,176 @@
+import os
+import random
+
+_mb = 1024 ** 2
+
+
+class GPUBackend:
+    name = 'base'
+
+    def devices(self):
+        """Returns a list of device dicts with idx, name and the current sample."""
+        raise NotImplementedError
+
+    def sample(self):
+        """Returns {idx: {'vram_used', 'vram_util', 'gpu_util'}} for every device."""
+        raise NotImplementedError
+
+    def processes(self):
+        """Returns {idx: {pid: vram_used_mb}} for processes holding device memory, or None if unsupported."""
+        return None
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self.devices())
+
+
+class NVMLBackend(GPUBackend):
+    """Reads memory and utilization in-process through NVML, keeping device handles open."""
+    name = 'nvml'
+
+    def __init__(self, nvml=None):
+        if nvml is None:
+            import pynvml as nvml
+        self.nvml = nvml
+        self.nvml.nvmlInit()
+        self.handles = {}
+        self.names = {}
+        for idx in range(self.nvml.nvmlDeviceGetCount()):
+            handle = self.nvml.nvmlDeviceGetHandleByIndex(idx)
+            name = self.nvml.nvmlDeviceGetName(handle)
+            self.handles[idx] = handle
+            self.names[idx] = name.decode('utf8') if isinstance(name, bytes) else name
+
+    def _read(self, handle):
+        mem = self.nvml.nvmlDeviceGetMemoryInfo(handle)
+        try:
+            gpu_util = float(self.nvml.nvmlDeviceGetUtilizationRates(handle).gpu)
+        except self.nvml.NVMLError:
+            gpu_util = 0.0
+        return {'vram_total': mem.total / _mb, 'vram_used': mem.used / _mb, 'vram_util': (mem.used / mem.total * 100) if mem.total else 0.0, 'gpu_util': gpu_util}
+
+    def devices(self):
+        devices = []
+        for idx, handle in self.handles.items():
+            device = {'idx': idx, 'name': self.names[idx]}
+            device.update(self._read(handle))
+            devices.append(device)
+        return devices
+
+    def sample(self):
+        data = {}
+        for idx, handle in self.handles.items():
+            data[idx] = self._read(handle)
+            _ = data[idx].pop('vram_total')
+        return data
+
+    def processes(self):
+        # Pids are as NVML sees them, which in a container is the host's pid namespace
+        data = {}
+        for idx, handle in self.handles.items():
+            try:
+                procs = self.nvml.nvmlDeviceGetComputeRunningProcesses(handle)
+            except self.nvml.NVMLError:
+                return None
+            data[idx] = {p.pid: (p.usedGpuMemory or 0) / _mb for p in procs}
+        return data
+
+    def close(self):
+        if self.handles:
+            self.handles = {}
+            self.nvml.nvmlShutdown()
+
+
+class GPUtilBackend(GPUBackend):
+    """Fallback backend that shells out to nvidia-smi through GPUtil on every sample."""
+    name = 'gputil'
+
+    def __init__(self):
+        import GPUtil
+        self.gputil = GPUtil
+
+    def devices(self):
+        return [{'idx': gpu.id, 'name': gpu.name, 'vram_total': gpu.memoryTotal, 'vram_used': gpu.memoryUsed, 'vram_util': gpu.memoryUtil * 100, 'gpu_util': gpu.load * 100} for gpu in self.gputil.getGPUs()]
+
+    def sample(self):
+        return {gpu.id: {'vram_used': gpu.memoryUsed, 'vram_util': gpu.memoryUtil * 100, 'gpu_util': gpu.load * 100} for gpu in self.gputil.getGPUs()}
+
+
+class FakeNVML:
+    """
+    Stand-in for the pynvml module with a configurable number of devices, so the NVML
+    backend and GPUMonitor can run on machines without GPUs.
+    """
+    class NVMLError(Exception):
+        pass
+
+    class _Memory:
+        def __init__(self, total, used):
+            self.total, self.used, self.free = total, used, total - used
+
+    class _Utilization:
+        def __init__(self, gpu, memory):
+            self.gpu, self.memory = gpu, memory
+
+    class _Process:
+        def __init__(self, pid, used):
+            self.pid, self.usedGpuMemory = pid, used
+
+    def __init__(self, num_gpus=8, vram_total=16 * 1024 ** 3, name='Fake GPU', seed=None):
+        self.num_gpus = num_gpus
+        self.vram_total = vram_total
+        self.device_name = name
+        self.rng = random.Random(seed)
+        self.initialized = 0
+
+    def nvmlInit(self):
+        self.initialized += 1
+
+    def nvmlShutdown(self):
+        self.initialized -= 1
+
+    def nvmlDeviceGetCount(self):
+        return self.num_gpus
+
+    def nvmlDeviceGetHandleByIndex(self, idx):
+        if idx >= self.num_gpus:
+            raise self.NVMLError(f'Invalid device index {idx}')
+        return idx
+
+    def nvmlDeviceGetName(self, handle):
+        return f'{self.device_name} {handle}'
+
+    def nvmlDeviceGetMemoryInfo(self, handle):
+        return self._Memory(self.vram_total, int(self.vram_total * self.rng.random()))
+
+    def nvmlDeviceGetUtilizationRates(self, handle):
+        return self._Utilization(self.rng.randint(0, 100), self.rng.randint(0, 100))
+
+    def nvmlDeviceGetComputeRunningProcesses(self, handle):
+        # The calling process holds a share of every device
+        return [self._Process(os.getpid(), self.vram_total // 4)]
+
+
+_backends = {
+    'nvml': NVMLBackend,
+    'gputil': GPUtilBackend,
+}
+
+def get_backend(backend='auto', params=None):
+    if isinstance(backend, GPUBackend):
+        return backend
+    if backend == 'fake':
+        return NVMLBackend(nvml=FakeNVML(num_gpus=int(os.environ.get('TBAR_FAKE_GPUS', 8))))
+    if backend == 'sim':
+        from trainingbar.simulation import SimulatedGPUBackend
+        return SimulatedGPUBackend.from_params(params)
+    if backend in _backends:
+        return _backends[backend]()
+    for name in ['nvml', 'gputil']:
+        try:
+            return _backends[name]()
+        except Exception:
+            continue
+    return None
@@ -1,13 +1,15 @@
 import sys
 import time
-from threading import Thread, Lock
+from threading import Lock
 import psutil
 import platform
 import os
 import json
+import hashlib
 from trainingbar.utils import run_command, FormatSize
 from trainingbar.config import prereqs
-from trainingbar import env, update_auth, auths
+from trainingbar import env, update_auth, get_auths
+from trainingbar.gcp import get_clients
 
 host_config = None
 
@@ -28,9 +30,87 @@ def disk_util(p='/'):
     return {'disk_total': disk.total, 'disk_used': disk.used, 'disk_util': disk.percent}
 
 
+class CounterRates:
+    """Per-second rates from snapshots of monotonically increasing counters, as one vector op."""
+    def __init__(self):
+        import numpy as np
+        self.np = np
+        self.prev, self.prev_t = None, None
+
+    def update(self, counters, t=None):
+        t = t or time.monotonic()
+        counters = self.np.asarray(counters, dtype=self.np.float64)
+        rates = None
+        if self.prev is not None and self.prev.shape == counters.shape and t > self.prev_t:
+            rates = self.np.maximum(counters - self.prev, 0.0) / (t - self.prev_t)
+        self.prev, self.prev_t = counters, t
+        return rates
+
+
+def read_cpu_times():
+    """Per-core (busy, total) jiffies as an (n, 2) array, from /proc/stat when available."""
+    import numpy as np
+    if os.path.exists('/proc/stat'):
+        with open('/proc/stat', 'rb') as f:
+            lines = f.read().split(b'\n')
+        # user nice system idle iowait irq softirq steal
+        times = np.array([l.split()[1:9] for l in lines[1:] if l.startswith(b'cpu')], dtype=np.float64)
+        idle = times[:, 3] + times[:, 4]
+    else:
+        times = np.array(psutil.cpu_times(percpu=True), dtype=np.float64)
+        fields = psutil.cpu_times()._fields
+        idle = times[:, fields.index('idle')] + (times[:, fields.index('iowait')] if 'iowait' in fields else 0.0)
+    total = times.sum(axis=1)
+    return np.stack([total - idle, total], axis=1)
+
+
+class CoreMonitor:
+    def __init__(self):
+        import numpy as np
+        self.np = np
+        self.prev = None
+
+    def update(self):
+        times = read_cpu_times()
+        data = {}
+        if self.prev is not None and self.prev.shape == times.shape:
+            delta = times - self.prev
+            util = 100.0 * delta[:, 0] / self.np.maximum(delta[:, 1], 1.0)
+            data = {'cores_util': util.round(1).tolist(), 'cores_mean': float(util.mean()), 'cores_max': float(util.max()), 'cores_min': float(util.min()), 'cores_busy': int((util >= 90.0).sum())}
+        self.prev = times
+        return data
+
+
+class IOMonitor:
+    _disk_fields = ['disk_read_bps', 'disk_write_bps', 'disk_read_iops', 'disk_write_iops']
+    _net_fields = ['net_sent_bps', 'net_recv_bps']
+
+    def __init__(self, disk=True, net=True):
+        self.disk, self.net = disk, net
+        self.rates = CounterRates()
+
+    def update(self):
+        counters, fields = [], []
+        if self.disk:
+            io = psutil.disk_io_counters()
+            if io:
+                counters += [io.read_bytes, io.write_bytes, io.read_count, io.write_count]
+                fields += self._disk_fields
+        if self.net:
+            io = psutil.net_io_counters()
+            if io:
+                counters += [io.bytes_sent, io.bytes_recv]
+                fields += self._net_fields
+        rates = self.rates.update(counters)
+        if rates is None:
+            return {}
+        return dict(zip(fields, rates.tolist()))
+
+
 def gcp_auth(params):
     _authed = True
     params = params or {}
+    auths = get_auths()
     if params.get('gcp_auth', None):
         os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = params['gcp_auth']
     elif params.get('DEFAULT_ADC', None):
@@ -46,33 +126,40 @@ def gcp_auth(params):
         _authed = False
 
     if _authed:
-        import google.auth
-        creds, _ = google.auth.default()
+        creds, _ = get_clients().credentials()
         if creds:
             default_adc = os.path.join(os.environ.get('HOME', env['dir']), 'adc.json')
-            creds.expiry = None
+            # Copied, since the credentials object is shared and keeps refreshing its own token
             creds = dict(creds.__dict__)
             _creds = {}
             for k in creds:
+                # Signers, refresh workers and the like can't go in a credentials file
+                if not isinstance(creds[k], (str, int, float, bool, list, tuple, dict, type(None))):
+                    continue
                 if k.startswith('_'):
                     _creds[k[1:]] = creds[k]
                 else:
                     _creds[k] = creds[k]
 
-            if _creds.get('signer', None):
-                _ = _creds.pop('signer')
+            for k in ['token', 'expiry']:
+                _ = _creds.pop(k, None)
             _creds['type'] = 'authorized_user' if _creds.get('refresh_token', None) else 'service_account'
             if _creds['type'] == 'service_account':
                 _creds['token_uri'] = creds.get('_token_uri', 'https://oauth2.googleapis.com/token')
 
+            # Only written when the credentials changed, not on every start
             try:
-                json.dump(_creds, open(default_adc, 'w'))
+                adc = json.dumps(_creds)
+                if not os.path.exists(default_adc) or open(default_adc, 'r').read() != adc:
+                    with open(default_adc, 'w') as f:
+                        f.write(adc)
+                    print(f'Found ADC Credentials Implicitly. Saving to {default_adc} for future runs.\nSet GOOGLE_APPLICATION_CREDENTIALS={default_adc} in Environment to allow libraries like Tensorflow to locate your ADC.')
             except:
                 print('failed to save creds')
                 print(_creds)
-            auths['DEFAULT_ADC'] = 'implicit'
-            print(f'Found ADC Credentials Implicitly. Saving to {default_adc} for future runs.\nSet GOOGLE_APPLICATION_CREDENTIALS={default_adc} in Environment to allow libraries like Tensorflow to locate your ADC.')
-            update_auth(auths)
+            if auths.get('DEFAULT_ADC', None) != 'implicit':
+                auths['DEFAULT_ADC'] = 'implicit'
+                update_auth(auths)
     else:
         if env['colab']:
             print('Authenticating with Google Cloud Engine to access TPUs')
@@ -90,18 +177,23 @@ def gcp_auth(params):
 def init_xla(xla, xla_params, authed):
     _xla = None
     if xla in ['gpu', 'auto']:
-        prereqs.gpu_reqs()
+        if xla_params.get('gpu_backend', None) not in ['fake', 'sim']:
+            prereqs.gpu_reqs()
         from trainingbar.handlers.gpu import check_gpu
         gpus, _xla = check_gpu(xla_params)
+        # The host config is cached as JSON, so it keeps a backend object's name, never the object
+        xla_params['gpu_backend'] = gpus['gpu_backend']
         if _xla:
             xla_params.update(gpus)
 
     if xla in ['tpu', 'auto'] and not _xla:
-        prereqs.tpu_reqs()
+        simulated = xla_params.get('tpu_backend', None) == 'sim'
+        if not simulated:
+            prereqs.tpu_reqs()
         from trainingbar.handlers.tpu import check_tpu
-        if xla_params.get('tpu_name', None):
+        if xla_params.get('tpu_name', None) and not simulated:
             os.environ['TPU_NAME'] = xla_params['tpu_name']
-        if not authed:
+        if not authed and not simulated:
             authed = gcp_auth(xla_params)
         tpus, _xla = check_tpu(xla_params)
         if _xla:
@@ -139,15 +231,59 @@ def init_hw(xla, xla_params, authenticate, disk_path):
     return {'cpu_name': cpu_name, 'cpu_cores': cores, 'cpu_threads': threads, 'ram': ram['ram_total'], 'swap': swaptotal, 'disk': disktotal, 'auth': authed, 'sys': {'ram': ram, 'swap': swap, 'disk': disk}, 'xla_enabled': _xla, 'xla': xla_params}
 
 
+def gpu_bus_ids():
+    # The NVIDIA driver lists one directory per GPU, named by PCI bus id, without initializing anything
+    path = '/proc/driver/nvidia/gpus'
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def boot_id():
+    try:
+        with open('/proc/sys/kernel/random/boot_id', 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return str(psutil.boot_time())
+
+
+def host_fingerprint(xla='auto', xla_params=None, authenticate=True, disk_path='/'):
+    """Cheap hash of everything init_hw's result depends on, checked on every start instead of re-probing."""
+    from trainingbar._version import __version__
+    params = xla_params or {}
+    parts = {
+        'boot_id': boot_id(),
+        'cpus': os.cpu_count(),
+        'ram': psutil.virtual_memory().total,
+        'gpus': gpu_bus_ids(),
+        'visible_gpus': os.environ.get('CUDA_VISIBLE_DEVICES', None),
+        'fake_gpus': os.environ.get('TBAR_FAKE_GPUS', None),
+        'tpu_name': params.get('tpu_name', None) or os.environ.get('TPU_NAME', None),
+        'args': [xla, params, authenticate, disk_path],
+        'version': __version__,
+    }
+    try:
+        key = json.dumps(parts, sort_keys=True)
+    except (TypeError, ValueError):
+        # Arguments that aren't plain data (e.g. a GPU backend object) can't be matched across runs
+        return None
+    return hashlib.sha1(key.encode('utf8')).hexdigest()[:16]
+
+
 def config_host(xla='auto', xla_params=None, authenticate=True, disk_path='/', reinit=False):
     global host_config
     if host_config and not reinit:
         return host_config
-    if os.path.exists(env['host_config']) and not reinit:
-        host_config = json.load(open(env['host_config'], 'r'))
+    # Cached under the XDG cache dir, and only reused while the host and the arguments match
+    fingerprint = host_fingerprint(xla, xla_params, authenticate, disk_path)
+    cached = None if reinit or fingerprint is None else prereqs.read_cache('host.json')
+    if isinstance(cached, dict) and cached.get('fingerprint', None) == fingerprint:
+        host_config = cached['config']
     else:
         host_config = init_hw(xla, xla_params, authenticate, disk_path)
-        json.dump(host_config, open(env['host_config'], 'w'), indent=2)
+        if fingerprint is not None:
+            prereqs.write_cache('host.json', {'fingerprint': fingerprint, 'config': host_config})
     return host_config
 
 
@@ -158,38 +294,41 @@ class HostMonitor:
         self.enabled = enabled
         self.delay = delay
         self.run_bg = background
+        self.last_sample = None
         self._lock = Lock()
         self._setup()
-        if self.run_bg:
-            _bg = Thread(target=self.background, daemon=True)
-            _bg.start()
-
-    def background(self):
-        while not self.stopped:
-            with self._lock:
-                self._getdata()
-                time.sleep(self.delay)
-    
-    def update(self):
+
+    def update(self, ts=None):
         if not self.stopped:
-            self._getdata()
-        return self.sys
+            self._getdata(ts)
+        return self.stats()
     
     def stats(self):
-        return self.sys
+        with self._lock:
+            return dict(self.sys)
 
     def stop(self):
         self.stopped = True
     
-    def _getdata(self):
+    def _getdata(self, ts=None):
+        data = {}
         if 'cpu' in self.enabled:
-            self.sys.update(cpu_util())
+            data.update(cpu_util())
         if 'ram' in self.enabled:
-            self.sys.update(ram_util())
+            data.update(ram_util())
         if 'swap' in self.enabled:
-            self.sys.update(swap_util())
+            data.update(swap_util())
         if 'disk' in self.enabled:
-            self.sys.update(disk_util())
+            data.update(disk_util())
+        if self.cores:
+            data.update(self.cores.update())
+        if self.io:
+            data.update(self.io.update())
+        with self._lock:
+            self.sys.update(data)
+            self.last_sample = ts or time.time()
 
     def _setup(self):
-        self.sys = {}
\ No newline at end of file
+        self.sys = {}
+        self.cores = CoreMonitor() if 'cores' in self.enabled else None
+        self.io = IOMonitor('diskio' in self.enabled, 'net' in self.enabled) if ('diskio' in self.enabled or 'net' in self.enabled) else None
@@ -4,13 +4,18 @@ import sys
 import re
 import calendar
 import collections
+import collections.abc
 import simdjson as json
 import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 
 from datetime import datetime
 from google.cloud import monitoring_v3
 from google.protobuf.json_format import MessageToJson
 from trainingbar import env
+from trainingbar.config.prereqs import read_cache, write_cache
+from trainingbar.gcp import get_clients
 
 if env['profiler']:
     from tensorflow.python.framework import errors
@@ -21,7 +26,7 @@ def flatten(d, parent_key='', sep='_'):
     items = []
     for k, v in d.items():
         new_key = parent_key + sep + k if parent_key else k
-        if isinstance(v, collections.MutableMapping):
+        if isinstance(v, collections.abc.MutableMapping):
             items.extend(flatten(v, new_key, sep=sep).items())
         else:
             items.append((new_key, v))
@@ -37,6 +42,23 @@ def pb_to_dict(pb):
     """Converts arbitrary protobuf messages into python dicts"""
     return parser.parse(pb_to_json(pb)).as_dict()
 
+
+def raw_pb(msg):
+    """Returns the underlying protobuf message of a proto-plus wrapper"""
+    return getattr(msg, '_pb', msg)
+
+
+def point_time(point):
+    t = point.interval.end_time
+    return t.seconds + t.nanos * 1e-9
+
+
+def point_value(point):
+    kind = point.value.WhichOneof('value')
+    if kind in ('double_value', 'int64_value', 'bool_value'):
+        return getattr(point.value, kind)
+    return None
+
 def utc():
     d = datetime.utcnow()
     return calendar.timegm(d.utctimetuple())
@@ -59,7 +81,13 @@ metrics = {
 }
 
 def gce_series_info(series):
-    h = {k: pb_to_dict(getattr(series, k)) for k in "metric resource metadata".split()}
+    series = raw_pb(series)
+    h = {}
+    for k in ['metric', 'resource']:
+        msg = getattr(series, k)
+        h[k] = {'type': msg.type, 'labels': dict(msg.labels)} if msg.type else {}
+    if series.HasField('metadata'):
+        h['metadata'] = pb_to_dict(series.metadata)
     h = {k: v for k, v in h.items() if len(v) > 0}
     return flatten(h)
 
@@ -130,72 +158,193 @@ def get_time_series_label(ts, **options):
     return labelers[ts.metric.type](ts, **options)
 
 def get_default_project_id():
-    import google.auth
-    _, project_id = google.auth.default()
+    _, project_id = get_clients().credentials()
     return project_id
 
 class TimeSeriesMonitor:
-    def __init__(self, project_id=None, client=None):
+    def __init__(self, project_id=None, client=None, lookback=1200, async_client=None, clock=time.time):
         if project_id is None:
             project_id = get_default_project_id()
         self.project_id = project_id
         if client is None:
-            client = monitoring_v3.MetricServiceClient()
+            client = get_clients().client(project_id)
         self.client = client
+        self.async_client = async_client
+        self.lookback = lookback
+        # Wall clock the query window and point ages are measured against
+        self.clock = clock
+        self.cursors = {}
+        self.latest = {}
+        self.requests = 0
+        self.points = 0
 
     def __call__(self, *args, **kwargs):
         return self.get(*args, **kwargs)
 
-    def get(self, metric="tpu_mxu", node_id=None, interval=None, filters=None, raw=False, when=None, full_names=False):
-        if when is None:
-            when = utc()
+    def get(self, metric="tpu_mxu", node_id=None, interval=None, filters=None, raw=False, when=None, full_names=False, incremental=False):
+        """
+        Returns {series_label: [[seconds_ago, value], ...]} with the newest point first.
+
+        With incremental=True, the query only asks for points newer than the last point
+        seen for this metric/filter, and series without new points return their last
+        known point so callers always get the current value.
+        """
+        request, cursor_key = self._request(metric, node_id, interval, filters, full_names, incremental)
+        results = self.client.list_time_series(request=request)
+        self.requests += 1
+        if raw:
+            return results
+        return self._decode(results, cursor_key, when, full_names, incremental)
+
+    async def aget(self, metric="tpu_mxu", node_id=None, interval=None, filters=None, raw=False, when=None, full_names=False, incremental=False):
+        """Awaitable get() using MetricServiceAsyncClient; other clients run in the default executor."""
+        client = self.async_client
+        if client is None:
+            if not isinstance(self.client, monitoring_v3.MetricServiceClient):
+                import asyncio
+                return await asyncio.get_running_loop().run_in_executor(None, partial(self.get, metric, node_id, interval, filters, raw, when, full_names, incremental))
+            # Looked up on every call rather than kept, since the client is tied to the running loop
+            client = get_clients().client(self.project_id, asynchronous=True)
+        request, cursor_key = self._request(metric, node_id, interval, filters, full_names, incremental)
+        pager = await client.list_time_series(request=request)
+        self.requests += 1
+        results = [ts async for ts in pager]
+        if raw:
+            return results
+        return self._decode(results, cursor_key, when, full_names, incremental)
 
+    def _request(self, metric, node_id=None, interval=None, filters=None, full_names=False, incremental=False):
         if '/' not in metric:
             metric = metrics[metric]
 
+        if filters is None:
+            filters = []
+        filters = filters[:]
+        if node_id is not None:
+            filters += [['resource.labels.node_id', node_id]]
+        filters += [['metric.type', metric]]
+        filters = ' AND '.join(['{} = {}'.format(k, json.dumps(v)) for k, v in filters])
+        cursor_key = (filters, full_names)
+        cursors = self.cursors.get(cursor_key, None) if incremental else None
+
         if interval is None:
-            now = time.time()
+            now = self.clock()
             seconds = int(now)
             nanos = int((now - seconds) * 10 ** 9)
+            start = max(int(min(cursors.values())), seconds - self.lookback) if cursors else (seconds - self.lookback)
             interval = monitoring_v3.TimeInterval(
                 {
                     "end_time": {"seconds": seconds, "nanos": nanos},
-                    "start_time": {"seconds": (seconds - 1200), "nanos": nanos},
+                    "start_time": {"seconds": start, "nanos": 0 if cursors else nanos},
                 }
             )
 
-        if filters is None:
-            filters = []
-        filters = filters[:]
-        if node_id is not None:
-            filters += [['resource.labels.node_id', node_id]]
-        filters += [['metric.type', metric]]
-        filters = ' AND '.join(['{} = {}'.format(k, json.dumps(v)) for k, v in filters])
+        request = {
+            "name": "projects/{project_id}".format(project_id=self.project_id),
+            "filter": filters,
+            "interval": interval,
+            "view": monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
+        }
+        return request, cursor_key
 
-        results = self.client.list_time_series(
-            request={
-                "name": "projects/{project_id}".format(project_id=self.project_id),
-                "filter": filters,
-                "interval": interval,
-                "view": monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
-            }
-        )
-        if raw:
-            return results
+    def _decode(self, results, cursor_key, when=None, full_names=False, incremental=False):
+        if when is None:
+            when = int(self.clock())
+        cursors = self.cursors.get(cursor_key, None) if incremental else None
         points = collections.defaultdict(lambda: [])
         for timeSeries in results:
+            timeSeries = raw_pb(timeSeries)
             key = get_time_series_label(timeSeries, short=not full_names)
-        for point in timeSeries.points:
-            point_utc = point.interval.start_time.timestamp()
-            seconds_ago = int(when - point_utc)
-            if timeSeries.value_type == 2: # what's the correct way to get INT64 here?
-                value = point.value.int64_value
-            else:
-                value = point.value.double_value
-            points[key].append([seconds_ago, value])
-        points = dict(points)
+            last_seen = cursors.get(key, 0.0) if cursors else 0.0
+            for point in timeSeries.points:
+                point_utc = point_time(point)
+                if point_utc <= last_seen:
+                    continue
+                value = point_value(point)
+                if value is None:
+                    continue
+                points[key].append([int(when - point_utc), value, point_utc])
+        self.points += sum(len(p) for p in points.values())
+        if incremental:
+            cursors = self.cursors.setdefault(cursor_key, {})
+            latest = self.latest.setdefault(cursor_key, {})
+            for key, pts in points.items():
+                newest = max(pts, key=lambda x: x[2])
+                cursors[key] = newest[2]
+                latest[key] = newest
+            for key, last in latest.items():
+                if key not in points:
+                    points[key] = [[int(when - last[2]), last[1], last[2]]]
+        points = {key: [[p[0], p[1]] for p in pts] for key, pts in points.items()}
         return points
 
+    def reset(self):
+        self.cursors, self.latest = {}, {}
+
+
+class FakeMetricServiceClient:
+    """
+    Offline stand-in for monitoring_v3.MetricServiceClient that synthesizes one point
+    every `period` seconds per series, honoring the requested interval. Counts requests,
+    points and serialized bytes returned so fetch strategies can be compared.
+    """
+    def __init__(self, num_series=8, period=60, value_fn=None, project_id='fake-project', zone='us-central1-f', node_id='fake-tpu'):
+        self.num_series = num_series
+        self.period = period
+        self.value_fn = value_fn or (lambda metric, series, t: float((t // self.period + series) % 100))
+        self.labels = {'project_id': project_id, 'zone': zone, 'node_id': node_id}
+        self.requests = 0
+        self.points = 0
+        self.bytes = 0
+
+    def list_time_series(self, request):
+        metric = re.search(r'metric\.type = "([^"]+)"', request['filter']).group(1)
+        interval = raw_pb(request['interval'])
+        start = interval.start_time.seconds + interval.start_time.nanos * 1e-9
+        end = interval.end_time.seconds + interval.end_time.nanos * 1e-9
+        ts_end = int(end // self.period) * self.period
+        value_type = 2 if metric.endswith('usage') else 3
+        results = []
+        for series in range(self.num_series):
+            ts = monitoring_v3.TimeSeries()
+            ts.metric.type = metric
+            ts.metric.labels.update({'worker_id': str(series // 8), 'core': str(series % 8)})
+            ts.resource.type = 'tpu_worker'
+            ts.resource.labels.update(self.labels)
+            ts.value_type = value_type
+            t = ts_end
+            points = []
+            while t > start:
+                value = self.value_fn(metric, series, t)
+                v = {'int64_value': int(value)} if value_type == 2 else {'double_value': value}
+                points.append(monitoring_v3.Point({'interval': {'start_time': {'seconds': int(t)}, 'end_time': {'seconds': int(t)}}, 'value': v}))
+                t -= self.period
+            ts.points = points
+            self.points += len(points)
+            self.bytes += raw_pb(ts).ByteSize()
+            results.append(ts)
+        self.requests += 1
+        return results
+
+
+class SimulatedMetricServiceClient(FakeMetricServiceClient):
+    """
+    FakeMetricServiceClient whose points replay a simulation Trace: a point at wall time t
+    carries the trace value at clock(t) for the series' device. Points are spaced by the
+    trace period divided by the clock speed, but never closer than Cloud Monitoring's 1s.
+    """
+    _fields = {metrics['tpu_core_mxu']: 'mxu_util', metrics['tpu_container_mem']: 'mem_used', metrics['tpu_host_mem']: 'mem_used'}
+
+    def __init__(self, trace, clock, num_series=None, **kwargs):
+        self.trace, self.clock = trace, clock
+        super().__init__(num_series=num_series or trace.devices, period=max(1.0, trace.period / clock.speed), value_fn=self._value, **kwargs)
+
+    def _value(self, metric, series, t):
+        field = self._fields.get(metric, 'mxu_util')
+        if field not in self.trace.values:
+            return 0.0
+        return self.trace.value(self.clock(t), field, series)
+
 
 def get_workers_list(cluster_resolver):
     worker_job_name = 'worker'
@@ -212,12 +361,27 @@ def get_workers_list(cluster_resolver):
     return ','.join(workers_list)
 
 
-def tpu_workers_list(config):
-    from tensorflow.python.distribute.cluster_resolver import tpu_cluster_resolver as resolver
+_tpu_zones = ['europe-west4-a', 'us-central1-f', 'us-central1-a', 'us-central1-b', 'us-central1-c', 'asia-east1-c']
+_tpu_cache_ttl = 3600
+_resolvers = {}
+
+def cache_name(kind, *keys):
+    return f'{kind}-' + '-'.join(re.sub(r'[^A-Za-z0-9_.-]', '_', str(k)) for k in keys) + '.json'
+
+
+def tpu_workers_list(config, resolver_cls=None, ttl=_tpu_cache_ttl):
     worker_job_name = 'worker'
     tpu_name = config.get('tpu_name', None) or os.environ.get('TPU_NAME', None)
-    cluster_resolver = resolver.TPUClusterResolver(tpu_name)
-    cluster_spec = cluster_resolver.cluster_spec()
+    name = cache_name('tpu-workers', config.get('project', None), tpu_name)
+    workers = read_cache(name, ttl) if ttl else None
+    if workers:
+        return workers
+    if resolver_cls is None:
+        from tensorflow.python.distribute.cluster_resolver import tpu_cluster_resolver as resolver
+        resolver_cls = resolver.TPUClusterResolver
+    if tpu_name not in _resolvers:
+        _resolvers[tpu_name] = resolver_cls(tpu_name)
+    cluster_spec = _resolvers[tpu_name].cluster_spec()
     if not cluster_spec:
         return None
     task_indices = cluster_spec.task_indices(worker_job_name)
@@ -225,7 +389,9 @@ def tpu_workers_list(config):
         cluster_spec.task_address(worker_job_name, i).replace(':8470', ':8466')
         for i in task_indices
     ]
-    return ','.join(workers_list)
+    workers = ','.join(workers_list)
+    write_cache(name, workers)
+    return workers
 
 
 def parse_tpu_data(tpu):
@@ -239,22 +405,46 @@ def parse_tpu_data(tpu):
     }
     return tpu_config
 
-def tpunicorn_query(project, tpuname):
-    config = {'project': project, 'tpu_name': tpuname}
-    if not env['colab']:
-        import tpunicorn
-        tpu_data = None
-        for zone in ['europe-west4-a', 'us-central1-f', 'us-central1-a', 'us-central1-b', 'us-central1-c', 'asia-east1-c']:
+def query_zones(tpu_api, project, zones, tpu_name=None, timeout=30):
+    """
+    Lists TPUs in every zone concurrently. Returns as soon as a zone reports `tpu_name`,
+    otherwise everything found within `timeout` seconds.
+    """
+    found = []
+    pool = ThreadPoolExecutor(max_workers=len(zones), thread_name_prefix='tbar-zones')
+    futures = {pool.submit(tpu_api.get_tpus, zone=zone, project=project): zone for zone in zones}
+    try:
+        for future in as_completed(futures, timeout=timeout):
             try:
-                tpu_data = tpunicorn.tpu.get_tpus(zone=zone, project=project)
-                if tpu_data:
-                    break
-
-            except:
+                tpus = future.result() or []
+            except Exception:
                 continue
-        
-        selected_tpu = None
+            if tpu_name:
+                match = [tpu for tpu in tpus if tpu['name'].split('/')[-1] == tpu_name]
+                if match:
+                    return match
+            found.extend(tpus)
+    except FuturesTimeout:
+        pass
+    finally:
+        pool.shutdown(wait=False)
+    return found
+
+
+def tpunicorn_query(project, tpuname, zones=None, timeout=30, ttl=_tpu_cache_ttl, tpu_api=None):
+    config = {'project': project, 'tpu_name': tpuname}
+    if not env['colab']:
         tpu_name = tpuname or os.environ.get('TPU_NAME', None)
+        name = cache_name('tpu', project, tpu_name)
+        cached = read_cache(name, ttl) if (ttl and tpu_name) else None
+        if cached:
+            config.update(cached)
+            return config
+        if tpu_api is None:
+            import tpunicorn
+            tpu_api = tpunicorn.tpu
+        tpu_data = query_zones(tpu_api, project, zones or _tpu_zones, tpu_name=tpu_name, timeout=timeout)
+        selected_tpu = None
         if not tpu_data:
             print('Failed to find a TPU - Ensure you have the correct GOOGLE_APPLICATION_CREDENTIALS set for your project')
             sys.exit()
@@ -272,12 +462,13 @@ def tpunicorn_query(project, tpuname):
             
         else:
             selected_tpu = tpu_data[0]
-            if tpuname and selected_tpu['name'] != tpuname:
-                _name = selected_tpu["name"].split('/')[-1]
+            _name = selected_tpu["name"].split('/')[-1]
+            if tpuname and _name != tpuname:
                 print(f'TPU {tpuname} was not found. Setting TPU Monitoring to {_name}')
 
         tpu_config = parse_tpu_data(selected_tpu)
         config.update(tpu_config)
+        write_cache(cache_name('tpu', project, tpu_config['tpu_name']), tpu_config)
         
     else:
         config['master'] = os.environ['TPU_NAME']
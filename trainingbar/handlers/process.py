@@ -0,0 +1,129 @@
+import os
+import time
+from threading import Lock
+import psutil
+
+
+class ProcessMonitor:
+    """
+    Resource usage of a process and all of its descendants.
+
+    psutil.Process objects are kept across samples, since cpu_percent() is measured
+    against the previous call on the same object, and each one is read inside
+    oneshot() so the /proc files behind a sample are opened once. Descendants are
+    re-listed every sample; I/O rates are summed from per-process deltas so a child
+    exiting doesn't show up as negative throughput.
+
+    `gpu` is an optional callable returning {gpu_id: {pid: vram_used_mb}} for the
+    processes the GPU backend can see, or None when it can't attribute memory.
+    """
+    def __init__(self, pid=None, delay=10, children=True, gpu=None):
+        self.pid = pid or os.getpid()
+        self.delay = delay
+        self.children = children
+        self.gpu = gpu
+        self.stopped = False
+        self.last_sample = None
+        self.cpu_count = psutil.cpu_count() or 1
+        self._lock = Lock()
+        self._setup()
+
+    def update(self, ts=None):
+        if not self.stopped:
+            self._getdata(ts)
+        return self.stats()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.sys)
+
+    def stop(self):
+        self.stopped = True
+
+    def _tree(self):
+        try:
+            found = [self.root] + (self.root.children(recursive=True) if self.children else [])
+        except psutil.NoSuchProcess:
+            return None
+        procs = {}
+        for proc in found:
+            cached = self.procs.get(proc.pid, None)
+            # Process equality includes the creation time, so a reused pid gets a fresh object
+            procs[proc.pid] = cached if cached is not None and cached == proc else proc
+        self.procs = procs
+        return procs
+
+    def _read(self, proc):
+        with proc.oneshot():
+            data = {'cpu': proc.cpu_percent(), 'threads': proc.num_threads()}
+            try:
+                mem = proc.memory_full_info()
+                data['rss'], data['uss'] = mem.rss, mem.uss
+            except psutil.AccessDenied:
+                data['rss'], data['uss'] = proc.memory_info().rss, None
+            try:
+                data['fds'] = proc.num_fds() if hasattr(proc, 'num_fds') else proc.num_handles()
+            except psutil.AccessDenied:
+                data['fds'] = None
+            try:
+                io = proc.io_counters()
+                data['io'] = (io.read_bytes, io.write_bytes)
+            except (psutil.AccessDenied, AttributeError, NotImplementedError):
+                data['io'] = None
+        return data
+
+    def _getdata(self, ts=None):
+        procs = self._tree()
+        if procs is None:
+            self.stop()
+            return
+        now = time.monotonic()
+        cpu, rss, threads = 0.0, 0, 0
+        uss = fds = None
+        read = write = count = 0
+        io = {}
+        for pid, proc in procs.items():
+            try:
+                p = self._read(proc)
+            except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+                # Exited, or a child running as another user (e.g. a setuid helper): skip it this sample
+                continue
+            count += 1
+            cpu += p['cpu']
+            rss += p['rss']
+            threads += p['threads']
+            if p['uss'] is not None:
+                uss = (uss or 0) + p['uss']
+            if p['fds'] is not None:
+                fds = (fds or 0) + p['fds']
+            if p['io'] is not None:
+                io[pid] = p['io']
+                prev = self._io.get(pid, None)
+                if prev is not None:
+                    read += max(0, p['io'][0] - prev[0])
+                    write += max(0, p['io'][1] - prev[1])
+        data = {'proc_count': count, 'proc_cpu': cpu, 'proc_cpu_util': cpu / self.cpu_count,
+            'proc_rss': rss, 'proc_threads': threads}
+        if uss is not None:
+            data['proc_uss'] = uss
+        if fds is not None:
+            data['proc_fds'] = fds
+        if self._io_t is not None and now > self._io_t:
+            data['proc_read_bps'] = read / (now - self._io_t)
+            data['proc_write_bps'] = write / (now - self._io_t)
+        self._io, self._io_t = io, now
+        gpu = self.gpu() if self.gpu else None
+        if gpu is not None:
+            used = {gpu_id: sum(mb for pid, mb in pids.items() if pid in procs) for gpu_id, pids in gpu.items()}
+            data['proc_gpu'] = used
+            data['proc_vram_used'] = sum(used.values())
+        with self._lock:
+            self.sys = data
+            self.last_sample = ts or time.time()
+
+    def _setup(self):
+        self.sys = {}
+        self.root = psutil.Process(self.pid)
+        self.name = self.root.name()
+        self.procs = {}
+        self._io, self._io_t = {}, None
@@ -1,9 +1,9 @@
 import sys
 import time
-from threading import Thread, Lock
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait
 from trainingbar.handlers.network import TimeSeriesMonitor, tpu_workers_list, tpunicorn_query
 from trainingbar.utils import FormatSize, _timer_formats
-from tensorflow.python.profiler import profiler_client
 import os
 import re
 
@@ -22,12 +22,20 @@ _mesh_memory = {
     'v3-512': 8e+12
 }
 
+_tpu_metrics = ['tpu_core_mxu', 'tpu_container_mem']
+# Metrics summed across series (per-worker memory); everything else is averaged across cores
+_summed_metrics = ['tpu_container_mem', 'tpu_host_mem']
+
 def check_tpu(params):
     _tpu = False
     p = {'tpu_name': None, 'project': None}
     p.update(params)
     try:
-        tpu_config = tpunicorn_query(project=p['project'], tpuname=p['tpu_name'])
+        if p.get('tpu_backend', None) == 'sim':
+            from trainingbar.simulation import simulated_tpu_config
+            tpu_config = simulated_tpu_config(p)
+        else:
+            tpu_config = tpunicorn_query(project=p['project'], tpuname=p['tpu_name'], zones=p.get('tpu_zones', None), ttl=p.get('tpu_cache_ttl', 3600))
         if tpu_config:
             tpu_config['tpu_memory'] = _mesh_memory[tpu_config['mesh']]
             p.update(tpu_config)
@@ -39,46 +47,98 @@ def check_tpu(params):
     return p, _tpu
 
 class TPUMonitor:
-    def __init__(self, client, delay=10, background=True):
+    def __init__(self, client, delay=10, background=True, monitor=None, deadline=None):
         self.stopped = False
         self.client = client
+        self.monitor = monitor
         self.delay = delay
+        self.fixed_deadline = deadline
         self.run_bg = background
         self.time = time.time()
+        self.last_sample = None
         self._lock = Lock()
         self._setup()
         if not self.num_workers:
             self.stop()
-        elif self.run_bg:
-            _bg = Thread(target=self.background, daemon=True)
-            _bg.start()
-
-    def background(self):
-        while not self.stopped:
-            with self._lock:
-                self._getdata()
-                if self.check_pulse:
-                    self.pulse(tpu_stats=self.tpu_data)
-                time.sleep(self.delay)
-    
-    def update(self):
+
+    def update(self, ts=None):
         if not self.stopped:
-            self._getdata()
-        return self.tpu_data
+            self._getdata(ts)
+        return self.stats()
     
+    async def aupdate(self, ts=None):
+        if not self.stopped:
+            import asyncio
+            fresh = self._harvest()
+            for metric in self.tpu_metrics:
+                if metric not in self.inflight and metric not in fresh:
+                    self.inflight[metric] = asyncio.ensure_future(self._afetch(metric))
+            if self.inflight:
+                await asyncio.wait(list(self.inflight.values()), timeout=self.deadline)
+            fresh += self._harvest()
+            self._publish([m for m in self.tpu_metrics if m not in fresh], ts)
+        return self.stats()
+
     def stats(self):
-        return self.tpu_data
+        with self._lock:
+            return dict(self.tpu_data)
 
     def stop(self):
         self.stopped = True
+        if self.pool:
+            self.pool.shutdown(wait=False)
+
+    @property
+    def deadline(self):
+        # Read every tick, so it follows the interval when adaptive sampling changes `delay`
+        return self.fixed_deadline or max(1.0, self.delay * 0.8)
     
-    def _getdata(self):
-        mxu = self.monitor('tpu_core_mxu')
-        for x, lst in mxu.items():
-            curr_mxu = lst[0][-1]
-        mem = self.monitor('tpu_container_mem')
-        for x, lst in mem.items():
-            curr_mem = lst[0][-1]
+    def _fetch(self, metric):
+        return self._reduce(metric, self.monitor(metric, incremental=True))
+
+    async def _afetch(self, metric):
+        return self._reduce(metric, await self.monitor.aget(metric, incremental=True))
+
+    def _reduce(self, metric, points):
+        values = [lst[0][-1] for lst in points.values() if lst]
+        if not values:
+            return None
+        if metric in _summed_metrics:
+            return sum(values)
+        return sum(values) / len(values)
+
+    def _harvest(self):
+        fresh = []
+        for metric, future in list(self.inflight.items()):
+            if not future.done():
+                continue
+            _ = self.inflight.pop(metric)
+            if future.cancelled():
+                continue
+            if future.exception() is not None:
+                self.errors[metric] = str(future.exception())
+            elif future.result() is not None:
+                self.values[metric] = future.result()
+                fresh.append(metric)
+        return fresh
+
+    def _collect(self):
+        # Query every metric concurrently; metrics that miss the tick deadline keep their
+        # previous value and are reported in 'stale' until their request completes.
+        fresh = self._harvest()
+        for metric in self.tpu_metrics:
+            if metric not in self.inflight and metric not in fresh:
+                self.inflight[metric] = self.pool.submit(self._fetch, metric)
+        wait(list(self.inflight.values()), timeout=self.deadline)
+        fresh += self._harvest()
+        return [m for m in self.tpu_metrics if m not in fresh]
+
+    def _getdata(self, ts=None):
+        self._publish(self._collect(), ts)
+
+    def _publish(self, stale, ts=None):
+        curr_mxu = self.values.get('tpu_core_mxu', 0.0)
+        curr_mem = self.values.get('tpu_container_mem', 0.0)
         mem_used, mem_str = FormatSize(curr_mem)
         if self.tpu_max_mem <= curr_mem:
             self.tpu_max_mem = curr_mem + 1e+9
@@ -90,58 +150,48 @@ class TPUMonitor:
             'tpu_mem_used': curr_mem,
             'tpu_mem_total': self.tpu_max_mem,
             'tpu_mem_str': f'{mem_str}/{total_mem_str}',
+            'stale': stale,
         }
-        self.tpu_data.update(stats)
+        for metric in self.tpu_metrics:
+            if metric not in _tpu_metrics and metric in self.values:
+                stats[metric] = self.values[metric]
+        with self._lock:
+            self.tpu_data.update(stats)
+            self.last_sample = ts or time.time()
 
     def _setup(self):
         client_config = self.client(config=True)
         self.tpu_config = client_config['xla']
-        self.monitor = None
+        self.tpu_metrics = _tpu_metrics + [m for m in self.tpu_config.get('tpu_metrics', []) if m not in _tpu_metrics]
+        self.values, self.errors, self.inflight = {}, {}, {}
+        self.pool = None
+        if self.fixed_deadline is None:
+            self.fixed_deadline = self.tpu_config.get('tpu_deadline', None)
         self.tpu_data = {}
         self.num_workers = 0
-        self.check_pulse = False
+        simulated = self.tpu_config.get('tpu_backend', None) == 'sim'
         if self.tpu_config.get('tpu_name', None):
-            self.monitor = TimeSeriesMonitor(project_id=self.tpu_config['project'])
+            if self.monitor is None and simulated:
+                from trainingbar.simulation import load_trace
+                from trainingbar.handlers.network import SimulatedMetricServiceClient
+                cores = int(self.tpu_config['mesh'].split('-')[-1])
+                trace, clock = load_trace(dict(self.tpu_config, sim_devices=self.tpu_config.get('sim_devices', cores)), 'tpu', mem_total=self.tpu_config['tpu_memory'] / cores)
+                self.monitor = TimeSeriesMonitor(project_id=self.tpu_config['project'], client=SimulatedMetricServiceClient(trace, clock, num_series=cores), lookback=max(10, int(self.delay * 2)))
+            elif self.monitor is None:
+                self.monitor = TimeSeriesMonitor(project_id=self.tpu_config['project'])
+            self.pool = ThreadPoolExecutor(max_workers=len(self.tpu_metrics), thread_name_prefix='tbar-tpu')
             self.tpu_max_mem = self.tpu_config['tpu_memory']
+            if simulated:
+                self.tpu_config['workers'] = []
+                self.num_workers = max(1, int(self.tpu_config['mesh'].split('-')[-1]) // 8)
+                return
             try:
-                self.tpu_config['workers'] = tpu_workers_list(self.tpu_config)
-                self.num_workers = len(self.tpu_config['workers'])
+                self.tpu_config['workers'] = tpu_workers_list(self.tpu_config, ttl=self.tpu_config.get('tpu_cache_ttl', 3600))
+                self.num_workers = len(self.tpu_config['workers'].split(','))
             except:
                 self.tpu_config['workers'] = []
                 self.num_workers = int(self.tpu_config['mesh'].split('-')[-1])
     
-    def create_timeout_hook(self, hook, min_mxu=10.00, num_timeouts=50):
-        self.timeout_hook = {'idx': 0, 'num_timeouts': num_timeouts, 'hook': hook, 'min_mxu': float(min_mxu), 'pulse': 0.00, 'warnings': 0}
-        self.tpu_pulse = False
-        self.check_pulse = True
-        self.log = self.client(ops='logger')
-        self.log(f'Created timeout hook. Will invoke after {float(num_timeouts) * self.delay} secs if TPU falls below {min_mxu} after the first TPU Pulse.')
-
-    def pulse(self, tpu_stats=None):
-        if tpu_stats:
-            self.timeout_hook['pulse'] = tpu_stats.get('tpu_mxu_util', self.timeout_hook['pulse'])
-            if not self.tpu_pulse:
-                if tpu_stats.get('tpu_mxu_util', 0.00) > 5.00 and self.get_time(fmt='mins') > 5.00:
-                    self.tpu_pulse = True
-            else:
-                if self.timeout_hook['pulse'] < self.timeout_hook['min_mxu']:
-                    self.timeout_hook['idx'] += 1
-                    self.timeout_hook['warnings'] += 1
-                    if self.timeout_hook['warnings'] % self.timeout_hook['num_timeouts'] == 0:
-                        msg = f"TrainingBar has detected {self.timeout_hook['warnings']} periods of under {self.timeout_hook['min_mxu']:.2f}%. Last TPU MXU Pulse: {self.timeout_hook['pulse']:.2f}%. Time Alive: {self.get_time(fmt='hrs'):.2f} hrs"
-                        self.log(msg)
-                        self.timeout_hook['hook'](msg)
-                else:
-                    self.timeout_hook['warnings'] = 0
-        else:
-            if self.tpu_pulse:
-                self.timeout_hook['warnings'] += 1
-                if self.timeout_hook['warnings'] % self.timeout_hook['num_timeouts'] == 0:
-                    msg = f"Potential TPU Runtime Error: TrainingBar has detected {self.timeout_hook['warnings']} periods of under {self.timeout_hook['min_mxu']:.2f}%. Last TPU MXU Pulse: {self.timeout_hook['pulse']:.2f}%. Time Alive: {self.get_time(fmt='hrs'):.2f} hrs"
-                    self.log(msg)
-                    self.timeout_hook['hook'](msg)
-
-
     def get_time(self, fmt='mins'):
         _stoptime = time.time()
         total_time = _stoptime - self.time
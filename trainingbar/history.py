@@ -0,0 +1,225 @@
+import time
+from array import array
+from collections.abc import Mapping
+from threading import Lock
+
+# Rows a ring starts with; it doubles up to its capacity as samples arrive
+_initial_rows = 64
+
+_resolutions = {
+    'raw': {'secs': 0, 'capacity': 3600},
+    '1min': {'secs': 60, 'capacity': 1440},
+    '10min': {'secs': 600, 'capacity': 4032},
+}
+
+
+# Fixed capacities reported next to every sample; counters like steps_total are kept
+_static = frozenset(['idx', 'ram_total', 'swap_total', 'disk_total', 'vram_total', 'tpu_mem_total'])
+
+
+def flatten_metrics(data, prefix=''):
+    """Yields (name, value) for every numeric sample in a collector's stats dict."""
+    for k, v in data.items():
+        if isinstance(v, Mapping):
+            yield from flatten_metrics(v, prefix=f'{prefix}{k}.')
+        elif k in _static:
+            continue
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            yield f'{prefix}{k}', v
+
+
+class RingBuffer:
+    """
+    Bounded ring of float columns stored in contiguous arrays.
+
+    Storage starts small and doubles until it reaches capacity, so the thousands of
+    per-device series on a large host only hold what they've recorded. It only wraps
+    once it is full size, so growing never has to reorder rows.
+    """
+    def __init__(self, capacity, columns=('ts', 'value')):
+        self.capacity = int(capacity)
+        self.columns = columns
+        self.allocated = min(self.capacity, _initial_rows)
+        self.data = {c: array('d', bytes(8 * self.allocated)) for c in columns}
+        self.idx = 0
+        self.size = 0
+
+    def _grow(self):
+        extra = min(self.allocated, self.capacity - self.allocated)
+        # New arrays rather than resizing in place, which fails while a view() is exported
+        for c in self.columns:
+            self.data[c] = self.data[c] + array('d', bytes(8 * extra))
+        self.allocated += extra
+        self.idx = self.size
+
+    def append(self, *values):
+        if self.size == self.allocated and self.allocated < self.capacity:
+            self._grow()
+        i = self.idx
+        for c, v in zip(self.columns, values):
+            self.data[c][i] = v
+        self.idx = (i + 1) % self.allocated
+        if self.size < self.capacity:
+            self.size += 1
+
+    def last(self, column='value'):
+        if not self.size:
+            return None
+        return self.data[column][self.idx - 1]
+
+    def first(self, column='value'):
+        if not self.size:
+            return None
+        return self.data[column][(self.idx - self.size) % self.allocated]
+
+    def _segments(self, start=0):
+        # Returns up to two (lo, hi) physical index ranges covering logical rows [start, size)
+        first = (self.idx - self.size) % self.allocated
+        lo = (first + start) % self.allocated
+        count = self.size - start
+        if count <= 0:
+            return []
+        if lo + count <= self.allocated:
+            return [(lo, lo + count)]
+        return [(lo, self.allocated), (0, count - (self.allocated - lo))]
+
+    def _search(self, since):
+        # Binary search over logical rows for the first ts >= since; ts is nondecreasing
+        ts, first = self.data[self.columns[0]], (self.idx - self.size) % self.allocated
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ts[(first + mid) % self.allocated] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def view(self, column, since=None):
+        """
+        Returns the column for rows with ts >= since. When the rows are contiguous in
+        memory this is a zero-copy view (numpy array or memoryview); rows that wrap
+        around the end of the buffer are joined into a copy.
+        """
+        segments = self._segments(self._search(since) if since is not None else 0)
+        buf = self.data[column]
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is not None:
+            arr = np.frombuffer(buf, dtype=np.float64)
+            if not segments:
+                return arr[:0]
+            if len(segments) == 1:
+                return arr[segments[0][0]:segments[0][1]]
+            return np.concatenate([arr[lo:hi] for lo, hi in segments])
+        mv = memoryview(buf)
+        if not segments:
+            return mv[:0]
+        if len(segments) == 1:
+            return mv[segments[0][0]:segments[0][1]]
+        return memoryview(array('d', b''.join(mv[lo:hi].tobytes() for lo, hi in segments)))
+
+    def __len__(self):
+        return self.size
+
+
+class MetricSeries:
+    """Raw samples plus min/mean/max rollups for each coarser resolution."""
+    def __init__(self, resolutions=None):
+        self.resolutions = resolutions or _resolutions
+        self.rings = {}
+        self.buckets = {}
+        for name, res in self.resolutions.items():
+            if res['secs']:
+                self.rings[name] = RingBuffer(res['capacity'], ('ts', 'value', 'min', 'max'))
+                self.buckets[name] = None
+            else:
+                self.rings[name] = RingBuffer(res['capacity'])
+        self.last_ts = float('-inf')
+
+    def append(self, ts, value):
+        ts = max(ts, self.last_ts)
+        self.last_ts = ts
+        for name, ring in self.rings.items():
+            secs = self.resolutions[name]['secs']
+            if not secs:
+                ring.append(ts, value)
+                continue
+            bucket_start = ts - (ts % secs)
+            bucket = self.buckets[name]
+            if bucket is None or bucket[0] != bucket_start:
+                if bucket is not None:
+                    ring.append(bucket[0], bucket[1] / bucket[2], bucket[3], bucket[4])
+                self.buckets[name] = [bucket_start, value, 1, value, value]
+            else:
+                bucket[1] += value
+                bucket[2] += 1
+                if value < bucket[3]:
+                    bucket[3] = value
+                if value > bucket[4]:
+                    bucket[4] = value
+
+    def pick(self, window):
+        # Finest resolution that still retains the whole requested window
+        names = list(self.resolutions)
+        if window is None:
+            return names[0]
+        for name in names:
+            ring = self.rings[name]
+            if ring.size < ring.capacity or ring.first('ts') <= self.last_ts - window:
+                return name
+        return names[-1]
+
+    def last(self):
+        return self.rings[list(self.resolutions)[0]].last()
+
+
+class MetricHistory:
+    """
+    Bounded per-metric history shared by every collector.
+
+    Each metric keeps raw samples plus 1-min and 10-min rollups in bounded ring
+    buffers, so memory stops growing once they fill, no matter how long the run is.
+    """
+    def __init__(self, resolutions=None):
+        self.resolutions = resolutions or _resolutions
+        self.series = {}
+        self._lock = Lock()
+
+    def append(self, metric, value, ts=None):
+        ts = ts or time.time()
+        series = self.series.get(metric, None)
+        if series is None:
+            with self._lock:
+                series = self.series.setdefault(metric, MetricSeries(self.resolutions))
+        series.append(ts, float(value))
+
+    def record(self, data, ts=None, prefix=''):
+        ts = ts or time.time()
+        for metric, value in flatten_metrics(data, prefix):
+            self.append(metric, value, ts)
+
+    def get(self, metric, window=None, resolution='auto', column='value'):
+        series = self.series.get(metric, None)
+        if series is None:
+            raise KeyError(f'No history for metric {metric}. Available: {", ".join(self.metrics())}')
+        if resolution == 'auto':
+            resolution = series.pick(window)
+        ring = series.rings[resolution]
+        since = (series.last_ts - window) if window else None
+        return ring.view('ts', since), ring.view(column, since)
+
+    def last(self, metric):
+        series = self.series.get(metric, None)
+        return series.last() if series else None
+
+    def metrics(self):
+        return sorted(self.series.keys())
+
+    def __contains__(self, metric):
+        return metric in self.series
+
+    def __len__(self):
+        return len(self.series)
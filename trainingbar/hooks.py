@@ -0,0 +1,163 @@
+import time
+from collections import deque
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from trainingbar.logger import get_logger
+
+logger = get_logger()
+
+_policies = ['drop_oldest', 'drop_newest', 'coalesce']
+
+
+class FrozenDict(dict):
+    """
+    A dict that refuses changes. Hooks share one snapshot, so it can't be mutated, but
+    it is still a dict: json.dumps, dict(...) and isinstance(msg, dict) all work.
+    """
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Hook messages are read-only; use trainingbar.hooks.thaw() for a mutable copy')
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def freeze(obj):
+    """Returns a read-only copy of nested dicts/lists so hooks can't race with later updates."""
+    if isinstance(obj, dict):
+        return FrozenDict({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj):
+    """Mutable deep copy of a frozen hook message."""
+    if isinstance(obj, dict):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(v) for v in obj]
+    return obj
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class Hook:
+    def __init__(self, name, func, freq=10, queue_size=8, policy='drop_oldest'):
+        assert policy in _policies, f'Hook policy must be one of {_policies}'
+        self.name = name
+        self.func = func
+        self.freq = freq
+        self.policy = policy
+        self.queue = deque(maxlen=None if policy == 'drop_newest' else (1 if policy == 'coalesce' else queue_size))
+        self.queue_size = 1 if policy == 'coalesce' else queue_size
+        self.running = False
+        self.calls = 0
+        self.drops = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=1024)
+
+    def stats(self):
+        latencies = list(self.latencies)
+        p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+        return {'calls': self.calls, 'drops': self.drops, 'errors': self.errors, 'queued': len(self.queue),
+            'p50_ms': p50 * 1000 if p50 is not None else None,
+            'p99_ms': p99 * 1000 if p99 is not None else None}
+
+
+class HookDispatcher:
+    """
+    Runs hooks on a worker pool so slow hooks never block sampling or rendering.
+
+    Each hook has a bounded queue and runs at most one call at a time. When a hook
+    falls behind, its policy decides what is lost: 'drop_oldest' (default) keeps the
+    newest `queue_size` messages, 'drop_newest' rejects new ones, and 'coalesce'
+    only keeps the latest message.
+    """
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.hooks = {}
+        self._lock = Lock()
+        self._pool = None
+        self._stopped = False
+
+    def add(self, name, func, freq=10, queue_size=8, policy='drop_oldest'):
+        hook = Hook(name, func, freq, queue_size, policy)
+        with self._lock:
+            self.hooks[name] = hook
+        return hook
+
+    def remove(self, name):
+        with self._lock:
+            return self.hooks.pop(name, None)
+
+    def dispatch(self, message, idx=0, force=False, *args, **kwargs):
+        """Queues `message` for every hook due at update `idx`."""
+        with self._lock:
+            due = [name for name, hook in self.hooks.items() if force or (hook.freq and idx % hook.freq == 0)]
+        if due:
+            snapshot = freeze(message)
+            for name in due:
+                self.fire(name, snapshot, *args, **kwargs)
+
+    def fire(self, name, message, *args, **kwargs):
+        with self._lock:
+            hook = self.hooks.get(name, None)
+            if hook is None or self._stopped:
+                return False
+            if hook.policy == 'drop_newest' and len(hook.queue) >= hook.queue_size:
+                hook.drops += 1
+                return False
+            if len(hook.queue) == hook.queue.maxlen:
+                hook.drops += 1
+            hook.queue.append((message, args, kwargs))
+            if hook.running:
+                return True
+            hook.running = True
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='tbar-hooks')
+            self._pool.submit(self._drain, hook)
+        return True
+
+    def _drain(self, hook):
+        while True:
+            with self._lock:
+                if not hook.queue:
+                    hook.running = False
+                    return
+                message, args, kwargs = hook.queue.popleft()
+            start = time.perf_counter()
+            try:
+                hook.func(message, *args, **kwargs)
+            except Exception as e:
+                hook.errors += 1
+                logger.error(f'Hook {hook.name} failed: {e}')
+            finally:
+                hook.calls += 1
+                hook.latencies.append(time.perf_counter() - start)
+
+    def stats(self):
+        with self._lock:
+            hooks = list(self.hooks.items())
+        return {name: hook.stats() for name, hook in hooks}
+
+    def stop(self, wait=False):
+        # Once stopped, fire() drops messages instead of starting a new pool
+        with self._lock:
+            self._stopped = True
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=wait)
+
+    def __contains__(self, name):
+        return name in self.hooks
+
+    def __len__(self):
+        return len(self.hooks)
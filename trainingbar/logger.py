@@ -5,18 +5,57 @@ import os
 import sys
 import logging
 from typing import Optional
-from rich.console import Console
-from rich.logging import RichHandler
-#from rich.text import Text
 
 _lock = threading.Lock()
 _tbar_handler: Optional[logging.Handler] = None
+_console = None
+_headless = os.environ.get('TBAR_HEADLESS', '').strip().lower() in ('1', 'true', 'yes')
 
-console = Console(file=sys.stdout)
 fmt = "[%(name)s] %(funcName)-5s %(message)s"
-logging.basicConfig(
-    level="INFO", format=fmt, datefmt="[%X]", handlers=[RichHandler(console=console, show_level=True, show_path=True)]
-)
+
+
+def get_console():
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console(file=sys.stdout)
+    return _console
+
+
+def set_headless(headless=True):
+    global _headless
+    _headless = headless
+
+
+class TBarHandler(logging.Handler):
+    """Root handler that only imports rich when the first record is emitted outside headless mode."""
+    def __init__(self):
+        super().__init__()
+        self.handler = None
+
+    def get_handler(self):
+        if self.handler is None:
+            if _headless:
+                self.handler = logging.StreamHandler(sys.stderr)
+                self.handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s " + fmt, datefmt="[%X]"))
+            else:
+                from rich.logging import RichHandler
+                self.handler = RichHandler(console=get_console(), show_level=True, show_path=True)
+                self.handler.setFormatter(logging.Formatter(fmt, datefmt="[%X]"))
+        return self.handler
+
+    def emit(self, record):
+        self.get_handler().handle(record)
+
+
+logging.basicConfig(level="INFO", handlers=[TBarHandler()])
+
+
+def __getattr__(name):
+    if name == 'console':
+        return get_console()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class TBarLogger:
     def __init__(self, config):
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import mmap
+import struct
+from threading import Lock
+from trainingbar.history import flatten_metrics
+from trainingbar.logger import get_logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = get_logger()
+
+_magic = b'TBARLOG1'
+_version = 1
+# magic, version, record size, header size, index every, index offset, data offset, capacity, base time
+_header = struct.Struct('<8sHHIIQQQd')
+_count = struct.Struct('<Q')
+_schema_len = struct.Struct('<I')
+_count_offset = 64
+_schema_offset = 128
+_header_size = 64 * 1024
+# Milliseconds since base time, metric id, value
+_record = struct.Struct('<IHf')
+_max_ms = 2 ** 32 - 1
+# First record number of the block, its time in ms
+_index = struct.Struct('<QI')
+
+record_dtype = [('t', '<u4'), ('id', '<u2'), ('value', '<f4')]
+index_dtype = [('record', '<u8'), ('t', '<u4')]
+
+
+class MetricRecorder:
+    """
+    Append-only binary log of every sample, for long runs.
+
+    The file is preallocated and memory-mapped: a 64KB header (layout, record count
+    and the metric name schema as JSON), an index with one (record, time) entry every
+    `index_every` records, then fixed 10-byte records of (ms since start, metric id,
+    float32 value). Appending packs straight into the map, and the record count in the
+    header is only advanced after a record is written, so readers can open the file
+    while it grows. The default capacity of 4M records is ~40MB, a week of 1s samples
+    for 7 metrics; ms offsets cover up to 49 days.
+    """
+    def __init__(self, path, capacity=4 * 1024 * 1024, index_every=4096, flush_secs=10):
+        self.path = path
+        self.capacity = int(capacity)
+        self.index_every = int(index_every)
+        self.flush_secs = flush_secs
+        self.index_offset = _header_size
+        self.data_offset = self.index_offset + _index.size * (self.capacity // self.index_every + 1)
+        self.size = self.data_offset + self.capacity * _record.size
+        self.ids = {}
+        self.names = []
+        self.count = 0
+        self.full = False
+        self.stopped = False
+        self._last_t = 0
+        self._lock = Lock()
+        self._last_flush = time.monotonic()
+        self.base_time = time.time()
+        self._open()
+
+    def _open(self):
+        path_dir = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(path_dir, exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.posix_fallocate(self.fd, 0, self.size)
+        except (AttributeError, OSError):
+            os.ftruncate(self.fd, self.size)
+        self.mm = mmap.mmap(self.fd, self.size)
+        _header.pack_into(self.mm, 0, _magic, _version, _record.size, _header_size, self.index_every, self.index_offset, self.data_offset, self.capacity, self.base_time)
+        _count.pack_into(self.mm, _count_offset, 0)
+        self._write_schema()
+
+    def _write_schema(self):
+        schema = json.dumps(self.names).encode('utf8')
+        if _schema_offset + _schema_len.size + len(schema) > _header_size:
+            raise ValueError(f'Metric schema exceeds {_header_size} bytes')
+        self.mm[_schema_offset + _schema_len.size:_schema_offset + _schema_len.size + len(schema)] = schema
+        _schema_len.pack_into(self.mm, _schema_offset, len(schema))
+
+    def metric_id(self, metric):
+        mid = self.ids.get(metric, None)
+        if mid is None:
+            self.names.append(metric)
+            try:
+                self._write_schema()
+            except ValueError:
+                self.names.pop()
+                raise
+            mid = self.ids[metric] = len(self.names) - 1
+        return mid
+
+    def _stop(self, reason):
+        # Called with the lock held; collectors keep running, only recording ends
+        if not self.stopped:
+            self.stopped = True
+            logger.warning(f'Metric log {self.path} {reason}. Recording stopped.')
+
+    def append(self, metric, value, ts=None):
+        with self._lock:
+            if self.stopped or self.mm is None:
+                return False
+            n = self.count
+            if n >= self.capacity:
+                self.full = True
+                self._stop(f'is full after {n} records')
+                return False
+            # Collectors finish out of order, so a late sample is stamped no earlier than the
+            # last record; readers binary search on t and need it non-decreasing
+            t = max(self._last_t, int(((ts or time.time()) - self.base_time) * 1000))
+            if t > _max_ms:
+                self._stop('spans more than the 49 days its ms offsets can hold')
+                return False
+            mid = self.ids.get(metric, None)
+            if mid is None:
+                try:
+                    mid = self.metric_id(metric)
+                except ValueError:
+                    self._stop(f'has more metric names than fit in its {_header_size // 1024}KB header')
+                    return False
+            self._last_t = t
+            _record.pack_into(self.mm, self.data_offset + n * _record.size, t, mid, value)
+            if n % self.index_every == 0:
+                _index.pack_into(self.mm, self.index_offset + (n // self.index_every) * _index.size, n, t)
+            self.count = n + 1
+            _count.pack_into(self.mm, _count_offset, self.count)
+        return True
+
+    def record(self, data, ts=None, prefix=''):
+        if self.stopped:
+            return
+        ts = ts or time.time()
+        for metric, value in flatten_metrics(data, prefix):
+            self.append(metric, value, ts)
+        if self.flush_secs and time.monotonic() - self._last_flush > self.flush_secs:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self.mm is not None:
+                self.mm.flush()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self.mm is not None:
+                self.mm.flush()
+                self.mm.close()
+                os.close(self.fd)
+                self.mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class MetricLog:
+    """Reader for files written by MetricRecorder; safe to open while the run is still recording."""
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        self.mm = mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, header_size, self.index_every, self.index_offset, self.data_offset, self.capacity, self.base_time = _header.unpack_from(self.mm, 0)
+        if magic != _magic:
+            raise ValueError(f'{path} is not a trainingbar metric log')
+        if record_size != _record.size:
+            raise ValueError(f'{path} has {record_size} byte records, expected {_record.size}')
+        self.names = []
+
+    @property
+    def count(self):
+        return _count.unpack_from(self.mm, _count_offset)[0]
+
+    def metrics(self):
+        length = _schema_len.unpack_from(self.mm, _schema_offset)[0]
+        start = _schema_offset + _schema_len.size
+        self.names = json.loads(bytes(self.mm[start:start + length]).decode('utf8'))
+        return self.names
+
+    def records(self, start=None, end=None):
+        """
+        Returns records between unix times start and end as a zero-copy numpy structured
+        array with fields t (ms since base_time), id and value.
+        """
+        count = self.count
+        records = np.frombuffer(self.mm, dtype=record_dtype, count=count, offset=self.data_offset)
+        if start is None and end is None:
+            return records
+        lo, hi = self._seek(records, start, 'left'), self._seek(records, end, 'right')
+        return records[lo:hi]
+
+    def _seek(self, records, when, side):
+        if when is None:
+            return 0 if side == 'left' else len(records)
+        # Unix times are only good to ~0.25us in a double, so a time read back from the log
+        # (base_time + t / 1000) can land just under t; a 1us nudge keeps it from truncating to t - 1
+        t = max(0, int((when - self.base_time) * 1000 + 1e-3))
+        # The index holds each block's first time. Searching it with the same side as the records
+        # picks the last block that starts before the bound: for 'left', blocks ending in records at
+        # exactly t stay in range, since many records can share one ms. The bound is then within
+        # that block or at the start of the next.
+        blocks = (len(records) + self.index_every - 1) // self.index_every
+        index = np.frombuffer(self.mm, dtype=index_dtype, count=blocks, offset=self.index_offset)
+        block = max(0, int(np.searchsorted(index['t'], t, side=side)) - 1)
+        lo = block * self.index_every
+        hi = min(len(records), lo + 2 * self.index_every)
+        return lo + int(np.searchsorted(records['t'][lo:hi], t, side=side))
+
+    def read(self, metric, start=None, end=None):
+        """Returns (unix timestamps, values) for one metric."""
+        if metric not in self.names:
+            self.metrics()
+        records = self.records(start, end)
+        mask = records['id'] == self.names.index(metric)
+        return self.base_time + records['t'][mask] / 1000.0, records['value'][mask]
+
+    def iter_records(self):
+        """Pure-python iteration for environments without numpy."""
+        names = self.metrics()
+        for n in range(self.count):
+            t, mid, value = _record.unpack_from(self.mm, self.data_offset + n * _record.size)
+            yield self.base_time + t / 1000.0, names[mid], value
+
+    def close(self):
+        self.mm.close()
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,156 @@
+import re
+import time
+from datetime import datetime
+from trainingbar.recorder import MetricLog
+
+import numpy as np
+
+_bins = 1000
+_units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+_accelerator_util = re.compile(r'^(gpu\.\d+\.gpu_util|tpu_mxu_util)$')
+
+
+def parse_when(value, log, last_time):
+    """Accepts unix seconds, an ISO datetime, or a negative offset from the end of the log like -2h."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = value.strip()
+    m = re.match(r'^-(\d+(?:\.\d+)?)([smhdw])$', value)
+    if m:
+        return last_time - float(m.group(1)) * _units[m.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class UtilizationReport:
+    """
+    Streams a recorded run in fixed-size chunks and accumulates, for every metric at
+    once with bincount/ufunc reductions: sample counts, sums, high-water marks, time
+    spent above/below thresholds, and a 0.1%-bin histogram of *_util metrics for
+    percentiles. Memory is bounded by the chunk size regardless of run length.
+    """
+    def __init__(self, names, high=80.0, low=10.0, max_gap=300.0):
+        self.names = names
+        self.high = high
+        self.low = low
+        self.max_gap = max_gap
+        m = len(names)
+        self.count = np.zeros(m, dtype=np.int64)
+        self.sum = np.zeros(m, dtype=np.float64)
+        self.max = np.full(m, -np.inf)
+        self.min = np.full(m, np.inf)
+        self.duration = np.zeros(m, dtype=np.float64)
+        self.above = np.zeros(m, dtype=np.float64)
+        self.below = np.zeros(m, dtype=np.float64)
+        self.hist = np.zeros(m * (_bins + 1), dtype=np.int64)
+        self.util = np.array([n.endswith('util') for n in names] + [False])
+        self.last_t = np.full(m, np.nan)
+        self.last_v = np.zeros(m, dtype=np.float64)
+
+    def add(self, records):
+        m = len(self.names)
+        # Stable argsort of uint16 ids is a linear-time radix sort, so sort before widening
+        order = np.argsort(records['id'], kind='stable')
+        ids = records['id'].astype(np.intp)
+        t = records['t'].astype(np.float64) / 1000.0
+        v = records['value'].astype(np.float64)
+        self.count += np.bincount(ids, minlength=m)[:m]
+        self.sum += np.bincount(ids, weights=v, minlength=m)[:m]
+        np.maximum.at(self.max, ids, v)
+        np.minimum.at(self.min, ids, v)
+
+        util = self.util[ids]
+        bins = ids[util] * (_bins + 1) + np.clip(np.rint(v[util] * (_bins / 100.0)), 0, _bins).astype(np.int64)
+        self.hist += np.bincount(bins, minlength=len(self.hist))[:len(self.hist)]
+
+        # Each sample holds until the next sample of the same metric; gaps longer than
+        # max_gap (collector down, run paused) are not counted.
+        ids, t, v = ids[order], t[order], v[order]
+        first = np.ones(len(ids), dtype=bool)
+        first[1:] = ids[1:] != ids[:-1]
+        prev_t = np.empty_like(t)
+        prev_t[1:] = t[:-1]
+        prev_v = np.empty_like(v)
+        prev_v[1:] = v[:-1]
+        prev_t[first] = self.last_t[ids[first]]
+        prev_v[first] = self.last_v[ids[first]]
+        dt = t - prev_t
+        ok = ~np.isnan(dt) & (dt >= 0) & (dt <= self.max_gap)
+        dt = np.where(ok, dt, 0.0)
+        self.duration += np.bincount(ids, weights=dt, minlength=m)[:m]
+        self.above += np.bincount(ids, weights=dt * (prev_v >= self.high), minlength=m)[:m]
+        self.below += np.bincount(ids, weights=dt * (prev_v < self.low), minlength=m)[:m]
+        last = np.ones(len(ids), dtype=bool)
+        last[:-1] = ids[1:] != ids[:-1]
+        self.last_t[ids[last]] = t[last]
+        self.last_v[ids[last]] = v[last]
+
+    def percentiles(self, idx, qs):
+        hist = self.hist[idx * (_bins + 1):(idx + 1) * (_bins + 1)]
+        total = hist.sum()
+        if not total:
+            return [None for _ in qs]
+        cum = np.cumsum(hist)
+        return [float(np.searchsorted(cum, q / 100.0 * total)) * (100.0 / _bins) for q in qs]
+
+    def results(self, qs=(50, 90, 99)):
+        rows = []
+        for idx, name in enumerate(self.names):
+            if not self.count[idx]:
+                continue
+            row = {'metric': name, 'samples': int(self.count[idx]), 'mean': float(self.sum[idx] / self.count[idx]),
+                'min': float(self.min[idx]), 'max': float(self.max[idx]), 'minutes': float(self.duration[idx] / 60)}
+            if self.util[idx]:
+                for q, p in zip(qs, self.percentiles(idx, qs)):
+                    row[f'p{q}'] = p
+                row[f'minutes_above_{self.high:g}'] = float(self.above[idx] / 60)
+                row[f'minutes_below_{self.low:g}'] = float(self.below[idx] / 60)
+            if _accelerator_util.match(name):
+                row['idle_minutes'] = float(self.below[idx] / 60)
+            if name.endswith('_used'):
+                row['high_water'] = float(self.max[idx])
+            rows.append(row)
+        return rows
+
+
+def analyze(path, start=None, end=None, metrics=None, high=80.0, low=10.0, max_gap=300.0, percentiles=(50, 90, 99), chunk_size=8 * 1024 * 1024):
+    with MetricLog(path) as log:
+        names = log.metrics()
+        records = log.records()
+        last_time = log.base_time + (float(records['t'][-1]) / 1000.0 if len(records) else 0.0)
+        start, end = parse_when(start, log, last_time), parse_when(end, log, last_time)
+        records = log.records(start, end)
+        report = UtilizationReport(names, high, low, max_gap)
+        began = time.perf_counter()
+        for lo in range(0, len(records), chunk_size):
+            report.add(records[lo:lo + chunk_size])
+        rows = report.results(percentiles)
+        if metrics:
+            rows = [r for r in rows if any(re.search(m, r['metric']) for m in metrics)]
+        summary = {'path': path, 'records': int(len(records)), 'start': start or log.base_time, 'end': end or last_time, 'seconds': time.perf_counter() - began}
+        del records
+    return {'summary': summary, 'metrics': rows}
+
+
+def format_table(result):
+    def fmt(v):
+        if v is None:
+            return '-'
+        if isinstance(v, float):
+            return f'{v:,.2f}' if abs(v) < 1e6 else f'{v:,.3g}'
+        return str(v)
+    rows = result['metrics']
+    columns = []
+    for row in rows:
+        columns += [k for k in row if k not in columns]
+    table = [columns] + [[fmt(row.get(c, None)) for c in columns] for row in rows]
+    widths = [max(len(r[i]) for r in table) for i in range(len(columns))]
+    lines = ['  '.join(cell.ljust(w) if i == 0 else cell.rjust(w) for i, (cell, w) in enumerate(zip(r, widths))) for r in table]
+    s = result['summary']
+    lines.insert(1, '-' * len(lines[0]))
+    lines.append(f"\n{s['records']:,} records from {datetime.fromtimestamp(s['start']):%Y-%m-%d %H:%M:%S} to {datetime.fromtimestamp(s['end']):%Y-%m-%d %H:%M:%S} analyzed in {s['seconds']:.2f}s")
+    return '\n'.join(lines)
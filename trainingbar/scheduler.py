@@ -0,0 +1,145 @@
+import time
+import heapq
+from threading import Thread, Event, Lock
+from concurrent.futures import ThreadPoolExecutor
+from trainingbar.logger import get_logger
+
+logger = get_logger()
+
+
+class Job:
+    def __init__(self, name, func, interval, deadline):
+        self.name = name
+        self.func = func
+        self.interval = float(interval)
+        self.deadline = deadline
+        self.future = None
+        self.runs = 0
+        self.skipped = 0
+        self.last_run = None
+        self.last_duration = None
+
+    @property
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+
+class Scheduler:
+    """
+    Runs every collector from one thread on monotonic deadlines.
+
+    Deadlines are anchored to the scheduler epoch (epoch + k * interval), so intervals
+    never drift by the collection cost and collectors sharing an interval are sampled
+    with the same timestamp. Jobs execute on a small worker pool; a job that is still
+    running when its next deadline arrives skips that tick instead of queueing up.
+    """
+    def __init__(self, max_workers=None, name='tbar-scheduler'):
+        self.name = name
+        self.max_workers = max_workers
+        self.jobs = {}
+        self._queue = []
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._stopped = Event()
+        self._thread = None
+        self._pool = None
+        self.epoch = time.monotonic()
+        self.wall_epoch = time.time()
+
+    def add(self, name, func, interval, immediate=True):
+        with self._lock:
+            now = time.monotonic()
+            if immediate:
+                deadline = now
+            else:
+                deadline = self.epoch + (int((now - self.epoch) / interval) + 1) * interval
+            job = Job(name, func, interval, deadline)
+            self.jobs[name] = job
+            heapq.heappush(self._queue, job)
+        self._wakeup.set()
+        return job
+
+    def remove(self, name):
+        with self._lock:
+            job = self.jobs.pop(name, None)
+            if job:
+                self._queue = [j for j in self._queue if j is not job]
+                heapq.heapify(self._queue)
+        self._wakeup.set()
+
+    def set_interval(self, name, interval):
+        with self._lock:
+            job = self.jobs.get(name, None)
+            if job:
+                job.interval = float(interval)
+                job.deadline = min(job.deadline, time.monotonic() + job.interval)
+                heapq.heapify(self._queue)
+        self._wakeup.set()
+
+    def wall_time(self, deadline):
+        return self.wall_epoch + (deadline - self.epoch)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers or max(4, len(self.jobs)), thread_name_prefix=self.name)
+        self._thread = Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        if self._pool:
+            try:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            except TypeError:
+                self._pool.shutdown(wait=False)
+            self._pool = None
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive() and not self._stopped.is_set())
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                timeout = (self._queue[0].deadline - time.monotonic()) if self._queue else None
+            if timeout is None or timeout > 0:
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+                continue
+            self._dispatch_due()
+
+    def _dispatch_due(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._queue and self._queue[0].deadline <= now:
+                job = heapq.heappop(self._queue)
+                tick = job.deadline
+                missed = int((now - tick) / job.interval)
+                job.deadline = tick + (missed + 1) * job.interval
+                heapq.heappush(self._queue, job)
+                if job.running:
+                    job.skipped += 1
+                    continue
+                job.future = self._pool.submit(self._execute, job, self.wall_time(tick))
+
+    def _execute(self, job, ts):
+        start = time.monotonic()
+        try:
+            job.func(ts)
+        except Exception as e:
+            logger.error(f'Collector {job.name} failed: {e}')
+        finally:
+            job.runs += 1
+            job.last_run = ts
+            job.last_duration = time.monotonic() - start
+
+    def __len__(self):
+        return len(self.jobs)
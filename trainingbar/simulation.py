@@ -0,0 +1,165 @@
+"""
+Trace replay for load testing trainingbar without the hardware.
+
+A Trace holds per-device utilization sampled every `period` seconds, either
+synthesized or resampled from a metric log written with TrainingBar(record_path=...).
+A SimClock maps wall time to trace time at `speed`x, and the simulated backends
+read the trace row for the current trace time:
+
+    TrainingBar(xla='gpu', xla_params={'gpu_backend': 'sim', 'sim_devices': 64, 'sim_speed': 100})
+    TrainingBar(xla='tpu', xla_params={'tpu_backend': 'sim', 'mesh': 'v3-512', 'sim_trace': 'run.tbar'})
+
+Traces with fewer devices than requested are tiled, so an 8 GPU recording can
+drive 64 or 1024 simulated devices.
+"""
+
+import re
+import time
+from trainingbar.handlers.gpu_backends import GPUBackend
+
+_log_fields = [
+    (re.compile(r'^gpu\.(\d+)\.(gpu_util|vram_util|vram_used)$'), None),
+    (re.compile(r'^(?:tpu\.)?tpu_(mxu_util|mem_used)$'), 0),
+]
+
+
+class Trace:
+    """`values[field]` is a (steps, devices) float32 array sampled every `period` seconds."""
+    def __init__(self, values, period=1.0, loop=True):
+        import numpy as np
+        self.np = np
+        self.values = {k: np.asarray(v, dtype=np.float32).reshape(len(v), -1) for k, v in values.items()}
+        self.period = float(period)
+        self.loop = loop
+        self.steps = min(len(v) for v in self.values.values())
+        self.devices = max(v.shape[1] for v in self.values.values())
+
+    @property
+    def duration(self):
+        return self.steps * self.period
+
+    def index(self, t):
+        i = int(t / self.period)
+        return i % self.steps if self.loop else min(max(i, 0), self.steps - 1)
+
+    def at(self, t, field, devices=None):
+        """Values of `field` for every device at trace time t, tiled to `devices`."""
+        row = self.values[field][self.index(t)]
+        if devices and devices != len(row):
+            row = self.np.resize(row, devices)
+        return row
+
+    def value(self, t, field, device):
+        row = self.values[field][self.index(t)]
+        return float(row[device % len(row)])
+
+    @classmethod
+    def synthetic(cls, devices=8, seconds=3600, period=1.0, kind='gpu', vram_total=16384.0, mem_total=8.6e9, seed=None):
+        """
+        A training run: ramp up, steady utilization with per-device jitter, an eval
+        dip every 10 minutes, short input-pipeline stalls and one slow device.
+        """
+        import numpy as np
+        rng = np.random.default_rng(seed)
+        t = np.arange(int(seconds / period))[:, None] * period
+        util = np.minimum(1.0, t / 120.0) * (85.0 + rng.normal(0, 4, (len(t), devices)))
+        util[((t % 600) < 30).ravel()] *= 0.1
+        util[rng.random(len(t)) < 0.01] *= 0.3
+        util[:, devices // 2] *= 0.7
+        util = np.clip(util, 0, 100)
+        mem = np.minimum(1.0, t / 60.0) * (0.8 + rng.normal(0, 0.02, (1, devices)))
+        mem = np.clip(mem, 0, 1) * np.ones((len(t), devices))
+        if kind == 'tpu':
+            return cls({'mxu_util': util, 'mem_used': mem * mem_total}, period)
+        return cls({'gpu_util': util, 'vram_util': mem * 100, 'vram_used': mem * vram_total}, period)
+
+    @classmethod
+    def from_log(cls, path, period=None):
+        """Resamples the GPU/TPU series of a metric log onto a regular grid."""
+        import numpy as np
+        from trainingbar.recorder import MetricLog
+        series = {}
+        with MetricLog(path) as log:
+            for name in log.metrics():
+                for pattern, device in _log_fields:
+                    match = pattern.match(name)
+                    if match:
+                        dev, field = (int(match.group(1)), match.group(2)) if device is None else (device, match.group(1))
+                        ts, values = log.read(name)
+                        if len(ts):
+                            series.setdefault(field, {})[dev] = (ts, values.astype(np.float64))
+        if not series:
+            raise ValueError(f'{path} has no GPU or TPU metrics to replay')
+        start = min(ts[0] for f in series.values() for ts, _ in f.values())
+        end = max(ts[-1] for f in series.values() for ts, _ in f.values())
+        if period is None:
+            period = max(1.0, float(np.median(np.diff(next(iter(next(iter(series.values())).values()))[0]))) if end > start else 1.0)
+        grid = np.arange(start, end + period, period)
+        values = {}
+        for field, devs in series.items():
+            values[field] = np.stack([np.interp(grid, *devs[d]) for d in sorted(devs)], axis=1)
+        return cls(values, period)
+
+
+class SimClock:
+    """Trace time elapsed since the clock was created, running `speed` times faster than wall time."""
+    def __init__(self, speed=100.0, start=0.0):
+        self.speed = float(speed)
+        self.start = float(start)
+        self.wall_start = time.time()
+
+    def __call__(self, wall=None):
+        return self.start + ((wall or time.time()) - self.wall_start) * self.speed
+
+
+def load_trace(params, kind='gpu', **kwargs):
+    """Builds the trace and clock described by sim_* keys in xla params."""
+    devices = int(params.get('sim_devices', 8))
+    if params.get('sim_trace', None):
+        trace = Trace.from_log(params['sim_trace'])
+    else:
+        trace = Trace.synthetic(devices=devices, kind=kind, seed=params.get('sim_seed', None), **kwargs)
+    return trace, SimClock(params.get('sim_speed', 100.0))
+
+
+class SimulatedGPUBackend(GPUBackend):
+    """GPU backend replaying a Trace, for as many devices as asked regardless of the trace width."""
+    name = 'sim'
+
+    def __init__(self, trace=None, clock=None, devices=None, vram_total=16384.0, device_name='Simulated GPU'):
+        if trace is None:
+            trace = Trace.synthetic(devices=devices or 8, vram_total=vram_total)
+        self.trace = trace
+        self.clock = clock or SimClock()
+        self.num_devices = devices or trace.devices
+        self.vram_total = vram_total
+        self.device_name = device_name
+
+    @classmethod
+    def from_params(cls, params=None):
+        params = params or {}
+        trace, clock = load_trace(params, 'gpu')
+        return cls(trace, clock, devices=int(params.get('sim_devices', trace.devices)))
+
+    def _rows(self):
+        t = self.clock()
+        util = self.trace.at(t, 'gpu_util', self.num_devices).tolist()
+        if 'vram_used' in self.trace.values:
+            used = self.trace.at(t, 'vram_used', self.num_devices).tolist()
+        else:
+            used = (self.trace.at(t, 'vram_util', self.num_devices) * (self.vram_total / 100.0)).tolist()
+        return util, used
+
+    def devices(self):
+        util, used = self._rows()
+        return [{'idx': i, 'name': self.device_name, 'vram_total': self.vram_total, 'vram_used': used[i], 'vram_util': used[i] / self.vram_total * 100, 'gpu_util': util[i]} for i in range(self.num_devices)]
+
+    def sample(self):
+        util, used = self._rows()
+        scale = 100.0 / self.vram_total
+        return {i: {'vram_used': used[i], 'vram_util': used[i] * scale, 'gpu_util': util[i]} for i in range(self.num_devices)}
+
+
+def simulated_tpu_config(params):
+    mesh = params.get('mesh', None) or 'v3-8'
+    return {'project': params.get('project', None) or 'sim-project', 'tpu_name': params.get('tpu_name', None) or 'sim-tpu', 'zone': 'sim-zone', 'mesh': mesh, 'tpu_backend': 'sim'}
@@ -0,0 +1,138 @@
+import time
+from array import array
+from collections import deque
+from threading import local, Lock
+
+_time_capacity = 1024
+_time_mask = _time_capacity - 1
+_perf_counter = time.perf_counter
+
+
+class _ThreadSteps:
+    __slots__ = ('steps', 'samples', 'tokens', 'times', 'pos')
+
+    def __init__(self):
+        self.steps, self.samples, self.tokens = 0, 0, 0
+        # Ring of step timestamps; durations are taken between neighbours by the collector
+        self.times = array('d', bytes(8 * _time_capacity))
+        self.pos = 0
+
+
+class StepCounter:
+    """
+    Counts training steps from any number of threads without taking a lock.
+
+    Each thread writes only to its own counters; a collector sums them. Reads can
+    be a step behind a concurrent write, which only shifts that step into the
+    next interval.
+
+    step() also stamps each call with perf_counter() for step time percentiles;
+    count() skips the clock for loops where only the rates matter.
+    """
+    def __init__(self):
+        self._local = local()
+        self._threads = []
+        self._lock = Lock()
+
+    def _register(self):
+        steps = self._local.steps = _ThreadSteps()
+        with self._lock:
+            self._threads.append(steps)
+        return steps
+
+    def step(self, n_samples=0, n_tokens=0):
+        try:
+            s = self._local.steps
+        except AttributeError:
+            s = self._register()
+        pos = s.pos
+        s.times[pos & _time_mask] = _perf_counter()
+        s.pos = pos + 1
+        s.steps += 1
+        s.samples += n_samples
+        s.tokens += n_tokens
+
+    def count(self, n_samples=0, n_tokens=0):
+        try:
+            s = self._local.steps
+        except AttributeError:
+            s = self._register()
+        s.steps += 1
+        s.samples += n_samples
+        s.tokens += n_tokens
+
+    def totals(self):
+        steps = samples = tokens = 0
+        for s in self._threads:
+            steps += s.steps
+            samples += s.samples
+            tokens += s.tokens
+        return steps, samples, tokens
+
+    def step_times(self, cursors):
+        """Step durations written since `cursors` (thread -> pos), which is advanced in place."""
+        times = []
+        for s in self._threads:
+            end = s.pos
+            # Each duration needs the stamp before it, so the first stamp of a thread only starts the clock
+            start = max(cursors.get(id(s), 1), end - _time_capacity + 1, 1)
+            stamps = s.times
+            for i in range(start, end):
+                times.append(stamps[i & _time_mask] - stamps[(i - 1) & _time_mask])
+            cursors[id(s)] = end
+        return times
+
+
+class StepMonitor:
+    """Turns StepCounter totals into windowed and EWMA rates plus step time percentiles."""
+    def __init__(self, counter, delay=10, window=60, alpha=0.3):
+        try:
+            import numpy as np
+        except ImportError:
+            # Rates still work; step time percentiles need numpy
+            np = None
+        self.np = np
+        self.counter = counter
+        self.delay = delay
+        self.window = window
+        self.alpha = alpha
+        self.stopped = False
+        self.last_sample = None
+        self._snapshots = deque()
+        self._cursors = {}
+        self._ewma = {}
+        self._lock = Lock()
+        self.sys = {}
+
+    def update(self, ts=None):
+        if self.stopped:
+            return self.stats()
+        now = time.monotonic()
+        totals = self.counter.totals()
+        self._snapshots.append((now, totals))
+        while len(self._snapshots) > 2 and now - self._snapshots[1][0] >= self.window:
+            self._snapshots.popleft()
+        data = {'steps_total': totals[0], 'samples_total': totals[1], 'tokens_total': totals[2]}
+        if len(self._snapshots) > 1:
+            (t0, first), (t1, prev) = self._snapshots[0], self._snapshots[-2]
+            for i, name in enumerate(['steps', 'samples', 'tokens']):
+                data[f'{name}_per_sec'] = (totals[i] - first[i]) / (now - t0) if now > t0 else 0.0
+                rate = (totals[i] - prev[i]) / (now - t1) if now > t1 else 0.0
+                ewma = self._ewma.get(name, None)
+                self._ewma[name] = rate if ewma is None else ewma + self.alpha * (rate - ewma)
+                data[f'{name}_per_sec_ewma'] = self._ewma[name]
+        times = self.counter.step_times(self._cursors) if self.np is not None else None
+        if times:
+            p50, p90, p99 = self.np.percentile(self.np.asarray(times) * 1000, [50, 90, 99]).tolist()
+            data.update({'step_time_p50_ms': p50, 'step_time_p90_ms': p90, 'step_time_p99_ms': p99})
+        with self._lock:
+            self.sys = data
+            self.last_sample = ts or time.time()
+        return self.stats()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.sys)
+
+    def stop(self):
+        self.stopped = True